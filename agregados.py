@@ -0,0 +1,63 @@
+import pandas as pd
+
+from repositorio import derivado
+from supabase_client import supabase
+
+# Agregados calculados en la base de datos (funciones de sql/agregados.sql, o sus equivalentes
+# en almacenamiento.py para el backend local). El dashboard recibe solo las filas resumidas en
+# lugar de todos los movimientos. Cada resultado se cachea hasta que cambian sus tablas.
+
+
+def _rpc(nombre, columnas, **parametros):
+    filas = supabase.rpc(nombre, parametros).execute().data
+    df = pd.DataFrame.from_records(filas or [], columns=columnas)
+    for col in columnas:
+        if col in ("año", "mes", "n"):
+            df[col] = df[col].astype("int64")
+        elif col not in ("tipo", "categoria", "cuenta"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype(float)
+    return df
+
+
+def totales_mensuales(año=None):
+    # Una fila por año, mes, tipo, categoría y cuenta con el total y el número de movimientos
+    return derivado(
+        f"rpc:totales_mensuales:{año}",
+        "movimientos",
+        lambda: _rpc("totales_mensuales", ["año", "mes", "tipo", "categoria", "cuenta", "total", "n"], p_anio=año),
+    )
+
+
+def saldos_por_cuenta(fecha=None):
+    # Mismas columnas que libro_mayor.balance_por_cuenta, con la cuenta como índice
+    def construir():
+        df = _rpc(
+            "saldos_por_cuenta",
+            ["cuenta", "saldo", "ingresos", "gastos", "transferencias_recibidas", "transferencias_enviadas"],
+            p_fecha=fecha.isoformat() if fecha is not None else None,
+        ).set_index("cuenta")
+        df["saldo_actual"] = (
+            df["saldo"]
+            + df["ingresos"] - df["gastos"]
+            + df["transferencias_recibidas"] - df["transferencias_enviadas"]
+        )
+        return df
+
+    return derivado(f"rpc:saldos_por_cuenta:{fecha}", ("movimientos", "saldos_iniciales"), construir)
+
+
+def presupuesto_vs_real(año, mes):
+    def construir():
+        df = _rpc("presupuesto_vs_real", ["categoria", "presupuesto", "real"], p_anio=año, p_mes=mes)
+        df["diferencia"] = df["presupuesto"] - df["real"]
+        return df
+
+    return derivado(f"rpc:presupuesto_vs_real:{año}:{mes}", ("movimientos", "presupuestos"), construir)
+
+
+def total(df, **condiciones):
+    # Suma de "total" en las filas de totales_mensuales que cumplen las condiciones
+    mascara = pd.Series(True, index=df.index)
+    for col, valor in condiciones.items():
+        mascara &= df[col] == valor
+    return round(float(df.loc[mascara, "total"].sum()), 2)
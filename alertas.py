@@ -0,0 +1,420 @@
+import argparse
+import sys
+import uuid
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from esquema import a_centimos, con_importe, tipar_movimientos
+from libro_mayor import construir_libro, evolucion_saldos, obtener_libro, saldos_iniciales_por_cuenta
+from repositorio import (
+    COLUMNAS_MOVIMIENTOS, cargar_presupuestos, cargar_reglas_alerta, cargar_tabla, derivado,
+    guardar_reglas_alerta, obtener_saldos_iniciales,
+)
+
+# Motor de alertas con reglas declarativas (tabla reglas_alerta). Cada tipo de regla declara en
+# REGLAS qué claves toca un movimiento, cómo se evalúa una clave y el mensaje:
+#   - presupuesto:    gasto de una categoría en un mes por encima del umbral (%) de su presupuesto
+#   - saldo_minimo:   saldo de una cuenta por debajo del umbral (€)
+#   - gasto_atipico:  un gasto mayor que umbral × la mediana de su subcategoría
+# Los agregados de los que dependen (gasto por año/mes/categoría, saldo por cuenta e importes
+# ordenados por subcategoría) se guardan por versión de movimientos y las altas, ediciones y bajas
+# solo actualizan sus claves (las ediciones restan la fila de antes y suman la de después):
+# comprobar las alertas al guardar cuesta lo que el lote, no lo que el histórico.
+# historial() evalúa todas las reglas sobre todo el histórico de una vez, también sin interfaz:
+#   FINANZAS_BACKEND=sqlite python alertas.py --desde 2025-01-01 --csv alertas.csv
+
+# Un gasto solo se compara con la mediana de su subcategoría si esta tiene al menos estos gastos
+MIN_HISTORIAL = 5
+
+COLUMNAS = ["fecha", "regla", "objetivo", "valor", "limite", "mensaje"]
+
+
+# ---------- Agregados ----------
+
+def _efecto_saldo(df):
+    # Céntimos que suma o resta cada movimiento al saldo de cada cuenta
+    tipo, importe = df["tipo"], df["importe_cent"]
+    transf = tipo == "transferencia"
+    cuentas = pd.concat([
+        df["cuenta"][tipo == "ingreso"].astype(object), df["cuenta"][tipo == "gasto"].astype(object),
+        df["hacia"][transf].astype(object), df["desde"][transf].astype(object),
+    ])
+    importes = pd.concat([importe[tipo == "ingreso"], -importe[tipo == "gasto"], importe[transf], -importe[transf]])
+    return importes.groupby(cuentas.to_numpy()).sum()
+
+
+def _agregados(df):
+    df = con_importe(df[df["fecha"].notna()])
+    gastos = df[df["tipo"] == "gasto"]
+    gasto_mes = gastos.groupby(["año", "mes", "categoria"], observed=True)["importe_cent"].sum()
+
+    # Importes de cada subcategoría ordenados: la mediana es leer el centro del array
+    gastos = gastos[gastos["subcategoria"].notna()].sort_values(["subcategoria", "importe_cent"])
+    subcategorias = gastos["subcategoria"].astype(object).to_numpy()
+    cortes = np.flatnonzero(subcategorias[1:] != subcategorias[:-1]) + 1
+    inicios = np.r_[0, cortes] if len(subcategorias) else np.array([], dtype=int)
+    importes = dict(zip(subcategorias[inicios], np.split(gastos["importe_cent"].to_numpy(), cortes)))
+
+    return {
+        "gasto_mes": {(int(a), int(m), c): int(v) for (a, m, c), v in gasto_mes.items()},
+        "saldo": {c: int(v) for c, v in _efecto_saldo(df).items()},
+        "importes": importes,
+    }
+
+
+def _actualizar(estado, df):
+    # Copia superficial de cada agregado y solo se tocan las claves de las filas nuevas
+    delta = _agregados(df)
+    gasto_mes, saldo, importes = dict(estado["gasto_mes"]), dict(estado["saldo"]), dict(estado["importes"])
+    for clave, v in delta["gasto_mes"].items():
+        gasto_mes[clave] = gasto_mes.get(clave, 0) + v
+    for cuenta, v in delta["saldo"].items():
+        saldo[cuenta] = saldo.get(cuenta, 0) + v
+    for subcategoria, nuevos in delta["importes"].items():
+        previos = importes.get(subcategoria)
+        importes[subcategoria] = nuevos if previos is None else np.sort(np.concatenate([previos, nuevos]), kind="mergesort")
+    return {"gasto_mes": gasto_mes, "saldo": saldo, "importes": importes}
+
+
+def _quitar(estado, df):
+    # Lo contrario de _actualizar: descuenta las filas de antes de una edición o una baja
+    delta = _agregados(df)
+    gasto_mes, saldo, importes = dict(estado["gasto_mes"]), dict(estado["saldo"]), dict(estado["importes"])
+    for clave, v in delta["gasto_mes"].items():
+        # Un mes sin gastos de la categoría desaparece, como si se hubiera calculado de cero
+        if gasto_mes.get(clave, 0) == v:
+            gasto_mes.pop(clave, None)
+        else:
+            gasto_mes[clave] = gasto_mes.get(clave, 0) - v
+    for cuenta, v in delta["saldo"].items():
+        saldo[cuenta] = saldo.get(cuenta, 0) - v
+    for subcategoria, viejos in delta["importes"].items():
+        previos = importes.get(subcategoria, np.array([], dtype=viejos.dtype))
+        # Con importes repetidos cada uno quita una copia distinta: la primera posición de su valor
+        # más las veces que ya ha salido
+        posiciones = np.searchsorted(previos, viejos) + np.arange(len(viejos)) - np.searchsorted(viejos, viejos)
+        restantes = np.delete(previos, posiciones[posiciones < len(previos)])
+        if len(restantes):
+            importes[subcategoria] = restantes
+        else:
+            importes.pop(subcategoria, None)
+    return {"gasto_mes": gasto_mes, "saldo": saldo, "importes": importes}
+
+
+def obtener_estado():
+    return derivado(
+        "alertas",
+        "movimientos",
+        lambda: _agregados(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        _actualizar,
+        _quitar,
+    )
+
+
+def _contexto():
+    # Presupuesto por (categoría, mes) y saldo inicial por cuenta, en céntimos
+    presupuestos = cargar_presupuestos()
+    por_mes = presupuestos.assign(cent=a_centimos(presupuestos["importe"])).groupby(["categoria", "mes"])["cent"].sum()
+    iniciales = saldos_iniciales_por_cuenta(obtener_saldos_iniciales())
+    return {
+        "presupuesto": {(c, int(m)): int(v) for (c, m), v in por_mes.items()},
+        "saldo_inicial": {c: int(round(v * 100)) for c, v in iniciales.items()},
+    }
+
+
+# ---------- Reglas ----------
+
+def _mediana(ordenados):
+    n = len(ordenados)
+    return (ordenados[(n - 1) // 2] + ordenados[n // 2]) / 2
+
+
+def _alerta(regla, objetivo, fecha, valor, limite):
+    # valor y límite en céntimos
+    mensaje = REGLAS[regla.regla]["mensaje"].format(
+        objetivo=objetivo, fecha=fecha, valor=valor / 100, limite=limite / 100, umbral=regla.umbral
+    )
+    return {"fecha": fecha, "regla": regla.regla, "objetivo": objetivo, "valor": valor / 100, "limite": limite / 100, "mensaje": mensaje}
+
+
+def _presupuesto(regla, estado, contexto, claves):
+    alertas = []
+    for año, mes, categoria in claves:
+        if regla.objetivo and categoria != regla.objetivo:
+            continue
+        limite = contexto["presupuesto"].get((categoria, mes), 0) * regla.umbral / 100
+        gasto = estado["gasto_mes"].get((año, mes, categoria), 0)
+        if limite and gasto > limite:
+            alertas.append(_alerta(regla, categoria, pd.Timestamp(año, mes, 1), gasto, limite))
+    return alertas
+
+
+def _saldo_minimo(regla, estado, contexto, claves):
+    alertas, hoy = [], pd.Timestamp(date.today())
+    for cuenta in claves:
+        if regla.objetivo and cuenta != regla.objetivo:
+            continue
+        saldo = contexto["saldo_inicial"].get(cuenta, 0) + estado["saldo"].get(cuenta, 0)
+        if saldo < regla.umbral * 100:
+            alertas.append(_alerta(regla, cuenta, hoy, saldo, regla.umbral * 100))
+    return alertas
+
+
+def _gasto_atipico(regla, estado, contexto, claves):
+    alertas = []
+    for fecha, subcategoria, importe in claves:
+        if regla.objetivo and subcategoria != regla.objetivo:
+            continue
+        ordenados = estado["importes"].get(subcategoria)
+        if ordenados is None or len(ordenados) < MIN_HISTORIAL:
+            continue
+        limite = regla.umbral * _mediana(ordenados)
+        if importe > limite:
+            alertas.append(_alerta(regla, subcategoria, fecha, importe, limite))
+    return alertas
+
+
+def _claves_gasto_mes(df):
+    gastos = df[df["tipo"] == "gasto"]
+    return set(zip(gastos["año"].astype(int), gastos["mes"].astype(int), gastos["categoria"].astype(object)))
+
+
+def _claves_cuentas(df):
+    return set(pd.concat([df[col].astype(object) for col in ("cuenta", "desde", "hacia")]).dropna())
+
+
+def _claves_gastos(df):
+    gastos = df[(df["tipo"] == "gasto") & df["subcategoria"].notna()]
+    return list(zip(gastos["fecha"], gastos["subcategoria"].astype(object), gastos["importe_cent"]))
+
+
+# claves: las que toca un lote de movimientos; actuales: las que se miran para el estado de hoy
+REGLAS = {
+    "presupuesto": {
+        "etiqueta": "🎯 Gasto del mes sobre presupuesto (%)",
+        "evaluar": _presupuesto,
+        "claves": _claves_gasto_mes,
+        "actuales": lambda estado, contexto, hoy: [k for k in estado["gasto_mes"] if k[:2] == (hoy.year, hoy.month)],
+        "mensaje": "🎯 {objetivo}: {valor:,.2f} € gastados en {fecha:%m/%Y}, más del {umbral:g} % de su presupuesto (límite {limite:,.2f} €)",
+    },
+    "saldo_minimo": {
+        "etiqueta": "🏦 Saldo mínimo de una cuenta (€)",
+        "evaluar": _saldo_minimo,
+        "claves": _claves_cuentas,
+        "actuales": lambda estado, contexto, hoy: set(estado["saldo"]) | set(contexto["saldo_inicial"]),
+        "mensaje": "🏦 {objetivo}: saldo de {valor:,.2f} €, por debajo del mínimo de {limite:,.2f} €",
+    },
+    "gasto_atipico": {
+        "etiqueta": "🧾 Gasto atípico (veces la mediana de su subcategoría)",
+        "evaluar": _gasto_atipico,
+        "claves": _claves_gastos,
+        "actuales": lambda estado, contexto, hoy: [],
+        "mensaje": "🧾 {objetivo}: gasto de {valor:,.2f} € el {fecha:%d/%m/%Y}, más de {umbral:g} veces lo habitual ({limite:,.2f} €)",
+    },
+}
+
+
+def _evaluar(reglas, estado, contexto, claves):
+    # claves(definición de la regla) -> claves a evaluar
+    alertas = []
+    for regla in reglas.itertuples():
+        definicion = REGLAS.get(regla.regla)
+        if definicion is None or pd.isna(regla.umbral):
+            continue
+        alertas.extend(definicion["evaluar"](regla, estado, contexto, claves(definicion)))
+    return pd.DataFrame(alertas, columns=COLUMNAS)
+
+
+def comprobar(filas):
+    # Alertas que disparan las filas recién guardadas o editadas (la caché ya las incluye): solo
+    # se evalúan las claves que tocan, así que el coste depende del lote y no del histórico
+    reglas = cargar_reglas_alerta()
+    if reglas.empty or not len(filas):
+        return pd.DataFrame(columns=COLUMNAS)
+    nuevas = tipar_movimientos(pd.DataFrame(filas).reindex(columns=COLUMNAS_MOVIMIENTOS))
+    nuevas = con_importe(nuevas[nuevas["fecha"].notna()])
+    return _evaluar(reglas, obtener_estado(), _contexto(), lambda definicion: definicion["claves"](nuevas))
+
+
+def vigentes(hoy=None):
+    # Alertas de ahora mismo: presupuestos del mes en curso y saldos actuales
+    hoy = hoy or date.today()
+    reglas = cargar_reglas_alerta()
+    if reglas.empty:
+        return pd.DataFrame(columns=COLUMNAS)
+    estado, contexto = obtener_estado(), _contexto()
+    return _evaluar(reglas, estado, contexto, lambda definicion: definicion["actuales"](estado, contexto, hoy))
+
+
+# ---------- Histórico ----------
+
+def historial(movimientos, reglas, presupuestos, saldos_iniciales, libro=None):
+    # Todas las alertas que habrían saltado en el histórico, por columnas y sin bucles por fila:
+    # meses con una categoría sobre presupuesto, días en que un saldo cruzó el mínimo hacia
+    # abajo y gastos atípicos (frente a la mediana de todo el histórico de su subcategoría)
+    df = con_importe(movimientos[movimientos["fecha"].notna()])
+    gastos = df[df["tipo"] == "gasto"]
+    partes = []
+
+    por_mes = gastos.groupby(["año", "mes", "categoria"], observed=True)["importe_cent"].sum().rename("valor").reset_index()
+    presupuesto = presupuestos.assign(cent=a_centimos(presupuestos["importe"])).groupby(["categoria", "mes"])["cent"].sum()
+    por_mes["presupuesto"] = presupuesto.reindex(
+        pd.MultiIndex.from_arrays([por_mes["categoria"].astype(object), por_mes["mes"].astype(int)])
+    ).fillna(0).to_numpy()
+    por_mes["fecha"] = pd.to_datetime(pd.DataFrame({"year": por_mes["año"], "month": por_mes["mes"], "day": 1}))
+
+    cuentas = None
+    if (reglas["regla"] == "saldo_minimo").any():
+        libro = construir_libro(movimientos) if libro is None else libro
+        cuentas = evolucion_saldos(libro, saldos_iniciales)
+
+    subcategoria = gastos["subcategoria"].astype(object)
+    medianas = gastos.groupby(subcategoria, observed=True)["importe_cent"].transform("median")
+    n = gastos.groupby(subcategoria, observed=True)["importe_cent"].transform("size")
+
+    for regla in reglas.itertuples():
+        if regla.regla not in REGLAS or pd.isna(regla.umbral):
+            continue
+        if regla.regla == "presupuesto":
+            limite = por_mes["presupuesto"] * regla.umbral / 100
+            marca = (limite > 0) & (por_mes["valor"] > limite)
+            if regla.objetivo:
+                marca &= por_mes["categoria"] == regla.objetivo
+            encontradas = pd.DataFrame({
+                "fecha": por_mes["fecha"][marca], "objetivo": por_mes["categoria"][marca].astype(object),
+                "valor": por_mes["valor"][marca], "limite": limite[marca],
+            })
+        elif regla.regla == "saldo_minimo":
+            saldos = cuentas[[c for c in cuentas.columns if not regla.objetivo or c == regla.objetivo]]
+            debajo = saldos < regla.umbral
+            # Solo el primer día de cada racha por debajo del mínimo
+            cruce = (debajo & ~debajo.shift(fill_value=False)).to_numpy()
+            dias, columnas = np.nonzero(cruce)
+            encontradas = pd.DataFrame({
+                "fecha": saldos.index[dias], "objetivo": saldos.columns[columnas].astype(object),
+                "valor": (saldos.to_numpy()[dias, columnas] * 100).round(), "limite": regla.umbral * 100,
+            })
+        else:
+            limite = medianas * regla.umbral
+            marca = (n >= MIN_HISTORIAL) & (gastos["importe_cent"] > limite)
+            if regla.objetivo:
+                marca &= subcategoria == regla.objetivo
+            encontradas = pd.DataFrame({
+                "fecha": gastos["fecha"][marca], "objetivo": subcategoria[marca],
+                "valor": gastos["importe_cent"][marca], "limite": limite[marca],
+            })
+        encontradas = encontradas.assign(regla=regla.regla, valor=encontradas["valor"] / 100, limite=encontradas["limite"] / 100)
+        plantilla = REGLAS[regla.regla]["mensaje"]
+        encontradas["mensaje"] = [
+            plantilla.format(objetivo=o, fecha=f, valor=v, limite=lim, umbral=regla.umbral)
+            for o, f, v, lim in zip(encontradas["objetivo"], encontradas["fecha"], encontradas["valor"], encontradas["limite"])
+        ]
+        partes.append(encontradas[COLUMNAS])
+
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS)
+    return pd.concat(partes, ignore_index=True).sort_values("fecha", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def obtener_historial():
+    return derivado(
+        "alertas:historial",
+        ("movimientos", "reglas_alerta", "presupuestos", "saldos_iniciales"),
+        lambda: historial(
+            cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS), cargar_reglas_alerta(),
+            cargar_presupuestos(), obtener_saldos_iniciales(), obtener_libro(),
+        ),
+    )
+
+
+# ---------- Interfaz ----------
+
+def avisar(filas):
+    # Avisos tras guardar movimientos desde los formularios y editores
+    for mensaje in comprobar(filas)["mensaje"]:
+        st.toast(mensaje)
+
+
+def mostrar_alertas(objetivos):
+    # objetivos: categorías, cuentas y subcategorías que se pueden elegir en las reglas
+    vigentes_hoy = vigentes()
+    if vigentes_hoy.empty:
+        st.success("✅ Ninguna alerta activa ahora mismo")
+    for mensaje in vigentes_hoy["mensaje"]:
+        st.warning(mensaje)
+
+    st.markdown("#### 🕑 Histórico de alertas")
+    historico = obtener_historial()
+    if historico.empty:
+        st.caption("Ninguna regla ha saltado en el histórico")
+    else:
+        st.dataframe(
+            historico,
+            hide_index=True,
+            column_config={
+                "fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
+                "valor": st.column_config.NumberColumn("Valor", format="%.2f"),
+                "limite": st.column_config.NumberColumn("Límite", format="%.2f"),
+            }
+        )
+
+    st.markdown("#### ⚙️ Reglas")
+    st.caption("Sin objetivo, la regla se aplica a todas las categorías, cuentas o subcategorías.")
+    reglas = cargar_reglas_alerta()
+    editado = st.data_editor(
+        reglas,
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "id": None,
+            "regla": st.column_config.SelectboxColumn(
+                "Regla", options=list(REGLAS), required=True, format_func=lambda r: REGLAS[r]["etiqueta"]
+            ),
+            "objetivo": st.column_config.SelectboxColumn("Objetivo", options=sorted(objetivos)),
+            "umbral": st.column_config.NumberColumn("Umbral", required=True, min_value=0.0),
+        },
+        key="editor_reglas_alerta",
+    )
+    if st.button("💾 Guardar reglas de alerta"):
+        editado = editado.dropna(subset=["regla", "umbral"])
+        filas = [
+            {
+                "id": fila.id if isinstance(fila.id, str) and fila.id else str(uuid.uuid4()),
+                "regla": fila.regla, "objetivo": fila.objetivo if isinstance(fila.objetivo, str) and fila.objetivo else None,
+                "umbral": float(fila.umbral),
+            }
+            for fila in editado.itertuples()
+        ]
+        guardar_reglas_alerta(filas, set(reglas["id"]) - set(editado["id"].dropna()))
+        st.success(f"✅ {len(filas)} reglas guardadas")
+        st.rerun()
+
+
+# ---------- Sin interfaz ----------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evalúa todas las reglas de alerta sobre el histórico")
+    parser.add_argument("--desde", help="solo alertas desde esta fecha (AAAA-MM-DD)")
+    parser.add_argument("--csv", help="guardar las alertas en este fichero en lugar de mostrarlas")
+    args = parser.parse_args(argv)
+
+    alertas = historial(
+        cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS), cargar_reglas_alerta(),
+        cargar_presupuestos(), obtener_saldos_iniciales(),
+    )
+    if args.desde:
+        alertas = alertas[alertas["fecha"] >= pd.Timestamp(args.desde)]
+    if args.csv:
+        alertas.to_csv(args.csv, index=False)
+        print(f"💾 {len(alertas)} alertas guardadas en {args.csv}")
+    else:
+        print(alertas.to_string(index=False) if not alertas.empty else "Sin alertas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
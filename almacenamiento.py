@@ -0,0 +1,369 @@
+import sqlite3
+import threading
+
+from esquema import normalizar
+
+# Backend local: una base SQLite con las mismas tablas que Supabase y un cliente que imita
+# la parte de supabase-py que usa la app (table().select().eq().order().range().execute()...).
+# Se elige con FINANZAS_BACKEND=sqlite en supabase_client.py; el resto de módulos no cambia.
+
+# Texto de búsqueda como en sql/movimientos_busqueda.sql: columna generada (virtual, no ocupa ni
+# cuesta nada al escribir) con la función normalizar registrada en la conexión
+_BUSQUEDA = "busqueda TEXT GENERATED ALWAYS AS (normalizar({})) VIRTUAL".format(
+    " || ' ' || ".join(f"coalesce({col}, '')" for col in ("comentario", "categoria", "subcategoria", "cuenta", "desde", "hacia"))
+)
+
+ESQUEMA = {
+    "movimientos": """
+        CREATE TABLE IF NOT EXISTS movimientos (
+            id TEXT PRIMARY KEY, fecha TEXT, cuenta TEXT, categoria TEXT, subcategoria TEXT,
+            importe REAL, comentario TEXT, tipo TEXT, desde TEXT, hacia TEXT, created_at TEXT,
+            updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')), {busqueda}
+        )""".format(busqueda=_BUSQUEDA),
+    "presupuestos": """
+        CREATE TABLE IF NOT EXISTS presupuestos (
+            categoria TEXT, mes INTEGER, importe REAL, PRIMARY KEY (categoria, mes)
+        )""",
+    "saldos_iniciales": """
+        CREATE TABLE IF NOT EXISTS saldos_iniciales (cuenta TEXT PRIMARY KEY, saldo_inicial REAL)""",
+    "objetivos": """
+        CREATE TABLE IF NOT EXISTS objetivos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT, descripcion TEXT, cuenta TEXT,
+            monto REAL, fecha_limite TEXT
+        )""",
+    "objetivos_financieros": """
+        CREATE TABLE IF NOT EXISTS objetivos_financieros (
+            id TEXT PRIMARY KEY, nombre TEXT, meta REAL, ahorrado REAL
+        )""",
+    "reglas_categoria": """
+        CREATE TABLE IF NOT EXISTS reglas_categoria (
+            id TEXT PRIMARY KEY, tipo TEXT, patron TEXT, es_regex INTEGER DEFAULT 0,
+            subcategoria TEXT, categoria TEXT, prioridad INTEGER DEFAULT 0
+        )""",
+    "reglas_alerta": """
+        CREATE TABLE IF NOT EXISTS reglas_alerta (
+            id TEXT PRIMARY KEY, regla TEXT, objetivo TEXT, umbral REAL
+        )""",
+}
+
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS movimientos_created_at ON movimientos (created_at)",
+    "CREATE INDEX IF NOT EXISTS movimientos_fecha ON movimientos (fecha)",
+    "CREATE INDEX IF NOT EXISTS movimientos_updated_at ON movimientos (updated_at)",
+]
+
+# updated_at como en sql/movimientos_updated_at.sql: cualquier UPDATE (también el DO UPDATE de
+# un upsert) lo pone a la hora actual. El de las altas lo pone el DEFAULT de la columna; en bases
+# creadas antes de existir la columna (ALTER TABLE no admite ese DEFAULT) lo pone el trigger.
+_AHORA = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS movimientos_updated_at_alta AFTER INSERT ON movimientos
+        WHEN NEW.updated_at IS NULL
+        BEGIN UPDATE movimientos SET updated_at = {_AHORA} WHERE id = NEW.id; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS movimientos_updated_at AFTER UPDATE ON movimientos
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN UPDATE movimientos SET updated_at = {_AHORA} WHERE id = NEW.id; END""",
+]
+
+# Equivalentes en SQLite de las funciones de sql/agregados.sql (mismos nombres, parámetros y
+# columnas). Los importes se suman en céntimos enteros para que el total sea exacto.
+_CENTIMOS = "CAST(ROUND(importe * 100) AS INTEGER)"
+FUNCIONES = {
+    "totales_mensuales": (["p_anio"], f"""
+        SELECT CAST(strftime('%Y', fecha) AS INTEGER) AS "año", CAST(strftime('%m', fecha) AS INTEGER) AS mes,
+               tipo, categoria, cuenta, SUM({_CENTIMOS}) / 100.0 AS total, COUNT(*) AS n
+        FROM movimientos
+        WHERE fecha IS NOT NULL AND (:p_anio IS NULL OR CAST(strftime('%Y', fecha) AS INTEGER) = :p_anio)
+        GROUP BY 1, 2, 3, 4, 5"""),
+    "saldos_por_cuenta": (["p_fecha"], f"""
+        WITH apuntes AS (
+            SELECT cuenta,
+                   CASE WHEN tipo = 'ingreso' THEN {_CENTIMOS} ELSE 0 END AS ingresos,
+                   CASE WHEN tipo = 'gasto' THEN {_CENTIMOS} ELSE 0 END AS gastos,
+                   0 AS recibidas, 0 AS enviadas
+            FROM movimientos
+            WHERE tipo IN ('ingreso', 'gasto') AND cuenta IS NOT NULL AND (:p_fecha IS NULL OR date(fecha) <= :p_fecha)
+            UNION ALL
+            SELECT hacia, 0, 0, {_CENTIMOS}, 0 FROM movimientos
+            WHERE tipo = 'transferencia' AND hacia IS NOT NULL AND (:p_fecha IS NULL OR date(fecha) <= :p_fecha)
+            UNION ALL
+            SELECT desde, 0, 0, 0, {_CENTIMOS} FROM movimientos
+            WHERE tipo = 'transferencia' AND desde IS NOT NULL AND (:p_fecha IS NULL OR date(fecha) <= :p_fecha)
+        ),
+        totales AS (
+            SELECT cuenta, SUM(ingresos) AS ingresos, SUM(gastos) AS gastos,
+                   SUM(recibidas) AS recibidas, SUM(enviadas) AS enviadas
+            FROM apuntes GROUP BY cuenta
+        ),
+        cuentas AS (SELECT cuenta FROM saldos_iniciales UNION SELECT cuenta FROM totales)
+        SELECT c.cuenta, COALESCE(s.saldo_inicial, 0) AS saldo,
+               COALESCE(t.ingresos, 0) / 100.0 AS ingresos, COALESCE(t.gastos, 0) / 100.0 AS gastos,
+               COALESCE(t.recibidas, 0) / 100.0 AS transferencias_recibidas,
+               COALESCE(t.enviadas, 0) / 100.0 AS transferencias_enviadas
+        FROM cuentas c
+        LEFT JOIN saldos_iniciales s ON s.cuenta = c.cuenta
+        LEFT JOIN totales t ON t.cuenta = c.cuenta"""),
+    "presupuesto_vs_real": (["p_anio", "p_mes"], f"""
+        WITH reales AS (
+            SELECT categoria, SUM({_CENTIMOS}) AS importe
+            FROM movimientos
+            WHERE tipo = 'gasto'
+              AND CAST(strftime('%Y', fecha) AS INTEGER) = :p_anio
+              AND CAST(strftime('%m', fecha) AS INTEGER) = :p_mes
+            GROUP BY categoria
+        ),
+        previstos AS (
+            SELECT categoria, SUM({_CENTIMOS}) AS importe FROM presupuestos WHERE mes = :p_mes GROUP BY categoria
+        ),
+        categorias AS (SELECT categoria FROM previstos UNION SELECT categoria FROM reales)
+        SELECT c.categoria, COALESCE(p.importe, 0) / 100.0 AS presupuesto, COALESCE(r.importe, 0) / 100.0 AS "real"
+        FROM categorias c
+        LEFT JOIN previstos p ON p.categoria IS c.categoria
+        LEFT JOIN reales r ON r.categoria IS c.categoria"""),
+}
+
+
+# Operadores de PostgREST que entiende or_()
+_OPERADORES = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE", "ilike": "LIKE"}
+
+
+class Respuesta:
+    # Igual que APIResponse de postgrest: filas en .data y, si se pidió, el total en .count
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Consulta:
+    def __init__(self, cliente, tabla):
+        self.cliente = cliente
+        self.tabla = tabla
+        self.operacion = "select"
+        self.columnas = "*"
+        self.contar = False
+        self.condiciones = []
+        self.parametros = []
+        self.orden = []
+        self.limite = None
+        self.desplazamiento = 0
+        self.filas = []
+        self.cambios = {}
+        self.conflicto = None
+        self.nulos_por_defecto = True
+        self.ignorar_duplicados = False
+
+    # ---------- Filtros ----------
+
+    def _condicion(self, sql, *valores):
+        self.condiciones.append(sql)
+        self.parametros.extend(valores)
+        return self
+
+    def eq(self, columna, valor):
+        return self._condicion(f'"{columna}" = ?', valor)
+
+    def neq(self, columna, valor):
+        return self._condicion(f'"{columna}" != ?', valor)
+
+    def gt(self, columna, valor):
+        return self._condicion(f'"{columna}" > ?', valor)
+
+    def gte(self, columna, valor):
+        return self._condicion(f'"{columna}" >= ?', valor)
+
+    def lt(self, columna, valor):
+        return self._condicion(f'"{columna}" < ?', valor)
+
+    def lte(self, columna, valor):
+        return self._condicion(f'"{columna}" <= ?', valor)
+
+    def in_(self, columna, valores):
+        valores = list(valores)
+        if not valores:
+            return self._condicion("0")
+        return self._condicion(f'"{columna}" IN ({",".join("?" * len(valores))})', *valores)
+
+    def ilike(self, columna, patron):
+        # PostgREST admite * como comodín; LIKE de SQLite ya no distingue mayúsculas (ASCII)
+        return self._condicion(f'"{columna}" LIKE ?', patron.replace("*", "%"))
+
+    def or_(self, filtros):
+        # Sintaxis de PostgREST: "columna.operador.valor,columna.operador.valor"
+        partes, valores = [], []
+        for filtro in filtros.split(","):
+            columna, operador, valor = filtro.split(".", 2)
+            if operador in ("like", "ilike"):
+                valor = valor.replace("*", "%")
+            partes.append(f'"{columna}" {_OPERADORES[operador]} ?')
+            valores.append(valor)
+        return self._condicion(f"({' OR '.join(partes)})", *valores)
+
+    def order(self, columna, desc=False):
+        self.orden.append(f'"{columna}" {"DESC" if desc else "ASC"}')
+        return self
+
+    def range(self, inicio, fin):
+        self.desplazamiento, self.limite = inicio, fin - inicio + 1
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    # ---------- Operaciones ----------
+
+    def select(self, columnas="*", count=None):
+        self.columnas = columnas
+        self.contar = count is not None
+        return self
+
+    def insert(self, filas, returning="representation", default_to_null=True):
+        self.operacion, self.filas = "insert", filas if isinstance(filas, list) else [filas]
+        self.nulos_por_defecto = default_to_null
+        return self
+
+    def upsert(self, filas, on_conflict="", returning="representation", default_to_null=True, ignore_duplicates=False):
+        self.operacion, self.filas = "upsert", filas if isinstance(filas, list) else [filas]
+        self.conflicto = on_conflict or "id"
+        self.nulos_por_defecto = default_to_null
+        self.ignorar_duplicados = ignore_duplicates
+        return self
+
+    def update(self, cambios):
+        self.operacion, self.cambios = "update", cambios
+        return self
+
+    def delete(self):
+        self.operacion = "delete"
+        return self
+
+    def execute(self):
+        with self.cliente.lock:
+            return getattr(self, f"_{self.operacion}")()
+
+    # ---------- SQL ----------
+
+    def _where(self):
+        return f" WHERE {' AND '.join(self.condiciones)}" if self.condiciones else ""
+
+    def _select(self):
+        con = self.cliente.con
+        columnas = "*" if self.columnas == "*" else ", ".join(f'"{c.strip()}"' for c in self.columnas.split(","))
+        sql = f'SELECT {columnas} FROM "{self.tabla}"{self._where()}'
+        if self.orden:
+            sql += f" ORDER BY {', '.join(self.orden)}"
+        if self.limite is not None or self.desplazamiento:
+            sql += f" LIMIT {-1 if self.limite is None else int(self.limite)} OFFSET {int(self.desplazamiento)}"
+        cursor = con.execute(sql, self.parametros)
+        nombres = [d[0] for d in cursor.description]
+        data = [dict(zip(nombres, fila)) for fila in cursor]
+        count = None
+        if self.contar:
+            count = con.execute(f'SELECT COUNT(*) FROM "{self.tabla}"{self._where()}', self.parametros).fetchone()[0]
+        return Respuesta(data, count)
+
+    def _por_defecto(self):
+        # Valor por defecto de cada columna de la tabla (NULL si no declara ninguno)
+        con = self.cliente.con
+        return {
+            nombre: None if defecto is None else con.execute(f"SELECT {defecto}").fetchone()[0]
+            for _, nombre, _, _, defecto, _ in con.execute(f'PRAGMA table_info("{self.tabla}")')
+        }
+
+    def _grupos(self):
+        # Como PostgREST: postgrest-py manda en columns= la unión de las claves de todo el lote y
+        # cada fila escribe todas esas columnas. Las que le faltan a una fila van a NULL con
+        # default_to_null y, sin él (missing=default), al valor por defecto de la columna, también
+        # en la parte DO UPDATE de un upsert: no conservan lo que ya había.
+        columnas = list(dict.fromkeys(c for fila in self.filas for c in fila))
+        defectos = {} if self.nulos_por_defecto else self._por_defecto()
+        yield columnas, [tuple(fila[c] if c in fila else defectos.get(c) for c in columnas) for fila in self.filas]
+
+    def _escribir(self, sufijo):
+        con = self.cliente.con
+        with con:
+            for columnas, valores in self._grupos():
+                nombres = ", ".join(f'"{c}"' for c in columnas)
+                marcas = ", ".join("?" * len(columnas))
+                con.executemany(f'INSERT INTO "{self.tabla}" ({nombres}) VALUES ({marcas}){sufijo(columnas)}', valores)
+        return Respuesta(self.filas)
+
+    def _insert(self):
+        return self._escribir(lambda columnas: "")
+
+    def _upsert(self):
+        clave = [c.strip() for c in self.conflicto.split(",")]
+
+        def sufijo(columnas):
+            actualizar = [c for c in columnas if c not in clave]
+            conflicto = ", ".join(f'"{c}"' for c in clave)
+            if not actualizar or self.ignorar_duplicados:
+                return f" ON CONFLICT ({conflicto}) DO NOTHING"
+            asignaciones = ", ".join(f'"{c}" = excluded."{c}"' for c in actualizar)
+            return f" ON CONFLICT ({conflicto}) DO UPDATE SET {asignaciones}"
+
+        return self._escribir(sufijo)
+
+    def _update(self):
+        con = self.cliente.con
+        asignaciones = ", ".join(f'"{c}" = ?' for c in self.cambios)
+        with con:
+            con.execute(f'UPDATE "{self.tabla}" SET {asignaciones}{self._where()}', [*self.cambios.values(), *self.parametros])
+        return Respuesta([])
+
+    def _delete(self):
+        con = self.cliente.con
+        with con:
+            con.execute(f'DELETE FROM "{self.tabla}"{self._where()}', self.parametros)
+        return Respuesta([])
+
+
+class Llamada:
+    # supabase.rpc(nombre, parametros).execute()
+    def __init__(self, cliente, nombre, parametros):
+        self.cliente = cliente
+        self.nombre = nombre
+        self.parametros = parametros or {}
+
+    def execute(self):
+        nombres, sql = FUNCIONES[self.nombre]
+        parametros = {p: self.parametros.get(p) for p in nombres}
+        with self.cliente.lock:
+            cursor = self.cliente.con.execute(sql, parametros)
+            columnas = [d[0] for d in cursor.description]
+            return Respuesta([dict(zip(columnas, fila)) for fila in cursor])
+
+
+class ClienteSQLite:
+    def __init__(self, ruta):
+        # Streamlit atiende cada sesión en un hilo: una conexión compartida protegida con un lock
+        self.con = sqlite3.connect(ruta, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.con.create_function("normalizar", 1, normalizar, deterministic=True)
+        with self.con:
+            self.con.execute(ESQUEMA["movimientos"])
+            columnas = {fila[1] for fila in self.con.execute("PRAGMA table_xinfo(movimientos)")}
+            if "updated_at" not in columnas:
+                self.con.execute("ALTER TABLE movimientos ADD COLUMN updated_at TEXT")
+            if "busqueda" not in columnas:
+                self.con.execute(f"ALTER TABLE movimientos ADD COLUMN {_BUSQUEDA}")
+            for sql in list(ESQUEMA.values()) + INDICES + TRIGGERS:
+                self.con.execute(sql)
+
+    def table(self, tabla):
+        return Consulta(self, tabla)
+
+    def rpc(self, nombre, parametros=None):
+        return Llamada(self, nombre, parametros)
+
+    def reemplazar(self, tabla, df):
+        # Carga masiva de un DataFrame (importaciones, benchmarks): borra la tabla y la rellena
+        columnas = list(df.columns)
+        nombres = ", ".join(f'"{c}"' for c in columnas)
+        marcas = ", ".join("?" * len(columnas))
+        valores = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        with self.lock, self.con:
+            self.con.execute(f'DELETE FROM "{tabla}"')
+            self.con.executemany(f'INSERT INTO "{tabla}" ({nombres}) VALUES ({marcas})', valores)
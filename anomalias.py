@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from cubo import filtrar
+from esquema import con_importe
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_tabla, derivado
+
+# Detección de gastos inesperados por subcategoría con estadísticos robustos móviles.
+#   - cada gasto se compara con los VENTANA_MOVIMIENTOS gastos anteriores de su subcategoría
+#   - cada mes (total por subcategoría) con los VENTANA_MESES meses anteriores, contando como 0
+#     los meses sin gasto desde que la subcategoría aparece
+#   puntuación = (valor − mediana) / escala, con la escala sacada del rango intercuartílico
+#   (IQR / 1.349 equivale a la desviación típica en datos normales y no lo mueven los extremos)
+# Mediana y cuartiles salen de una pasada groupby-rolling sobre la tabla ordenada por
+# (subcategoría, fecha). Las puntuaciones de los movimientos se guardan por versión de
+# movimientos y con altas solo se recalculan las filas nuevas y las posteriores en su subcategoría.
+VENTANA_MOVIMIENTOS = 50
+MIN_MOVIMIENTOS = 10
+VENTANA_MESES = 12
+MIN_MESES = 6
+
+UMBRAL = 3.5
+
+# La escala nunca baja del 5 % de la mediana ni de 1 € (gastos fijos con IQR = 0)
+ESCALA_RELATIVA = 0.05
+ESCALA_MINIMA = 100
+
+_ORDEN = ["subcategoria", "fecha", "id"]
+_PUNTUACIONES = ["mediana", "escala", "puntuacion"]
+
+
+def _puntuar(df, columna, ventana, minimo):
+    # df ordenado por subcategoría y fecha: mediana, escala y puntuación de cada fila frente a las
+    # `ventana` anteriores de su subcategoría (sin contarse a sí misma)
+    grupos = df["subcategoria"].to_numpy()
+    anteriores = df[columna].astype(float).groupby(grupos, sort=False).shift(1)
+    rodante = anteriores.groupby(grupos, sort=False).rolling(ventana, min_periods=minimo)
+    q1, mediana, q3 = (rodante.quantile(q).droplevel(0).reindex(df.index) for q in (0.25, 0.5, 0.75))
+    escala = np.maximum.reduce([(q3 - q1).to_numpy() / 1.349, mediana.abs().to_numpy() * ESCALA_RELATIVA,
+                                np.full(len(df), ESCALA_MINIMA, dtype=float)])
+    return pd.DataFrame({
+        "mediana": mediana.to_numpy(),
+        "escala": escala,
+        "puntuacion": (df[columna].to_numpy() - mediana.to_numpy()) / escala,
+    }, index=df.index)
+
+
+# ---------- Movimientos ----------
+
+def _gastos(df):
+    df = con_importe(df[(df["tipo"] == "gasto") & df["fecha"].notna() & df["subcategoria"].notna()])
+    return pd.DataFrame({
+        "id": df["id"].astype(str).to_numpy(),
+        "fecha": df["fecha"].to_numpy(),
+        "subcategoria": df["subcategoria"].astype(object).to_numpy(),
+        "categoria": df["categoria"].astype(object).to_numpy(),
+        "cuenta": df["cuenta"].astype(object).to_numpy(),
+        "comentario": df["comentario"].astype(object).to_numpy(),
+        "importe_cent": df["importe_cent"].to_numpy(dtype="int64"),
+    })
+
+
+def construir(df):
+    gastos = _gastos(df).sort_values(_ORDEN, kind="stable", ignore_index=True)
+    return gastos.join(_puntuar(gastos, "importe_cent", VENTANA_MOVIMIENTOS, MIN_MOVIMIENTOS))
+
+
+def añadir(puntuados, df):
+    # Un gasto nuevo cambia su propia puntuación y la de los posteriores de su subcategoría
+    # (normalmente ninguno). La tabla está ordenada por subcategoría: solo se rehace el tramo de
+    # cada subcategoría afectada, y en él solo desde el primer gasto nuevo (con VENTANA de contexto)
+    nuevos = _gastos(df)
+    if nuevos.empty:
+        return puntuados
+    subcategorias = puntuados["subcategoria"].to_numpy()
+    partes, inicio = [], 0
+    for subcategoria, grupo in nuevos.groupby("subcategoria", sort=True):
+        a = np.searchsorted(subcategorias, subcategoria, side="left")
+        b = np.searchsorted(subcategorias, subcategoria, side="right")
+        tramo = pd.concat([puntuados.iloc[a:b].assign(nuevo=False), grupo.assign(nuevo=True)])
+        tramo = tramo.sort_values(_ORDEN, kind="stable", ignore_index=True)
+        primera = int(np.argmax(tramo["nuevo"].to_numpy()))
+        contexto = tramo.iloc[max(primera - VENTANA_MOVIMIENTOS, 0):]
+        resultado = _puntuar(contexto, "importe_cent", VENTANA_MOVIMIENTOS, MIN_MOVIMIENTOS)
+        tramo.loc[primera:, _PUNTUACIONES] = resultado.loc[primera:].to_numpy()
+        partes += [puntuados.iloc[inicio:a], tramo.drop(columns="nuevo")]
+        inicio = b
+    partes.append(puntuados.iloc[inicio:])
+    return pd.concat(partes, ignore_index=True)
+
+
+def obtener_puntuaciones():
+    return derivado(
+        "anomalias",
+        "movimientos",
+        lambda: construir(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        añadir,
+    )
+
+
+def movimientos_atipicos(puntuados, umbral=UMBRAL, desde=None):
+    # Gastos por encima del umbral, los más recientes primero
+    marca = puntuados["puntuacion"].to_numpy() >= umbral
+    if desde is not None:
+        marca &= puntuados["fecha"].to_numpy() >= np.datetime64(pd.Timestamp(desde))
+    atipicos = puntuados[marca].sort_values(["fecha", "puntuacion"], ascending=False, kind="stable")
+    return atipicos.assign(importe=atipicos["importe_cent"] / 100, mediana=atipicos["mediana"] / 100)[
+        ["fecha", "subcategoria", "categoria", "cuenta", "comentario", "importe", "mediana", "puntuacion"]
+    ]
+
+
+# ---------- Meses ----------
+
+def puntuar_meses(cubo):
+    # Total de cada subcategoría por mes (0 en los meses sin gasto desde que aparece) puntuado
+    # frente a los VENTANA_MESES meses anteriores
+    gastos = filtrar(cubo, tipo="gasto")
+    gastos = gastos[gastos["subcategoria"].notna() & gastos["año"].notna()]
+    if gastos.empty:
+        return pd.DataFrame(columns=["periodo", "subcategoria", "importe", "mediana", "puntuacion"])
+    periodo = pd.PeriodIndex.from_fields(year=gastos["año"].astype(int), month=gastos["mes"].astype(int), freq="M")
+    tabla = gastos["suma"].groupby([periodo, gastos["subcategoria"].astype(object).to_numpy()]).sum().unstack()
+    tabla = tabla.reindex(pd.period_range(tabla.index.min(), tabla.index.max(), freq="M"))
+    tabla = tabla.fillna(0).where(tabla.notna().cumsum() > 0)
+    meses = tabla.rename_axis(index="periodo", columns="subcategoria").T.stack().dropna().rename("suma").reset_index()
+    meses = meses.join(_puntuar(meses, "suma", VENTANA_MESES, MIN_MESES))
+    return meses.assign(importe=meses["suma"] / 100, mediana=meses["mediana"] / 100)[
+        ["periodo", "subcategoria", "importe", "mediana", "puntuacion"]
+    ]
+
+
+def obtener_meses(cubo):
+    return derivado("anomalias:meses", "movimientos", lambda: puntuar_meses(cubo))
+
+
+def meses_atipicos(meses, umbral=UMBRAL):
+    atipicos = meses[meses["puntuacion"].to_numpy() >= umbral]
+    return atipicos.sort_values(["periodo", "puntuacion"], ascending=False, kind="stable")
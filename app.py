@@ -1,60 +1,83 @@
 
 import streamlit as st
+import instrumentacion
 import pandas as pd
 from datetime import date
-from supabase_client import insertar_movimiento, obtener_saldos_iniciales, supabase
-from gastos import mostrar_gastos
-from ingresos import mostrar_ingresos
-from utils_movimientos import combinar_movimientos
+from supabase_client import supabase
+import cache_local
+from repositorio import insertar_movimiento, obtener_saldos_iniciales, cargar_presupuestos, guardar_presupuestos, invalidar, precargar, COLUMNAS_MOVIMIENTOS, SINCRONIZACION_LOCAL
+from gastos import mostrar_gastos, SUBCATEGORIAS_GASTO
+from ingresos import mostrar_ingresos, SUBCATEGORIAS_INGRESO
 from historico import mostrar_historico
-from movimientos import cargar_datos
+from importacion import mostrar_importacion
+from categorizacion import mostrar_reglas
+from duplicados import comprobar as comprobar_duplicados, DIAS_CERCANOS
+from alertas import avisar
+from movimientos import cargar_datos, cargar_todos
+from cubo import obtener_cubo
+from agregados import totales_mensuales, saldos_por_cuenta, presupuesto_vs_real, total as total_agregado
 
 
 
 st.set_page_config(page_title="Finanzas Familiares", layout="wide")
 st.title("📊 Finanzas Familiares")
 
-def resumen_mensual(df, tipo):
-    hoy = date.today()
-    df["fecha"] = pd.to_datetime(df["fecha"])
-    df_mes = df[(df["fecha"].dt.year == hoy.year) & (df["fecha"].dt.month == hoy.month)]
-    total = df_mes["importe"].sum()
-    resumen = df_mes.groupby("categoria")["importe"].sum().reset_index()
-    resumen = resumen[resumen["importe"] > 0].sort_values("importe", ascending=False)
-    return total, resumen
-
-tabs = st.tabs(["📆 Presupuesto", "🔴 Gastos", "🟢 Ingresos", "🔁 Transferencias", "📚 Histórico", "📊 Dashboard", "🍀 Vision Financiera",  "🧠 Inteligencia Financiera"])
+if st.sidebar.button("🔄 Recargar datos"):
+    invalidar()
+
+# Con la caché local, descarga completa por si se ha desincronizado
+if SINCRONIZACION_LOCAL and st.sidebar.button("♻️ Resincronizar caché local"):
+    cache_local.resincronizar()
+    invalidar()
+
+# Solo se ejecuta la sección activa: el resto no carga datos ni pinta nada en este rerun
+secciones = ["📆 Presupuesto", "🔴 Gastos", "🟢 Ingresos", "🔁 Transferencias", "📥 Importar", "📚 Histórico", "📊 Dashboard", "🍀 Vision Financiera",  "🧠 Inteligencia Financiera"]
+seccion = st.radio("Sección", secciones, horizontal=True, key="seccion", label_visibility="collapsed")
+instrumentacion.iniciar(seccion)
+
+# Datos que usa cada sección: se piden todos a la vez antes de pintar nada
+hoy = date.today()
+tabla_movimientos = ("movimientos", COLUMNAS_MOVIMIENTOS)
+datos_seccion = {
+    "📆 Presupuesto": ["presupuestos"],
+    "🔴 Gastos": [tabla_movimientos],
+    "🟢 Ingresos": [tabla_movimientos],
+    "🔁 Transferencias": [tabla_movimientos],
+    "📥 Importar": [],
+    "📚 Histórico": [tabla_movimientos],
+    "📊 Dashboard": [
+        "saldos_iniciales", saldos_por_cuenta,
+        lambda: totales_mensuales(hoy.year), lambda: presupuesto_vs_real(hoy.year, hoy.month)
+    ],
+    "🍀 Vision Financiera": ["presupuestos", "saldos_iniciales", tabla_movimientos, "objetivos", "objetivos_financieros"],
+    "🧠 Inteligencia Financiera": ["presupuestos", "saldos_iniciales", tabla_movimientos],
+}
+precargar(*datos_seccion[seccion])
 
 cuentas = ["Vivir", "Lujo", "Remunerada", "Inversiones", "Efectivo"]
 
-# ---------- PRESUPUESTO ----------
-with tabs[0]:
-
-    from supabase_client import supabase  # ⬅️ asegúrate de que esto esté presente
+meses = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
 
-    def cargar_presupuesto():
-        resp = supabase.table("presupuestos").select("*").execute()
-        if resp.data:
-            df = pd.DataFrame(resp.data)
-            df["mes"] = df["mes"].astype(int)
-            return df
-        else:
-            return pd.DataFrame(columns=["categoria", "mes", "importe"])
+# ---------- PRESUPUESTO ----------
+if seccion == "📆 Presupuesto":
 
     def guardar_presupuesto(df):
-        supabase.table("presupuestos").delete().neq("categoria", "").execute()
-        data = df.to_dict(orient="records")
-        supabase.table("presupuestos").insert(data).execute()
+        # Solo se envían las celdas (categoria, mes) que han cambiado respecto a lo cargado
+        actual = df_presupuesto.set_index(["categoria", "mes"])["importe"].astype(float)
+        nuevo = df.set_index(["categoria", "mes"])["importe"].astype(float)
+        previo = actual.reindex(nuevo.index)
+        cambiados = nuevo[previo.isna() | (previo != nuevo)]
+        guardar_presupuestos(cambiados.reset_index().to_dict(orient="records"))
+        return len(cambiados)
 
-    meses = [
-        "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-        "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
-    ]
     categorias = [
         "Casa", "Salud", "Transporte", "Trabajo", "Adquisiciones", "Ocio", "Otros", "Contabilidad"
     ]
 
-    df_presupuesto = cargar_presupuesto()
+    df_presupuesto = cargar_presupuestos()
 
     # ---------- Tabla Anual ----------
     st.markdown("### 🗓️ Presupuesto Anual")
@@ -68,8 +91,8 @@ with tabs[0]:
     if st.button("💾 Guardar presupuesto anual"):
         df_guardar = df_editado_anual.drop(columns=["Total Anual"]).melt(id_vars="categoria", var_name="mes", value_name="importe")
         df_guardar["mes"] = df_guardar["mes"].apply(lambda x: meses.index(x) + 1)
-        guardar_presupuesto(df_guardar)
-        st.success("✅ Presupuesto anual guardado correctamente")
+        n_cambios = guardar_presupuesto(df_guardar)
+        st.success(f"✅ Presupuesto anual guardado correctamente ({n_cambios} celdas actualizadas)")
 
     # ---------- Tabla Mensual ----------
     st.markdown("### 🔍 Editar un mes específico")
@@ -82,23 +105,20 @@ with tabs[0]:
 
     if st.button(f"💾 Guardar presupuesto de {mes_seleccionado}"):
         df_mes_editado["mes"] = mes_idx
-        guardar_presupuesto(df_presupuesto[df_presupuesto["mes"] != mes_idx].append(df_mes_editado))
+        guardar_presupuesto(df_mes_editado)
         st.success(f"✅ Presupuesto de {mes_seleccionado} guardado correctamente")
 
 # ---------- GASTOS ----------
-df_gastos = cargar_datos("gasto")
-with tabs[1]:
-    mostrar_gastos(df_gastos, cuentas)
+if seccion == "🔴 Gastos":
+    mostrar_gastos(cargar_datos("gasto"), cuentas, obtener_cubo())
 
 
 # ---------- INGRESOS ----------
-df_ingresos = cargar_datos("ingreso")
-with tabs[2]:
-    mostrar_ingresos(df_ingresos, cuentas)
+if seccion == "🟢 Ingresos":
+    mostrar_ingresos(cargar_datos("ingreso"), cuentas, obtener_cubo())
 
 # ---------- TRANSFERENCIAS ----------
-df_transf = cargar_datos("transferencia")
-with tabs[3]:
+if seccion == "🔁 Transferencias":
     st.subheader("Registro de transferencias")
 
     modo_transf = st.radio("¿Cómo quieres introducir las transferencias?", ["Formulario", "Tabla editable"])
@@ -110,46 +130,46 @@ with tabs[3]:
             hacia = st.selectbox("Hacia", [x for x in cuentas if x != desde], key="hacia_transf")
             importe = st.number_input("Importe", min_value=0.0, format="%.2f", key="importe_transf")
             comentario = st.text_input("Comentario (opcional)", key="comentario_transf")
+            forzar = st.checkbox("Registrar aunque ya exista una igual", key="forzar_transf")
             if st.form_submit_button("Añadir transferencia"):
-                insertar_movimiento([{
+                nueva = {
                     "fecha": fecha.isoformat(),
                     "desde": desde, "hacia": hacia,
                     "importe": importe, "comentario": comentario,
                     "tipo": "transferencia"
-                }])
-                st.success("Transferencia registrada")
+                }
+                marca = comprobar_duplicados(pd.DataFrame([nueva])).iloc[0]
+                if marca == "exacto" and not forzar:
+                    st.warning("⚠️ Ya hay una transferencia idéntica ese día: no se ha registrado.")
+                else:
+                    insertar_movimiento([nueva])
+                    st.success("Transferencia registrada")
+                    avisar([nueva])
+                    if marca == "posible":
+                        st.info(f"🔁 Hay otra transferencia del mismo importe entre esas cuentas a ±{DIAS_CERCANOS} días")
     else:
         st.write("Edita directamente las transferencias:")
-        edited_transf = st.data_editor(df_transf, use_container_width=True, num_rows="dynamic", key="edit_transf")
+        edited_transf = st.data_editor(cargar_datos("transferencia"), use_container_width=True, num_rows="dynamic", key="edit_transf")
 
-# ---------- HISTÓRICO ---------- 
-# Combinar los tres tipos de movimientos
-df_todos = combinar_movimientos(df_ingresos, df_gastos, df_transf)
+# ---------- IMPORTAR ----------
+if seccion == "📥 Importar":
+    mostrar_importacion(cuentas)
+    mostrar_reglas({"gasto": SUBCATEGORIAS_GASTO, "ingreso": SUBCATEGORIAS_INGRESO})
 
-# Mostrar histórico en la pestaña correspondiente
-with tabs[4]:
-    mostrar_historico(df_todos, cuentas)
+# ---------- HISTÓRICO ---------- 
+if seccion == "📚 Histórico":
+    mostrar_historico(cargar_todos(), cuentas)
 
 # ---------- DASHBOARD ---------- 
 from dashboard_section import mostrar_dashboard
 
-with tabs[5]:
-    from datetime import date
-    import numpy as np
-
+if seccion == "📊 Dashboard":
     st.markdown("### 📊 Dashboard")
 
-    # Filtrar datos del mes actual
-    hoy = date.today()
-    df_ingresos_mes = df_ingresos[
-        pd.to_datetime(df_ingresos["fecha"]).dt.month == hoy.month
-    ]
-    df_gastos_mes = df_gastos[
-        pd.to_datetime(df_gastos["fecha"]).dt.month == hoy.month
-    ]
-
-    total_ingresos = df_ingresos_mes["importe"].sum()
-    total_gastos = df_gastos_mes["importe"].sum()
+    # Totales del mes calculados en la base de datos
+    df_totales = totales_mensuales(hoy.year)
+    total_ingresos = total_agregado(df_totales, tipo="ingreso", mes=hoy.month)
+    total_gastos = total_agregado(df_totales, tipo="gasto", mes=hoy.month)
     ahorro = total_ingresos - total_gastos
     porcentaje_ahorro = (ahorro / total_ingresos * 100) if total_ingresos > 0 else 0
 
@@ -169,9 +189,6 @@ with tabs[5]:
         st.warning("Has gastado más de lo que ingresaste este mes. Revisa tus hábitos o gastos fijos. 🧾")
 
     mostrar_dashboard(
-        df_ingresos=df_ingresos,
-        df_gastos=df_gastos,
-        df_transf=df_transf,
         cuentas=cuentas,
         meses=meses,
         obtener_saldos_iniciales=obtener_saldos_iniciales
@@ -182,27 +199,24 @@ with tabs[5]:
 from vision_financiera import mostrar_vision_financiera
 from supabase_client import supabase
 
-with tabs[6]:
+if seccion == "🍀 Vision Financiera":
     mostrar_vision_financiera(
-    df_mov=df_todos,
-    df_presupuesto=df_presupuesto,
+    df_presupuesto=cargar_presupuestos(),
     obtener_saldos_iniciales=obtener_saldos_iniciales,
     cuentas=cuentas,
     meses=meses,
-    supabase=supabase
+    supabase=supabase,
+    cubo=obtener_cubo()
 )
 
 # ---------- INTELIGENCIA FINANCIERA ---------- 
 from inteligencia_financiera import mostrar_inteligencia_financiera
-with tabs[7]:
+if seccion == "🧠 Inteligencia Financiera":
     mostrar_inteligencia_financiera(
-    df_mov=df_todos,
-    df_presupuesto=df_presupuesto,
-    df_ingresos=df_ingresos,
-    df_gastos=df_gastos,
-    df_transf=df_transf,
+    df_presupuesto=cargar_presupuestos(),
     cuentas=cuentas,
-    obtener_saldos_iniciales=obtener_saldos_iniciales  # ✅ Nombre correcto del parámetro
+    obtener_saldos_iniciales=obtener_saldos_iniciales,  # ✅ Nombre correcto del parámetro
+    cubo=obtener_cubo()
 )
-    
 
+instrumentacion.panel()
@@ -1,15 +1,11 @@
 
-def resumen_mensual(df, tipo):
+def resumen_mensual(cubo, tipo):
     import pandas as pd
+    from cubo import totales, total
 
-    df = df.copy()
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-    mes_actual = pd.Timestamp.now().month
-    df_mes = df[df["fecha"].dt.month == mes_actual]
-
-    resumen = df_mes.groupby("subcategoria")["importe"].sum().reset_index()
+    hoy = pd.Timestamp.now()
+    resumen = totales(cubo, "subcategoria", tipo=tipo, año=hoy.year, mes=hoy.month).reset_index()
     resumen.columns = ["Subcategoría", "Total"]
     resumen = resumen.sort_values("Total", ascending=False)
 
-    total = df_mes["importe"].sum()
-    return total, resumen
+    return total(cubo, tipo=tipo, año=hoy.year, mes=hoy.month), resumen
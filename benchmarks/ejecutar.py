@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import types
+
+# Benchmark de las vistas mostrar_*: genera datos sintéticos de varios tamaños, los sirve desde
+# el backend local (SQLite en memoria, o en disco con --backend sqlite) y recorre cada sección
+# de app.py con AppTest, sin navegador ni red.
+#
+#   python benchmarks/ejecutar.py --filas 1e3 1e4 1e5            # medir y comparar con la referencia
+#   python benchmarks/ejecutar.py --filas 1e3 1e4 --guardar       # guardar como nueva referencia
+#   python benchmarks/ejecutar.py --backend sqlite                # SQLite en un fichero temporal
+#
+# "frio" es la primera visita tras cambiar los datos (descarga + agregados); "caliente" es un rerun.
+# Los tiempos solo se comparan en la máquina que los midió: cada máquina (host + CPU) guarda su
+# referencia en benchmarks/referencias/, que no se sube al repositorio. La primera vez hay que
+# medir con --guardar sobre el código de partida.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from almacenamiento import ClienteSQLite  # noqa: E402
+
+
+def _preparar(backend):
+    # El cliente sustituye a supabase_client antes de importar cualquier módulo de la app
+    global cliente, AppTest, generador, repositorio
+    ruta = os.path.join(tempfile.mkdtemp(prefix="finanzas_bench_"), "bench.sqlite") if backend == "sqlite" else ":memory:"
+    cliente = ClienteSQLite(ruta)
+    modulo = types.ModuleType("supabase_client")
+    modulo.supabase = cliente
+    sys.modules["supabase_client"] = modulo
+    from streamlit.testing.v1 import AppTest
+    import generador
+    import repositorio
+
+
+APP = os.path.join(RAIZ, "app.py")
+REFERENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "referencias")
+
+VISTAS = {
+    "mostrar_gastos": "🔴 Gastos",
+    "mostrar_ingresos": "🟢 Ingresos",
+    "mostrar_historico": "📚 Histórico",
+    "mostrar_dashboard": "📊 Dashboard",
+    "mostrar_vision_financiera": "🍀 Vision Financiera",
+    "mostrar_inteligencia_financiera": "🧠 Inteligencia Financiera",
+}
+
+# Diferencias por debajo de esto son ruido aunque el cociente sea grande
+MARGEN_SEGUNDOS = 0.05
+
+
+def maquina():
+    # Host, modelo de CPU y número de núcleos: lo que decide los tiempos
+    cpu = platform.processor() or platform.machine()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            cpu = next((linea.split(":", 1)[1].strip() for linea in f if linea.startswith("model name")), cpu)
+    return f"{platform.node()} · {cpu} · {os.cpu_count()} CPU"
+
+
+def ruta_referencia(descripcion):
+    return os.path.join(REFERENCIAS, re.sub(r"[^A-Za-z0-9]+", "_", descripcion).strip("_") + ".json")
+
+
+def _cronometrar(funcion):
+    inicio = time.perf_counter()
+    funcion()
+    return time.perf_counter() - inicio
+
+
+def medir_vista(seccion, timeout):
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.run()
+    repositorio.invalidar()
+    frio = _cronometrar(lambda: at.radio(key="seccion").set_value(seccion).run())
+    caliente = _cronometrar(lambda: at.run())
+    resultado = {"frio": round(frio, 4), "caliente": round(caliente, 4)}
+    if at.exception:
+        resultado["error"] = at.exception[0].message
+    return resultado
+
+
+def medir(filas, vistas, semilla, timeout):
+    t_generar = time.perf_counter()
+    for tabla, df in generador.generar(filas, semilla=semilla).items():
+        cliente.reemplazar(tabla, df)
+    print(f"\n== {filas:,} movimientos (generados en {time.perf_counter() - t_generar:.1f}s)")
+    resultados = {}
+    for vista in vistas:
+        resultados[vista] = medir_vista(VISTAS[vista], timeout)
+        r = resultados[vista]
+        print(f"  {vista:<34} frío {r['frio']:8.3f}s   caliente {r['caliente']:8.3f}s   {r.get('error', '')}")
+    return resultados
+
+
+def comparar(actual, referencia, tolerancia):
+    # Devuelve las mediciones que han empeorado más de la tolerancia respecto a la referencia
+    regresiones = []
+    for filas, vistas in actual.items():
+        for vista, r in vistas.items():
+            base = referencia.get(filas, {}).get(vista)
+            if not base:
+                continue
+            for medida in ("frio", "caliente"):
+                antes, ahora = base[medida], r[medida]
+                if ahora > antes * tolerancia and ahora - antes > MARGEN_SEGUNDOS:
+                    regresiones.append((filas, vista, medida, antes, ahora))
+            if "error" in r and "error" not in base:
+                regresiones.append((filas, vista, "error", 0, 0))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las vistas de Finanzas Familiares")
+    parser.add_argument("--filas", nargs="+", type=float, default=[1e3, 1e4, 1e5],
+                        help="Tamaños de la tabla de movimientos (de 1e3 a 1e7)")
+    parser.add_argument("--vistas", nargs="+", choices=list(VISTAS), default=list(VISTAS))
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--backend", choices=["memoria", "sqlite"], default="memoria")
+    parser.add_argument("--timeout", type=float, default=600, help="Segundos máximos por rerun")
+    parser.add_argument("--tolerancia", type=float, default=1.5,
+                        help="Cociente actual/referencia a partir del cual se marca una regresión")
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como referencia")
+    parser.add_argument("--referencia", help="Fichero de referencia (por defecto, el de esta máquina)")
+    args = parser.parse_args()
+    _preparar(args.backend)
+    descripcion = maquina()
+    args.referencia = args.referencia or ruta_referencia(descripcion)
+    print(f"Máquina: {descripcion}")
+
+    actual = {str(int(n)): medir(int(n), args.vistas, args.semilla, args.timeout) for n in args.filas}
+
+    referencia = {}
+    if os.path.exists(args.referencia):
+        with open(args.referencia, encoding="utf-8") as f:
+            referencia = json.load(f)
+    tiempos = referencia.setdefault("tiempos", {})
+
+    if args.guardar:
+        referencia["maquina"] = descripcion
+        for filas, vistas in actual.items():
+            tiempos.setdefault(filas, {}).update(vistas)
+        os.makedirs(os.path.dirname(args.referencia) or ".", exist_ok=True)
+        with open(args.referencia, "w", encoding="utf-8") as f:
+            json.dump(referencia, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"\n💾 Referencia guardada en {args.referencia}")
+        return 0
+
+    if not any(filas in tiempos for filas in actual):
+        print(f"\nℹ️ No hay referencia de esta máquina para estos tamaños: mídela con --guardar ({args.referencia})")
+        return 0
+
+    regresiones = comparar(actual, tiempos, args.tolerancia)
+    if not regresiones:
+        print("\n✅ Sin regresiones respecto a la referencia")
+        return 0
+    print("\n❌ Regresiones:")
+    for filas, vista, medida, antes, ahora in regresiones:
+        if medida == "error":
+            print(f"  {filas:>10} {vista}: falla y antes no fallaba")
+        else:
+            print(f"  {filas:>10} {vista} ({medida}): {antes:.3f}s → {ahora:.3f}s (x{ahora / antes:.1f})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
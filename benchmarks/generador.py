@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from gastos import SUBCATEGORIAS_GASTO
+from ingresos import SUBCATEGORIAS_INGRESO
+
+# Generador de datos sintéticos con la forma de las tablas de Supabase: movimientos,
+# presupuestos, saldos_iniciales, objetivos y objetivos_financieros. Vectorizado con numpy
+# para poder generar hasta 10⁷ movimientos en segundos; con la misma semilla sale lo mismo.
+CUENTAS = ["Vivir", "Lujo", "Remunerada", "Inversiones", "Efectivo"]
+
+# Reparto aproximado de un hogar: sobre todo gastos, algún ingreso y transferencias entre cuentas
+PROPORCION_TIPOS = {"gasto": 0.85, "ingreso": 0.08, "transferencia": 0.07}
+PESO_CUENTAS_GASTO = [0.55, 0.25, 0.05, 0.0, 0.15]
+
+COMERCIOS = [
+    "Mercadona", "Carrefour", "Lidl", "Repsol", "Cepsa", "Amazon", "Zara", "Iberdrola",
+    "Movistar", "Renfe", "Farmacia", "Decathlon", "El Corte Inglés", "Netflix", "Spotify", "Bar",
+]
+
+
+def _partir(lista):
+    # "Subcategoría:Categoría" → (subcategorías, categorías)
+    pares = [s.rsplit(":", 1) for s in lista]
+    return np.array([p[0] for p in pares], dtype=object), np.array([p[1] for p in pares], dtype=object)
+
+
+def _importes(rng, n, medianas, sigma):
+    return np.round(medianas * rng.lognormal(0.0, sigma, n), 2)
+
+
+def generar_movimientos(n, rng, años=3, hoy=None):
+    hoy = pd.Timestamp(hoy or pd.Timestamp.today()).normalize()
+    inicio = hoy - pd.DateOffset(years=años)
+    dias = (hoy - inicio).days + 1
+
+    tipos = rng.choice(list(PROPORCION_TIPOS), size=n, p=list(PROPORCION_TIPOS.values()))
+    fechas = inicio + pd.to_timedelta(rng.integers(0, dias, n), unit="D")
+    segundos = pd.to_timedelta(rng.integers(0, 86400, n), unit="s")
+
+    df = pd.DataFrame({
+        "id": pd.Series(np.arange(n)).astype(str).str.zfill(len(str(n))).radd("mov-"),
+        "fecha": fechas.strftime("%Y-%m-%d"),
+        "tipo": tipos,
+        "cuenta": None,
+        "categoria": None,
+        "subcategoria": None,
+        "importe": 0.0,
+        "comentario": None,
+        "desde": None,
+        "hacia": None,
+        "created_at": (fechas + segundos).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+    })
+
+    # Cada subcategoría tiene su importe típico; los movimientos se reparten alrededor de él
+    for tipo, lista, sigma, mediana in [("gasto", SUBCATEGORIAS_GASTO, 0.6, 35.0), ("ingreso", SUBCATEGORIAS_INGRESO, 0.4, 900.0)]:
+        filas = np.flatnonzero(tipos == tipo)
+        subcats, cats = _partir(lista)
+        tipicos = np.round(rng.lognormal(np.log(mediana), 0.8, len(subcats)), 2)
+        elegida = rng.integers(0, len(subcats), len(filas))
+        df.loc[filas, "subcategoria"] = subcats[elegida]
+        df.loc[filas, "categoria"] = cats[elegida]
+        df.loc[filas, "importe"] = _importes(rng, len(filas), tipicos[elegida], sigma)
+        pesos = PESO_CUENTAS_GASTO if tipo == "gasto" else [0.9, 0.0, 0.1, 0.0, 0.0]
+        df.loc[filas, "cuenta"] = rng.choice(CUENTAS, size=len(filas), p=pesos)
+        comercio = rng.choice(COMERCIOS, size=len(filas))
+        df.loc[filas, "comentario"] = np.char.add(np.char.add(comercio.astype(str), " "), subcats[elegida].astype(str))
+
+    filas = np.flatnonzero(tipos == "transferencia")
+    desde = rng.integers(0, len(CUENTAS), len(filas))
+    hacia = (desde + rng.integers(1, len(CUENTAS), len(filas))) % len(CUENTAS)
+    df.loc[filas, "desde"] = np.array(CUENTAS, dtype=object)[desde]
+    df.loc[filas, "hacia"] = np.array(CUENTAS, dtype=object)[hacia]
+    df.loc[filas, "importe"] = _importes(rng, len(filas), 250.0, 0.9)
+    df.loc[filas, "comentario"] = "Traspaso"
+    return df
+
+
+def generar_presupuestos(movimientos, meses_historico):
+    # Presupuesto por categoría y mes: el gasto medio mensual más un 10 %
+    gastos = movimientos[movimientos["tipo"] == "gasto"]
+    mensual = gastos.groupby("categoria")["importe"].sum() / max(meses_historico, 1)
+    filas = [
+        {"categoria": cat, "mes": mes, "importe": round(float(importe) * 1.1, 2)}
+        for cat, importe in mensual.items()
+        for mes in range(1, 13)
+    ]
+    return pd.DataFrame(filas, columns=["categoria", "mes", "importe"])
+
+
+def generar(n_movimientos, semilla=0, años=3, hoy=None):
+    rng = np.random.default_rng(semilla)
+    movimientos = generar_movimientos(n_movimientos, rng, años, hoy)
+    saldos = pd.DataFrame({"cuenta": CUENTAS, "saldo_inicial": np.round(rng.uniform(500, 20000, len(CUENTAS)), 2)})
+    objetivos = pd.DataFrame([
+        {"id": i + 1, "tipo": tipo, "descripcion": desc, "cuenta": cuenta, "monto": monto, "fecha_limite": fecha}
+        for i, (tipo, desc, cuenta, monto, fecha) in enumerate([
+            ("Ahorro", "Colchón de emergencia", "Remunerada", 15000.0, "2027-12-31"),
+            ("Inversión", "Cartera indexada", "Inversiones", 50000.0, "2030-12-31"),
+        ])
+    ])
+    objetivos_financieros = pd.DataFrame([
+        {"id": "obj-1", "nombre": "Vacaciones", "meta": 3000.0, "ahorrado": 1200.0},
+        {"id": "obj-2", "nombre": "Coche", "meta": 12000.0, "ahorrado": 4000.0},
+    ])
+    return {
+        "movimientos": movimientos,
+        "presupuestos": generar_presupuestos(movimientos, años * 12),
+        "saldos_iniciales": saldos,
+        "objetivos": objetivos,
+        "objetivos_financieros": objetivos_financieros,
+    }
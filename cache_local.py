@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+import streamlit as st
+
+import repositorio
+from supabase_client import supabase
+
+# Caché local en SQLite para arrancar desde disco y traer de Supabase solo lo nuevo
+RUTA_CACHE = os.getenv("FINANZAS_CACHE", os.path.join(".cache", "finanzas.sqlite"))
+
+TABLAS_SINCRONIZADAS = ["movimientos", "presupuestos", "saldos_iniciales"]
+
+# Tamaño de los lotes de ids en las consultas in_() (la URL tiene un límite de longitud)
+LOTE_IDS = 200
+
+# La marca se retrasa este margen: now() en PostgreSQL es la hora de inicio de la transacción y
+# una escritura puede confirmarse después de que otra más reciente ya se haya sincronizado
+MARGEN_MARCA = pd.Timedelta(minutes=5)
+
+
+def _columnas():
+    # updated_at (sql/movimientos_updated_at.sql) es la marca de agua: la cambia cualquier alta o
+    # edición. repositorio importa este módulo, así que sus constantes se leen aquí y no al importar.
+    return repositorio.COLUMNAS_MOVIMIENTOS + ("updated_at",)
+
+
+@st.cache_resource
+def _conexion():
+    carpeta = os.path.dirname(RUTA_CACHE)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    con = sqlite3.connect(RUTA_CACHE, check_same_thread=False)
+    columnas = ", ".join(
+        f"{col} REAL" if col == "importe" else f"{col} TEXT"
+        for col in _columnas() if col != "id"
+    )
+    con.execute(f"CREATE TABLE IF NOT EXISTS movimientos (id TEXT PRIMARY KEY, {columnas})")
+    # Cachés creadas antes de updated_at: sin marca, la primera sincronización lo trae todo
+    if "updated_at" not in {fila[1] for fila in con.execute("PRAGMA table_info(movimientos)")}:
+        con.execute("ALTER TABLE movimientos ADD COLUMN updated_at TEXT")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_updated_at ON movimientos (updated_at)")
+    con.commit()
+    return con, threading.Lock()
+
+
+def _guardar_filas(con, filas):
+    # Upsert por id que solo pisa las columnas presentes en cada fila (por juegos de columnas)
+    for grupo in repositorio._por_columnas(filas):
+        columnas = [col for col in _columnas() if col in grupo[0]]
+        actualizar = ", ".join(f"{col} = excluded.{col}" for col in columnas if col != "id")
+        conflicto = f"DO UPDATE SET {actualizar}" if actualizar else "DO NOTHING"
+        con.executemany(
+            f"INSERT INTO movimientos ({', '.join(columnas)}) "
+            f"VALUES ({', '.join('?' for _ in columnas)}) "
+            f"ON CONFLICT(id) {conflicto}",
+            [tuple(fila.get(col) for col in columnas) for fila in grupo],
+        )
+
+
+def _actualizar_filas(con, cambios):
+    # Ediciones: UPDATE de las columnas que trae cada una; un id que ya no está no se recrea
+    for grupo in repositorio._por_columnas(cambios):
+        columnas = [col for col in _columnas() if col in grupo[0] and col != "id"]
+        if not columnas:
+            continue
+        con.executemany(
+            f"UPDATE movimientos SET {', '.join(f'{col} = ?' for col in columnas)} WHERE id = ?",
+            [tuple(fila[col] for col in columnas) + (fila["id"],) for fila in grupo],
+        )
+
+
+def _borrar_filas(con, ids):
+    for i in range(0, len(ids), LOTE_IDS):
+        lote = ids[i:i + LOTE_IDS]
+        con.execute(f"DELETE FROM movimientos WHERE id IN ({', '.join('?' for _ in lote)})", lote)
+
+
+def _ids_remotos():
+    ids = set()
+    for filas in repositorio.paginas("movimientos", ["id"]):
+        ids.update(fila["id"] for fila in filas)
+    return ids
+
+
+def _sincronizar_movimientos(con):
+    columnas = list(_columnas())
+
+    # 1) Filas creadas o editadas (en este o en otro dispositivo) desde la última marca de agua:
+    #    el updated_at más reciente en local menos MARGEN_MARCA. Volver a traer filas que ya se
+    #    tienen no cambia nada: el upsert es idempotente.
+    marca = con.execute("SELECT MAX(updated_at) FROM movimientos").fetchone()[0]
+    if marca:
+        desde = (pd.Timestamp(marca) - MARGEN_MARCA).isoformat()
+        filtrar = lambda consulta: consulta.gte("updated_at", desde)
+    else:
+        filtrar = None
+    for filas in repositorio.paginas("movimientos", columnas, filtrar):
+        _guardar_filas(con, filas)
+    con.commit()
+
+    # 2) Borrados: updated_at no los registra. Con las altas ya traídas, si el número de filas
+    #    coincide no falta ni sobra nada; si no, se comparan los ids y se corrigen las diferencias.
+    #    Lo que se escape a las dos comprobaciones (p. ej. una transacción más larga que el margen)
+    #    se arregla con resincronizar().
+    total_remoto = supabase.table("movimientos").select("id", count="exact").limit(1).execute().count
+    total_local = con.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0]
+    if total_remoto == total_local:
+        return
+
+    ids_remotos = _ids_remotos()
+    ids_locales = {fila[0] for fila in con.execute("SELECT id FROM movimientos")}
+
+    _borrar_filas(con, list(ids_locales - ids_remotos))
+
+    # Filas remotas anteriores a la marca que aún no están en local
+    faltan = list(ids_remotos - ids_locales)
+    for i in range(0, len(faltan), LOTE_IDS):
+        lote = faltan[i:i + LOTE_IDS]
+        filas = supabase.table("movimientos").select(",".join(columnas)).in_("id", lote).execute().data
+        _guardar_filas(con, filas)
+    con.commit()
+
+
+def _sincronizar_tabla_pequeña(con, tabla):
+    # presupuestos y saldos_iniciales tienen decenas de filas: se reemplazan enteras
+    filas = [fila for pagina in repositorio.paginas(tabla) for fila in pagina]
+    if filas:
+        pd.DataFrame(filas).to_sql(tabla, con, if_exists="replace", index=False)
+    else:
+        con.execute(f"DROP TABLE IF EXISTS {tabla}")
+
+
+def sincronizar(tabla):
+    con, lock = _conexion()
+    with lock:
+        if tabla == "movimientos":
+            _sincronizar_movimientos(con)
+        else:
+            _sincronizar_tabla_pequeña(con, tabla)
+        try:
+            return pd.read_sql(f"SELECT * FROM {tabla}", con)
+        except pd.errors.DatabaseError:
+            return pd.DataFrame()
+
+
+def guardar_movimientos(filas):
+    # Escritura directa de los cambios que la app acaba de enviar a Supabase, para no esperar a la
+    # siguiente sincronización (que los volverá a traer con su updated_at)
+    con, lock = _conexion()
+    with lock:
+        _guardar_filas(con, filas)
+        con.commit()
+
+
+def actualizar_movimientos(cambios):
+    con, lock = _conexion()
+    with lock:
+        _actualizar_filas(con, cambios)
+        con.commit()
+
+
+def borrar_movimientos(ids):
+    con, lock = _conexion()
+    with lock:
+        _borrar_filas(con, list(ids))
+        con.commit()
+
+
+def resincronizar():
+    # Vacía la caché local: la siguiente lectura descarga todas las tablas enteras
+    con, lock = _conexion()
+    with lock:
+        con.execute("DELETE FROM movimientos")
+        for tabla in TABLAS_SINCRONIZADAS:
+            if tabla != "movimientos":
+                con.execute(f"DROP TABLE IF EXISTS {tabla}")
+        con.commit()
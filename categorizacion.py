@@ -0,0 +1,253 @@
+import re
+import uuid
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+from duplicados import normalizar_concepto
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_reglas, cargar_tabla, derivado, guardar_reglas
+
+# Categorización automática de gastos e ingresos a partir del concepto.
+#   - reglas del usuario (tabla reglas_categoria): palabras clave o expresiones regulares
+#   - reglas aprendidas del histórico ya categorizado: palabras (y conceptos completos) que en al
+#     menos MIN_CONFIANZA de sus apariciones llevan la misma subcategoría
+# Todas las palabras clave de un tipo se compilan en un único autómata de Aho-Corasick sobre
+# palabras: cada concepto se recorre una vez, sea cual sea el número de reglas. Se trabaja sobre
+# los conceptos distintos del lote, no sobre cada fila.
+# Entre varias coincidencias gana: regla del usuario > aprendida, luego prioridad, luego la
+# clave más larga y luego la más frecuente en el histórico.
+TIPOS = ["gasto", "ingreso"]
+
+MIN_CONFIANZA = 0.9
+MIN_SOPORTE = 3
+
+# Palabras que se aprenden: al menos tres caracteres y alguna letra (fuera fechas, referencias...)
+_PALABRA_APRENDIBLE = r"^(?=.*[a-z])[a-z0-9]{3,}$"
+
+
+# ---------- Autómata ----------
+
+def _automata(claves):
+    # claves: {tupla de palabras: valor}. Devuelve (transiciones, fallos, salidas) de un
+    # Aho-Corasick cuyo alfabeto son palabras completas
+    transiciones, fallos, salidas = [{}], [0], [[]]
+    for palabras, valor in claves.items():
+        nodo = 0
+        for palabra in palabras:
+            siguiente = transiciones[nodo].get(palabra)
+            if siguiente is None:
+                siguiente = len(transiciones)
+                transiciones.append({})
+                fallos.append(0)
+                salidas.append([])
+                transiciones[nodo][palabra] = siguiente
+            nodo = siguiente
+        salidas[nodo].append(valor)
+
+    cola = deque(transiciones[0].values())
+    while cola:
+        nodo = cola.popleft()
+        for palabra, hijo in transiciones[nodo].items():
+            cola.append(hijo)
+            fallo = fallos[nodo]
+            while fallo and palabra not in transiciones[fallo]:
+                fallo = fallos[fallo]
+            destino = transiciones[fallo].get(palabra, 0)
+            fallos[hijo] = destino if destino != hijo else 0
+            salidas[hijo] = salidas[hijo] + salidas[fallos[hijo]]
+    return transiciones, fallos, salidas
+
+
+def _buscar(automata, palabras):
+    transiciones, fallos, salidas = automata
+    nodo, encontrados = 0, []
+    for palabra in palabras:
+        while nodo and palabra not in transiciones[nodo]:
+            nodo = fallos[nodo]
+        nodo = transiciones[nodo].get(palabra, 0)
+        encontrados.extend(salidas[nodo])
+    return encontrados
+
+
+def _mejor(a, b):
+    # Cada valor es (usuario, prioridad, nº de palabras, soporte, subcategoria, categoria, origen);
+    # se comparan solo los cuatro primeros campos
+    if a is None or b is None:
+        return a if b is None else b
+    return b if b[:4] > a[:4] else a
+
+
+# ---------- Modelo ----------
+
+def _aprender(historial, tipo):
+    # {texto: (soporte, subcategoria, categoria)} con las palabras sueltas y los conceptos
+    # completos (normalizados) que casi siempre llevan la misma subcategoría
+    df = historial[(historial["tipo"] == tipo) & historial["subcategoria"].notna() & historial["comentario"].notna()]
+    if df.empty:
+        return {}
+    conteos = (
+        df.groupby(["comentario", "subcategoria", "categoria"], observed=True, dropna=False)
+        .size().rename("n").reset_index()
+    )
+    conteos["concepto"] = normalizar_concepto(conteos["comentario"]).to_numpy()
+    conteos = conteos[conteos["concepto"] != ""]
+
+    palabras = conteos.assign(clave=conteos["concepto"].str.split().map(lambda p: list(dict.fromkeys(p)))).explode("clave")
+    palabras = palabras[palabras["clave"].str.match(_PALABRA_APRENDIBLE)]
+    completos = conteos.assign(clave=conteos["concepto"])
+
+    aprendidas = {}
+    for candidatos in (palabras, completos):
+        por_destino = candidatos.groupby(["clave", "subcategoria", "categoria"], observed=True, dropna=False)["n"].sum()
+        total = por_destino.groupby(level="clave").sum()
+        mejor = por_destino.sort_values(ascending=False, kind="stable").groupby(level="clave").head(1)
+        soporte = total.reindex(mejor.index.get_level_values("clave")).to_numpy()
+        validas = (mejor.to_numpy() / soporte >= MIN_CONFIANZA) & (soporte >= MIN_SOPORTE)
+        for (clave, subcategoria, categoria), n in mejor[validas].items():
+            aprendidas[clave] = (int(n), subcategoria, None if pd.isna(categoria) else categoria)
+    return aprendidas
+
+
+def construir_modelo(historial, reglas):
+    # Por tipo: el autómata de palabras clave y la lista de expresiones regulares del usuario
+    modelo = {}
+    for tipo in TIPOS:
+        claves = {}
+        for texto, (soporte, subcategoria, categoria) in _aprender(historial, tipo).items():
+            clave = tuple(texto.split())
+            claves[clave] = (0, 0, len(clave), soporte, subcategoria, categoria, "aprendida")
+        propias = reglas[reglas["tipo"] == tipo]
+        expresiones = []
+        for regla in propias.itertuples():
+            valor = (1, regla.prioridad, 0, 0, regla.subcategoria, regla.categoria, f"regla: {regla.patron}")
+            if regla.es_regex:
+                try:
+                    expresiones.append((re.compile(regla.patron), valor))
+                except re.error:
+                    continue
+            else:
+                palabras = tuple(normalizar_concepto(pd.Series([regla.patron])).iloc[0].split())
+                if palabras:
+                    valor = valor[:2] + (len(palabras),) + valor[3:]
+                    claves[palabras] = _mejor(claves.get(palabras), valor)
+        modelo[tipo] = {"automata": _automata(claves), "expresiones": expresiones}
+    return modelo
+
+
+def obtener_modelo():
+    return derivado(
+        "categorizador",
+        ("movimientos", "reglas_categoria"),
+        lambda: construir_modelo(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS), cargar_reglas()),
+    )
+
+
+# ---------- Aplicación ----------
+
+def sugerencias(df, modelo=None):
+    # subcategoria, categoria y origen propuestos para cada fila de gasto o ingreso de df
+    # (None si ninguna regla coincide)
+    modelo = modelo or obtener_modelo()
+    resultado = pd.DataFrame({"subcategoria": None, "categoria": None, "origen": None}, index=df.index, dtype=object)
+    if df.empty:
+        return resultado
+    conceptos = normalizar_concepto(df["comentario"] if "comentario" in df.columns else pd.Series("", index=df.index))
+    tipos = df["tipo"].astype(object)
+    for tipo in TIPOS:
+        filas = (tipos == tipo).to_numpy()
+        if not filas.any():
+            continue
+        automata, expresiones = modelo[tipo]["automata"], modelo[tipo]["expresiones"]
+        distintos = pd.Series(conceptos[filas].unique())
+        mejores = [max(_buscar(automata, c.split()), key=lambda v: v[:4], default=None) for c in distintos]
+        for expresion, valor in expresiones:
+            coinciden = distintos.str.contains(expresion, regex=True).to_numpy()
+            mejores = [_mejor(m, valor) if c else m for m, c in zip(mejores, coinciden)]
+        elegido = dict(zip(distintos, mejores))
+        valores = conceptos[filas].map(elegido)
+        for i, col in ((4, "subcategoria"), (5, "categoria"), (6, "origen")):
+            resultado.loc[filas, col] = valores.map(lambda v: v[i] if isinstance(v, tuple) else None).to_numpy()
+    return resultado
+
+
+def categorizar(df, modelo=None):
+    # Rellena subcategoría y categoría de los gastos e ingresos que no la tienen
+    df = df.copy()
+    for col in ("subcategoria", "categoria"):
+        if col not in df.columns:
+            df[col] = None
+        df[col] = df[col].astype(object)
+    sin_categoria = df["subcategoria"].isna() | df["subcategoria"].eq("")
+    if not sin_categoria.any():
+        return df
+    propuestas = sugerencias(df[sin_categoria], modelo)
+    asignables = propuestas["subcategoria"].notna()
+    indices = propuestas.index[asignables]
+    df.loc[indices, "subcategoria"] = propuestas.loc[indices, "subcategoria"]
+    df.loc[indices, "categoria"] = propuestas.loc[indices, "categoria"]
+    return df
+
+
+# ---------- Interfaz ----------
+
+def mostrar_reglas(subcategorias):
+    # subcategorias: {"gasto": ["Sub:Cat", ...], "ingreso": [...]} como en gastos.py / ingresos.py
+    with st.expander("🏷️ Reglas de categorización automática"):
+        st.caption(
+            "Se aplican al importar extractos y al guardar filas nuevas sin subcategoría. Las palabras "
+            "clave se buscan como palabras completas sin distinguir tildes ni mayúsculas; con «Regex» el "
+            "patrón es una expresión regular sobre ese mismo texto. Además se aprenden reglas de los "
+            "movimientos ya categorizados."
+        )
+        reglas = cargar_reglas()
+        destinos = sorted({s for lista in subcategorias.values() for s in lista})
+        editor = reglas.assign(destino=reglas["subcategoria"] + ":" + reglas["categoria"])
+        editor = editor[["id", "tipo", "patron", "es_regex", "destino", "prioridad"]]
+        editado = st.data_editor(
+            editor,
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "id": None,
+                "tipo": st.column_config.SelectboxColumn("Tipo", options=TIPOS, required=True),
+                "patron": st.column_config.TextColumn("Palabras clave o patrón", required=True),
+                "es_regex": st.column_config.CheckboxColumn("Regex", default=False),
+                "destino": st.column_config.SelectboxColumn("Subcategoría:Categoría", options=destinos, required=True),
+                "prioridad": st.column_config.NumberColumn("Prioridad", default=0, step=1),
+            },
+            key="editor_reglas",
+        )
+        if st.button("💾 Guardar reglas"):
+            editado = editado.dropna(subset=["tipo", "patron", "destino"])
+            invalidas = [p for p, r in zip(editado["patron"], editado["es_regex"]) if r and not _compila(p)]
+            if invalidas:
+                st.error(f"❌ Expresiones regulares no válidas: {', '.join(invalidas)}")
+            else:
+                partes = editado["destino"].str.rsplit(":", n=1)
+                filas = [
+                    {
+                        "id": fila.id if isinstance(fila.id, str) and fila.id else str(uuid.uuid4()),
+                        "tipo": fila.tipo, "patron": fila.patron, "es_regex": bool(fila.es_regex),
+                        "subcategoria": destino[0], "categoria": destino[-1],
+                        "prioridad": int(fila.prioridad) if pd.notna(fila.prioridad) else 0,
+                    }
+                    for fila, destino in zip(editado.itertuples(), partes)
+                ]
+                guardar_reglas(filas, set(reglas["id"]) - set(editado["id"].dropna()))
+                st.success(f"✅ {len(filas)} reglas guardadas")
+                st.rerun()
+
+        prueba = st.text_input("Probar un concepto", placeholder="Ej.: RECIBO IBERDROLA CLIENTES")
+        if prueba:
+            ejemplo = pd.DataFrame({"tipo": TIPOS, "comentario": prueba})
+            st.dataframe(sugerencias(ejemplo).assign(tipo=TIPOS), use_container_width=True, hide_index=True)
+
+
+def _compila(patron):
+    try:
+        re.compile(patron)
+        return True
+    except re.error:
+        return False
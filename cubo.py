@@ -0,0 +1,64 @@
+import pandas as pd
+
+from esquema import con_importe
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_tabla, derivado
+
+# Cubo de agregados: una fila por combinación de dimensiones con suma, número y máximo de importe.
+# Todas las métricas y gráficos leen de aquí, así el coste de pintar no depende del número de movimientos.
+# Suma y máximo se guardan en céntimos (enteros exactos) y se devuelven en euros al consultar.
+DIMENSIONES = ["año", "mes", "tipo", "categoria", "subcategoria", "cuenta"]
+
+
+def _agregar(df, claves):
+    return (
+        df.groupby(claves, dropna=False, observed=True)
+        .agg(suma=("suma", "sum"), n=("n", "sum"), maximo=("maximo", "max"))
+        .reset_index()
+    )
+
+
+def construir_cubo(df_mov):
+    df = con_importe(df_mov[df_mov["fecha"].notna()])
+    base = df[DIMENSIONES].assign(suma=df["importe_cent"], n=1, maximo=df["importe_cent"])
+    return _agregar(base, DIMENSIONES)
+
+
+def actualizar_cubo(cubo, nuevos):
+    # Las filas nuevas se agregan aparte y se combinan con el cubo: suma y n se suman, máximo es el máximo
+    return _agregar(pd.concat([cubo, construir_cubo(nuevos)], ignore_index=True), DIMENSIONES)
+
+
+def obtener_cubo():
+    return derivado(
+        "cubo",
+        "movimientos",
+        lambda: construir_cubo(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        actualizar_cubo,
+    )
+
+
+def filtrar(cubo, **condiciones):
+    # filtrar(cubo, tipo="gasto", año=2024): cada valor puede ser un escalar o una lista
+    mascara = pd.Series(True, index=cubo.index)
+    for col, valor in condiciones.items():
+        if isinstance(valor, (list, tuple, set)):
+            mascara &= cubo[col].isin(valor)
+        else:
+            mascara &= cubo[col] == valor
+    return cubo[mascara]
+
+
+def totales(cubo, por, metrica="suma", **condiciones):
+    # Serie con la métrica agregada por una o varias dimensiones
+    df = filtrar(cubo, **condiciones)
+    agregacion = "max" if metrica == "maximo" else "sum"
+    serie = df.groupby(por, observed=True)[metrica].agg(agregacion)
+    return serie if metrica == "n" else serie / 100
+
+
+def total(cubo, metrica="suma", **condiciones):
+    df = filtrar(cubo, **condiciones)
+    if df.empty:
+        return 0
+    valor = df[metrica].max() if metrica == "maximo" else df[metrica].sum()
+    return valor if metrica == "n" else valor / 100
@@ -0,0 +1,126 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from esquema import a_centimos
+from indice_busqueda import normalizar
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_tabla, derivado
+
+# Índice de huellas para detectar movimientos repetidos sin comparar cada par de filas.
+#   - huella exacta:   hash de (tipo, cuenta o desde>hacia, importe en céntimos, día, concepto
+#                      normalizado). Repetida = ya existe ese mismo movimiento.
+#   - huella cercana:  hash de (tipo, cuentas, importe) en los bits altos y el día en los 20 bits
+#                      bajos. Ordenadas, los movimientos con la misma clave quedan contiguos y por
+#                      día, así "mismo importe a ±N días" es un rango de searchsorted.
+# El índice son dos arrays uint64 ordenados que se guardan junto al libro (derivado por versión
+# de movimientos) y se amplían con las altas sin recalcularse.
+DIAS_CERCANOS = 3
+
+_BITS_DIA = 20
+_MASCARA_DIA = np.uint64((1 << _BITS_DIA) - 1)
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str)
+
+
+def normalizar_concepto(serie):
+    # Minúsculas, sin tildes ni signos: "Recibo  LUZ, Iberdrola" == "recibo luz iberdrola"
+    valores = _texto(serie)
+    mapa = {v: re.sub(r"[^a-z0-9]+", " ", normalizar(v)).strip() for v in valores.unique()}
+    return valores.map(mapa)
+
+
+def _claves(df):
+    # Huellas (exacta, cercana) de cada fila y máscara de filas con fecha e importe válidos
+    fecha = df["fecha"] if pd.api.types.is_datetime64_any_dtype(df["fecha"]) else pd.to_datetime(df["fecha"], errors="coerce")
+    dia = fecha.to_numpy(dtype="datetime64[D]").astype("int64")
+    dia = np.where(fecha.notna().to_numpy(), dia, 0).astype(np.uint64)
+
+    # Las filas de los formularios solo traen las columnas de su tipo
+    columna = lambda col: _texto(df[col]) if col in df.columns else pd.Series("", index=df.index, dtype=object)
+    tipo = columna("tipo")
+    cuentas = columna("cuenta").where(tipo.ne("transferencia"), columna("desde") + ">" + columna("hacia"))
+    centimos = df["importe_cent"] if "importe_cent" in df.columns else a_centimos(df["importe"])
+    valida = fecha.notna().to_numpy() & centimos.notna().to_numpy()
+
+    base = pd.util.hash_pandas_object(
+        pd.DataFrame({"tipo": tipo, "cuentas": cuentas, "importe": centimos.to_numpy(dtype="int64", na_value=0)}, index=df.index), index=False
+    ).to_numpy()
+    cercana = (base & ~_MASCARA_DIA) | dia
+    exacta = pd.util.hash_pandas_object(
+        pd.DataFrame({"base": base, "dia": dia, "concepto": normalizar_concepto(columna("comentario")).to_numpy()}), index=False
+    ).to_numpy()
+    return exacta, cercana, valida
+
+
+def construir(df):
+    exacta, cercana, valida = _claves(df)
+    return {"exactas": np.sort(exacta[valida]), "cercanas": np.sort(cercana[valida])}
+
+
+def añadir(indice, df):
+    # Índice ampliado con las filas de df (altas de la caché o lotes ya importados)
+    if df.empty:
+        return indice
+    nuevo = construir(df)
+    return {k: np.sort(np.concatenate([indice[k], nuevo[k]]), kind="mergesort") for k in indice}
+
+
+def obtener_indice():
+    return derivado(
+        "huellas",
+        "movimientos",
+        lambda: construir(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        actualizar=añadir,
+    )
+
+
+def indice_sin(ids):
+    # Índice del histórico sin las filas de `ids` (no se guarda: solo para reanudar importaciones)
+    df = cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)
+    return construir(df[~df["id"].isin(ids)])
+
+
+def vacio():
+    # Índice sin huellas (las filas ya comprobadas de una importación antes del primer trozo)
+    return {"exactas": np.array([], dtype=np.uint64), "cercanas": np.array([], dtype=np.uint64)}
+
+
+def _en_ventana(ordenadas, claves, dias):
+    # Número de huellas de `ordenadas` a ±dias de cada clave (misma clave, día cercano)
+    dias = np.uint64(dias)
+    return np.searchsorted(ordenadas, claves + dias, side="right") - np.searchsorted(ordenadas, claves - dias, side="left")
+
+
+def comprobar(df, indice=None, dias=DIAS_CERCANOS, previas=None):
+    # "exacto", "posible" o "" por fila de df.
+    #   - exacto:  el histórico ya tiene ese movimiento, tantas veces como aparece en el lote hasta
+    #              esa fila (volver a importar un extracto, o uno que se solapa con el anterior)
+    #   - posible: otro movimiento con el mismo importe y cuentas a ±dias días (con otro concepto
+    #              u otra fecha), o una copia idéntica de una fila anterior del lote: dos cargos
+    #              iguales el mismo día pueden ser reales (dos cafés) y no se descartan sin más
+    # previas: índice de las filas del mismo lote ya comprobadas (importación por trozos)
+    if indice is None:
+        indice = obtener_indice()
+    if previas is None:
+        previas = vacio()
+    if df.empty:
+        return pd.Series("", index=df.index, dtype=object)
+    exacta, cercana, valida = _claves(df)
+
+    en_historico = _en_ventana(indice["exactas"], exacta, 0)
+    repetida = pd.Series(exacta).duplicated().to_numpy()
+    anteriores = _en_ventana(previas["exactas"], exacta, 0) + pd.Series(exacta).groupby(exacta).cumcount().to_numpy()
+    exacto = valida & (anteriores < en_historico)
+
+    # En el propio lote solo cuentan las filas distintas: la primera de dos iguales no es "posible"
+    unicas = np.sort(cercana[valida & ~repetida])
+    cercano = (
+        (_en_ventana(indice["cercanas"], cercana, dias) > 0)
+        | (_en_ventana(previas["cercanas"], cercana, dias) > 0)
+        | (_en_ventana(unicas, cercana, dias) > 1)
+    )
+    posible = valida & ~exacto & (cercano | (anteriores > 0))
+    return pd.Series(np.select([exacto, posible], ["exacto", "posible"], ""), index=df.index)
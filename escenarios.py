@@ -0,0 +1,63 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cubo import totales, total
+from repositorio import cargar_presupuestos, derivado
+
+# Motor de escenarios del simulador de presupuestos. Un escenario es un vector de ajustes (%) por
+# categoría; una matriz de escenarios (n × categorías) se evalúa de una vez contra los vectores
+# de presupuesto anual y gasto real, que se calculan una sola vez por versión de los datos.
+#   gasto proyectado = mín(presupuesto ajustado, ritmo real): recortar baja el gasto,
+#                      subir el presupuesto no lo sube
+#   recorte          = lo que habría que dejar de gastar respecto al ritmo real
+#   ahorro           = ingresos anuales − gasto proyectado
+
+# Barridos más grandes se rechazan para no bloquear la app
+MAX_ESCENARIOS = 50_000
+
+
+def base_simulador(cubo, año=None):
+    año = año or date.today().year
+
+    def construir():
+        # Ritmo anual: lo gastado/ingresado en el año extrapolado a 12 meses
+        meses = date.today().month if año == date.today().year else 12
+        presupuesto = cargar_presupuestos().groupby("categoria")["importe"].sum()
+        reales = totales(cubo, "categoria", tipo="gasto", año=año) * 12 / meses
+        categorias = presupuesto.index.union(reales.index)
+        return {
+            "categorias": list(categorias),
+            "presupuesto": presupuesto.reindex(categorias, fill_value=0).to_numpy(dtype=float),
+            "real": reales.reindex(categorias, fill_value=0).to_numpy(dtype=float),
+            "ingresos": total(cubo, tipo="ingreso", año=año) * 12 / meses,
+        }
+
+    return derivado(f"simulador:{año}", ("movimientos", "presupuestos"), construir)
+
+
+def evaluar(base, ajustes):
+    # ajustes: matriz (n_escenarios × categorías) en %; devuelve un DataFrame ordenado por ahorro
+    ajustes = np.atleast_2d(np.asarray(ajustes, dtype=float))
+    ajustado = base["presupuesto"] * (1 + ajustes / 100)
+    gasto = np.minimum(ajustado, base["real"])
+    resultado = pd.DataFrame(ajustes, columns=base["categorias"])
+    resultado["presupuesto"] = ajustado.sum(axis=1)
+    resultado["gasto_proyectado"] = gasto.sum(axis=1)
+    resultado["recorte"] = np.maximum(base["real"] - ajustado, 0).sum(axis=1)
+    resultado["ahorro"] = base["ingresos"] - resultado["gasto_proyectado"]
+    return resultado.sort_values(["ahorro", "recorte"], ascending=[False, True], kind="stable")
+
+
+def rejilla(base, fijos, variables, valores):
+    # Todas las combinaciones de `valores` en las categorías `variables`; el resto queda en `fijos`
+    n = len(valores) ** len(variables)
+    if n > MAX_ESCENARIOS:
+        raise ValueError(f"El barrido tendría {n:,} escenarios (máximo {MAX_ESCENARIOS:,})")
+    ajustes = np.tile([fijos.get(cat, 0) for cat in base["categorias"]], (n, 1)).astype(float)
+    if variables:
+        malla = np.meshgrid(*[valores] * len(variables), indexing="ij")
+        for cat, columna in zip(variables, malla):
+            ajustes[:, base["categorias"].index(cat)] = columna.ravel()
+    return ajustes
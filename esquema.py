@@ -0,0 +1,82 @@
+import unicodedata
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Esquema tipado de los movimientos: se aplica una sola vez al cargar y todos los módulos lo consumen.
+#   - tipo, cuenta, categoría, subcategoría, desde y hacia como categóricas
+#   - importe_cent: importe exacto en céntimos (Int64, NA si falta o no es un número: nunca 0 €);
+#     importe queda como euros derivados para mostrar
+#   - fecha parseada una vez, con año y mes ya calculados
+COLUMNAS_CATEGORICAS = ["tipo", "cuenta", "categoria", "subcategoria", "desde", "hacia"]
+COLUMNAS_INTERNAS = ["importe_cent", "año", "mes"]
+
+
+def normalizar(texto):
+    # Minúsculas y sin tildes: la misma forma para buscar en memoria y en la base de datos
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _categorica(serie):
+    # Categorías siempre como object para poder unir trozos con union_categoricals
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype("category")
+    categorias = serie.cat.categories
+    if categorias.dtype != object:
+        serie = pd.Series(
+            pd.Categorical.from_codes(serie.cat.codes, categories=categorias.astype(object)),
+            index=serie.index, name=serie.name
+        )
+    return serie
+
+
+def a_centimos(importe):
+    return (pd.to_numeric(importe, errors="coerce") * 100).round().astype("Int64")
+
+
+def con_importe(df):
+    # Filas con importe conocido e importe_cent como int64: los agregados no cuentan como 0 € un
+    # importe que falta (la fila sigue en la tabla para poder corregirla en el editor)
+    df = df[df["importe_cent"].notna()]
+    return df.assign(importe_cent=df["importe_cent"].astype("int64"))
+
+
+def tipar_movimientos(df):
+    df = df.copy()
+    if "fecha" in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df["fecha"]):
+            df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+        df["año"] = df["fecha"].dt.year.astype("Int16")
+        df["mes"] = df["fecha"].dt.month.astype("Int8")
+    if "importe" in df.columns:
+        df["importe_cent"] = a_centimos(df["importe"])
+        df["importe"] = df["importe_cent"].astype("float64") / 100
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = _categorica(df[col])
+    return df
+
+
+def concatenar(frames):
+    # pd.concat convierte a object las categóricas con categorías distintas: aquí se unen
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columnas = list(dict.fromkeys(col for f in frames for col in f.columns))
+    frames = [f.reindex(columns=columnas) for f in frames]
+    resultado = pd.concat(frames, ignore_index=True)
+    for col in COLUMNAS_CATEGORICAS:
+        if col in resultado.columns:
+            partes = [_categorica(f[col]) for f in frames]
+            resultado[col] = pd.Series(union_categoricals(partes), index=resultado.index)
+    return resultado
+
+
+def para_editar(df):
+    # El data_editor necesita texto libre en las columnas con selectbox, no categorías cerradas
+    return df.astype({col: object for col in COLUMNAS_CATEGORICAS if col in df.columns})
+
+
+def sin_internas(df):
+    return df.drop(columns=[col for col in COLUMNAS_INTERNAS if col in df.columns])
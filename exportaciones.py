@@ -0,0 +1,150 @@
+import atexit
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+import xlsxwriter
+from pypdf import PdfWriter
+from xhtml2pdf import pisa
+
+from esquema import sin_internas
+from repositorio import version
+
+# Las exportaciones se generan solo cuando se piden, en un hilo aparte, y quedan en disco
+# cacheadas por versión de los datos hasta que cambian los movimientos.
+FILAS_POR_TROZO = 5000
+FILAS_POR_TROZO_PDF = 1000
+
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+@st.cache_resource
+def _estado():
+    carpeta = tempfile.mkdtemp(prefix="finanzas_export_")
+    atexit.register(shutil.rmtree, carpeta, ignore_errors=True)
+    return {
+        "pool": ThreadPoolExecutor(max_workers=2, thread_name_prefix="exportar"),
+        "carpeta": carpeta,
+        "trabajos": {},
+        "lock": threading.Lock(),
+    }
+
+
+def generar_excel(df, ruta, hoja, progreso):
+    # constant_memory: xlsxwriter escribe cada fila a disco en cuanto termina con ella,
+    # así la memoria no crece con el número de filas
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "nan_inf_to_errors": True})
+    hoja_excel = libro.add_worksheet(hoja)
+    formato_fecha = libro.add_format({"num_format": "yyyy-mm-dd"})
+    cabecera = libro.add_format({"bold": True})
+
+    columnas = list(df.columns)
+    hoja_excel.write_row(0, 0, columnas, cabecera)
+    for i, col in enumerate(columnas):
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            hoja_excel.set_column(i, i, 12, formato_fecha)
+
+    total = max(len(df), 1)
+    for inicio in range(0, len(df), FILAS_POR_TROZO):
+        trozo = df.iloc[inicio:inicio + FILAS_POR_TROZO].astype(object).where(lambda d: d.notna(), None)
+        for n, fila in enumerate(trozo.itertuples(index=False), start=inicio + 1):
+            hoja_excel.write_row(n, 0, fila)
+        progreso(min((inicio + FILAS_POR_TROZO) / total, 1.0))
+    libro.close()
+
+
+def generar_pdf(df, ruta, titulo, progreso):
+    # pisa maqueta todo su HTML en memoria: se genera un PDF por trozo de FILAS_POR_TROZO_PDF filas
+    # y al final se unen sus páginas. La maquetación nunca pasa de un trozo; la unión solo guarda
+    # las páginas ya comprimidas.
+    carpeta = tempfile.mkdtemp(dir=os.path.dirname(ruta))
+    try:
+        partes = []
+        total = max(len(df), 1)
+        for n, inicio in enumerate(range(0, total, FILAS_POR_TROZO_PDF)):
+            html = df.iloc[inicio:inicio + FILAS_POR_TROZO_PDF].to_html(index=False, border=0)
+            partes.append(os.path.join(carpeta, f"{n}.pdf"))
+            with open(partes[-1], "wb") as salida:
+                pisa.CreatePDF(io.StringIO(f"<h2>{titulo}</h2>{html}" if n == 0 else html), dest=salida)
+            progreso(0.9 * min((inicio + FILAS_POR_TROZO_PDF) / total, 1.0))
+        escritor = PdfWriter()
+        for parte in partes:
+            escritor.append(parte)
+        with open(ruta, "wb") as salida:
+            escritor.write(salida)
+        progreso(1.0)
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def _lanzar(nombre, clave, generar, df, archivo, *args):
+    estado = _estado()
+    with estado["lock"]:
+        if clave in estado["trabajos"]:
+            return
+        # Ya no sirven las de otra versión de los datos ni las del mismo fichero (la del mes
+        # anterior se llama distinto pero va a mes_actual.xlsx). Las que aún se están generando
+        # se borran en el siguiente lanzamiento, cuando hayan terminado.
+        for antigua, t in list(estado["trabajos"].items()):
+            if (antigua[1] != clave[1] or t["archivo"] == archivo) and t["futuro"].done():
+                del estado["trabajos"][antigua]
+                if os.path.exists(t["ruta"]):
+                    os.remove(t["ruta"])
+        trabajo = {"progreso": 0.0, "archivo": archivo, "ruta": os.path.join(estado["carpeta"], f"v{clave[1]}_{nombre}_{archivo}")}
+
+        def progreso(valor):
+            trabajo["progreso"] = valor
+
+        trabajo["futuro"] = estado["pool"].submit(generar, df, trabajo["ruta"], *args, progreso)
+        estado["trabajos"][clave] = trabajo
+
+
+def _leer(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+def boton_exportacion(etiqueta, nombre, obtener_df, archivo, titulo, mime=None):
+    # obtener_df solo se llama al pulsar el botón: si nadie exporta no se prepara nada
+    clave = (nombre, version("movimientos"))
+    trabajo = _estado()["trabajos"].get(clave)
+
+    if trabajo is None:
+        if st.button(f"⚙️ Preparar {etiqueta}", key=f"preparar_{nombre}"):
+            generar = generar_excel if archivo.endswith(".xlsx") else generar_pdf
+            _lanzar(nombre, clave, generar, sin_internas(obtener_df()), archivo, titulo)
+            st.rerun()
+        return
+
+    terminado = trabajo["futuro"].done()
+
+    @st.fragment(run_every=None if terminado else 1)
+    def seguimiento():
+        trabajo_actual = _estado()["trabajos"].get(clave)
+        if trabajo_actual is None:
+            return
+        futuro = trabajo_actual["futuro"]
+        if not futuro.done():
+            st.progress(trabajo_actual["progreso"], text=f"Generando {etiqueta}…")
+        elif futuro.exception() is not None:
+            st.error(f"No se pudo generar {etiqueta}: {futuro.exception()}")
+            # Se olvida el trabajo fallido para poder volver a intentarlo
+            _estado()["trabajos"].pop(clave, None)
+        elif not terminado:
+            # Al terminar se repinta la página para mostrar el botón de descarga
+            st.rerun()
+        else:
+            # download_button siempre pasa el contenido por memoria (el gestor de ficheros de
+            # Streamlit lo sirve desde ahí): con una función solo se lee del disco al pulsar, no
+            # en cada rerun de la página
+            st.download_button(
+                f"⬇️ Descargar {etiqueta}", data=lambda: _leer(trabajo_actual["ruta"]), file_name=archivo,
+                mime=mime or (MIME_XLSX if archivo.endswith(".xlsx") else None), key=f"descargar_{nombre}"
+            )
+
+    seguimiento()
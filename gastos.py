@@ -4,26 +4,33 @@ import streamlit as st
 from datetime import date
 import pandas as pd
 from app_utils import resumen_mensual
-
-def mostrar_gastos(df_gastos, cuentas):
-    lista_subcat = [
-        "Hipoteca:Casa", "Luz:Casa", "Agua:Casa", "Cesta:Casa", "Letra coche:Casa", "Internet y movil:Casa",
-        "APP y subscripciones:Casa", "Impuestos:Casa", "Seguros medico:Casa", "Seguro coche:Casa",
-        "Seguro casa:Casa", "Colegio:Casa", "Colegio: otros gastos:Casa", "Limpieza:Casa", "Deporte:Casa",
-        "Medico:Salud", "Farmacia:Salud", "Cuidados:Salud", "Combustible:Transporte", "Aparcamiento:Transporte", "Otros transporte:Transporte",
-        "Gastos laborales:Trabajo", "Colegio Medico:Trabajo", "Seguro responsabilidad civil:Trabajo", "Sindicato:Trabajo",
-        "Empresa:Trabajo", "Formaciones:Trabajo", "Moda:Adquisiciones", "Hogar:Adquisiciones", "Libros:Adquisiciones",
-        "Restauración:Ocio", "Viajes:Ocio", "Eventos:Ocio", "Otros:Otros", "Contabilidad:Contabilidad"
-    ]
-    lista_cat = ["Casa", "Salud", "Transporte", "Trabajo", "Adquisiciones", "Ocio", "Otros", "Contabilidad"]
+from cubo import total
+from instrumentacion import medir
+
+# "Subcategoría:Categoría" que se ofrecen en el editor
+SUBCATEGORIAS_GASTO = [
+    "Hipoteca:Casa", "Luz:Casa", "Agua:Casa", "Cesta:Casa", "Letra coche:Casa", "Internet y movil:Casa",
+    "APP y subscripciones:Casa", "Impuestos:Casa", "Seguros medico:Casa", "Seguro coche:Casa",
+    "Seguro casa:Casa", "Colegio:Casa", "Colegio: otros gastos:Casa", "Limpieza:Casa", "Deporte:Casa",
+    "Medico:Salud", "Farmacia:Salud", "Cuidados:Salud", "Combustible:Transporte", "Aparcamiento:Transporte", "Otros transporte:Transporte",
+    "Gastos laborales:Trabajo", "Colegio Medico:Trabajo", "Seguro responsabilidad civil:Trabajo", "Sindicato:Trabajo",
+    "Empresa:Trabajo", "Formaciones:Trabajo", "Moda:Adquisiciones", "Hogar:Adquisiciones", "Libros:Adquisiciones",
+    "Restauración:Ocio", "Viajes:Ocio", "Eventos:Ocio", "Otros:Otros", "Contabilidad:Contabilidad"
+]
+CATEGORIAS_GASTO = ["Casa", "Salud", "Transporte", "Trabajo", "Adquisiciones", "Ocio", "Otros", "Contabilidad"]
+
+@medir
+def mostrar_gastos(df_gastos, cuentas, cubo):
+    lista_subcat = SUBCATEGORIAS_GASTO
+    lista_cat = CATEGORIAS_GASTO
 
     hoy = date.today()
-    df_gastos_mes = df_gastos[pd.to_datetime(df_gastos["fecha"]).dt.month == hoy.month]
+    del_mes = (df_gastos["año"] == hoy.year) & (df_gastos["mes"] == hoy.month)
+    dias_con_gasto = df_gastos.loc[del_mes, "fecha"].nunique()
 
-    importe_total_mes = df_gastos_mes["importe"].sum()
-    dias_con_gasto = df_gastos_mes["fecha"].nunique()
+    importe_total_mes = total(cubo, tipo="gasto", año=hoy.year, mes=hoy.month)
     gasto_diario_medio = importe_total_mes / dias_con_gasto if dias_con_gasto else 0
-    mayor_gasto = df_gastos_mes["importe"].max() if not df_gastos_mes.empty else 0
+    mayor_gasto = total(cubo, "maximo", tipo="gasto", año=hoy.year, mes=hoy.month)
 
     col1, col2, col3 = st.columns(3)
     col1.metric("💰 Gasto total", f"{importe_total_mes:.2f} €")
@@ -39,7 +46,7 @@ def mostrar_gastos(df_gastos, cuentas):
         st.warning("Este mes estás gastando más de lo habitual. ¿Podrías ajustar alguna categoría? 🔍")
 
     st.subheader("Registro de gastos")
-    total_gastos, resumen_gastos = resumen_mensual(df_gastos, "gasto")
+    total_gastos, resumen_gastos = resumen_mensual(cubo, "gasto")
     st.warning(f"💸 Gastos este mes: {total_gastos:.2f}€")
     st.dataframe(resumen_gastos, use_container_width=True)
 
@@ -2,31 +2,67 @@
 from utils_tabla import editar_tabla_movimientos
 import streamlit as st
 import pandas as pd
+from indice_busqueda import obtener_indice, filtrar
+from instrumentacion import medir
 
+@medir
 def mostrar_historico(df_todos, cuentas):
     st.subheader("Histórico de movimientos")
 
     tipo = st.selectbox("Tipo", ["Todos", "ingreso", "gasto", "transferencia"])
 
-    años_disponibles = sorted(df_todos["fecha"].dt.year.dropna().unique(), reverse=True)
+    años_disponibles = sorted(df_todos["año"].dropna().unique(), reverse=True)
     año = st.selectbox("Año", años_disponibles)
 
     opcion_filtro = st.radio("¿Cómo quieres filtrar?", ["Todo el año", "Trimestre", "Mes"])
-    df_filtrado = df_todos[df_todos["fecha"].dt.year == año]
+    df_filtrado = df_todos[df_todos["año"] == año]
+    mes_inicio, mes_fin = 1, 12
 
     if opcion_filtro == "Trimestre":
         trimestre = st.selectbox("Trimestre", [1, 2, 3, 4])
         meses_trimestre = {1: [1,2,3], 2: [4,5,6], 3: [7,8,9], 4: [10,11,12]}
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.month.isin(meses_trimestre[trimestre])]
+        df_filtrado = df_filtrado[df_filtrado["mes"].isin(meses_trimestre[trimestre])]
+        mes_inicio, mes_fin = meses_trimestre[trimestre][0], meses_trimestre[trimestre][-1]
     elif opcion_filtro == "Mes":
         mes = st.selectbox("Mes", list(range(1,13)))
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.month == mes]
+        df_filtrado = df_filtrado[df_filtrado["mes"] == mes]
+        mes_inicio, mes_fin = mes, mes
+
+    # Los mismos filtros en formato de consulta para el editor paginado
+    filtros = []
+    if año is not None:
+        filtros += [
+            ("fecha", "gte", pd.Timestamp(int(año), mes_inicio, 1).date().isoformat()),
+            ("fecha", "lt", (pd.Timestamp(int(año), mes_fin, 1) + pd.offsets.MonthBegin()).date().isoformat()),
+        ]
 
     if tipo != "Todos":
         df_filtrado = df_filtrado[df_filtrado["tipo"] == tipo]
+        filtros.append(("tipo", "eq", tipo))
+
+    texto = st.text_input("Buscar texto", help="Busca en concepto, categoría, subcategoría y cuentas. Varias palabras se buscan a la vez; no distingue tildes ni mayúsculas.")
+
+    with st.expander("Filtros por importe y fecha"):
+        col1, col2 = st.columns(2)
+        importe_min = col1.number_input("Importe mínimo", min_value=0.0, value=None, format="%.2f")
+        importe_max = col2.number_input("Importe máximo", min_value=0.0, value=None, format="%.2f")
+        fecha_desde = col1.date_input("Desde", value=None)
+        fecha_hasta = col2.date_input("Hasta", value=None)
+
+    df_filtrado = filtrar(
+        df_filtrado, obtener_indice(), texto,
+        importe_min=importe_min, importe_max=importe_max,
+        fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
+    )
 
-    texto = st.text_input("Buscar texto")
-    if texto:
-        df_filtrado = df_filtrado[df_filtrado.apply(lambda row: texto.lower() in str(row).lower(), axis=1)]
+    filtros += [(None, "contiene", palabra) for palabra in texto.split()]
+    if importe_min is not None:
+        filtros.append(("importe", "gte", importe_min))
+    if importe_max is not None:
+        filtros.append(("importe", "lte", importe_max))
+    if fecha_desde is not None:
+        filtros.append(("fecha", "gte", fecha_desde.isoformat()))
+    if fecha_hasta is not None:
+        filtros.append(("fecha", "lt", (fecha_hasta + pd.Timedelta(days=1)).isoformat()))
 
-    editar_tabla_movimientos(df_filtrado, "histórico", cuentas=cuentas, key="edit_historico")
+    editar_tabla_movimientos(df_filtrado, "histórico", cuentas=cuentas, key="edit_historico", filtros=filtros)
@@ -0,0 +1,396 @@
+import codecs
+import hashlib
+import io
+import itertools
+import os
+import re
+import uuid
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from repositorio import TAMAÑO_LOTE, insertar_importados, invalidar
+from instrumentacion import medir
+import duplicados
+from categorizacion import categorizar, obtener_modelo
+
+# Importación de extractos bancarios (CSV, OFX y Norma 43) por trozos: el fichero se lee en
+# bloques de TAMAÑO_TROZO movimientos, cada bloque se valida con operaciones vectorizadas y se
+# escribe en lotes. La memoria depende del tamaño del trozo, no del fichero.
+# Cada fila lleva un id determinista (huella del fichero + número de movimiento): si una
+# importación se corta se reanuda desde el último lote confirmado, y repetir un lote no
+# duplica filas.
+TAMAÑO_TROZO = 10_000
+
+# Filas rechazadas que se guardan para enseñarlas (el resto solo se cuentan)
+MAX_RECHAZADOS = 1000
+
+# Espacio de nombres de los ids de importación (uuid5)
+_ESPACIO_IDS = uuid.UUID("37303f92-24c6-49a8-b6ca-81729ee745eb")
+
+
+# ---------- Lectura ----------
+
+def _lineas(fichero, codificacion):
+    # Texto línea a línea sin cerrar el fichero subido al terminar
+    texto = io.TextIOWrapper(fichero, encoding=codificacion, errors="replace", newline="")
+    try:
+        yield from texto
+    finally:
+        texto.detach()
+
+
+def _bloques(lineas, tamaño, es_inicio):
+    # Agrupa las líneas en bloques de `tamaño` registros; un bloque solo se corta donde empieza
+    # un registro, así las líneas de continuación no se separan de la suya
+    bloque, n = [], 0
+    for linea in lineas:
+        if es_inicio(linea):
+            if n == tamaño:
+                yield bloque
+                bloque, n = [], 0
+            n += 1
+        bloque.append(linea)
+    if bloque:
+        yield bloque
+
+
+def _numero(serie, decimal=","):
+    # "1.234,56 €" -> 1234.56 (o con decimal=".", "1,234.56" -> 1234.56)
+    serie = serie.astype(str).str.replace(r"[^\d,.\-+]", "", regex=True)
+    miles = "." if decimal == "," else ","
+    serie = serie.str.replace(miles, "", regex=False).str.replace(decimal, ".", regex=False)
+    return pd.to_numeric(serie, errors="coerce")
+
+
+def _limpiar(serie):
+    return serie.fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def leer_csv(fichero, codificacion, columnas, tamaño=TAMAÑO_TROZO, sep=";", decimal=",", formato_fecha=None):
+    # columnas: {"fecha": col, "comentario": col} y "importe" (con signo) o "cargo" y "abono"
+    lector = pd.read_csv(
+        fichero, sep=sep, dtype=str, chunksize=tamaño, encoding=codificacion,
+        keep_default_na=False, skipinitialspace=True
+    )
+    inicio = 1
+    for trozo in lector:
+        if columnas.get("importe"):
+            importe = _numero(trozo[columnas["importe"]], decimal)
+        else:
+            abono = _numero(trozo[columnas["abono"]], decimal).fillna(0)
+            cargo = _numero(trozo[columnas["cargo"]], decimal).fillna(0)
+            importe = abono - cargo.abs()
+        yield pd.DataFrame({
+            "linea": np.arange(inicio, inicio + len(trozo)),
+            "fecha": pd.to_datetime(
+                trozo[columnas["fecha"]], format=formato_fecha or None, dayfirst=not formato_fecha, errors="coerce"
+            ),
+            "importe": importe,
+            "comentario": _limpiar(trozo[columnas["comentario"]]),
+        })
+        inicio += len(trozo)
+
+
+def leer_norma43(fichero, codificacion, tamaño=TAMAÑO_TROZO):
+    # Cuaderno 43 de la AEB: registros de 80 posiciones. El 22 es el movimiento (fecha AAMMDD,
+    # clave debe/haber, importe con dos decimales implícitos) y los 23 que le siguen, su concepto.
+    inicio = 1
+    for bloque in _bloques(_lineas(fichero, codificacion), tamaño, lambda linea: not linea.startswith("23")):
+        lineas = pd.Series(bloque, dtype=object).str.rstrip("\r\n").str.ljust(80)
+        registro = lineas.str[:2]
+        es_movimiento = registro == "22"
+        grupo = es_movimiento.cumsum()
+        movimientos = lineas[es_movimiento]
+        conceptos = lineas[registro == "23"]
+        conceptos = (conceptos.str[4:42].str.strip() + " " + conceptos.str[42:80].str.strip()).groupby(grupo[conceptos.index]).agg(" ".join)
+        comentario = pd.Series(conceptos.reindex(grupo[es_movimiento]).to_numpy(), index=movimientos.index)
+        signo = np.where(movimientos.str[27] == "1", -1, 1)
+        yield pd.DataFrame({
+            "linea": np.arange(inicio, inicio + len(movimientos)),
+            "fecha": pd.to_datetime(movimientos.str[10:16], format="%y%m%d", errors="coerce"),
+            "importe": pd.to_numeric(movimientos.str[28:42], errors="coerce") / 100 * signo,
+            "comentario": _limpiar(comentario.fillna(movimientos.str[64:80])),
+        }).reset_index(drop=True)
+        inicio += len(movimientos)
+
+
+def _etiqueta(transacciones, etiqueta):
+    # En OFX 1.x (SGML) las hojas no se cierran: el valor llega hasta el siguiente < o fin de línea
+    return transacciones.str.extract(rf"<{etiqueta}>\s*([^<\r\n]*)", flags=re.IGNORECASE)[0].str.strip()
+
+
+def _transacciones(fichero, codificacion, bloque=1 << 20):
+    # Cada <STMTTRN>…</STMTTRN> del fichero, leído a bloques de caracteres y no por líneas: muchos
+    # bancos mandan el OFX entero en una sola línea. Entre bloques solo se guarda la transacción
+    # que ha quedado a medias.
+    patron = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+    apertura = re.compile(r"<STMTTRN>", re.IGNORECASE)
+    texto = io.TextIOWrapper(fichero, encoding=codificacion, errors="replace", newline="")
+    resto = ""
+    try:
+        for datos in iter(lambda: texto.read(bloque), ""):
+            resto += datos
+            fin = 0
+            for encontrada in patron.finditer(resto):
+                yield encontrada.group(1)
+                fin = encontrada.end()
+            abierta = apertura.search(resto, fin)
+            resto = resto[abierta.start():] if abierta else resto[max(fin, len(resto) - len("<STMTTRN>")):]
+    finally:
+        texto.detach()
+
+
+def leer_ofx(fichero, codificacion, tamaño=TAMAÑO_TROZO):
+    inicio = 1
+    todas = _transacciones(fichero, codificacion)
+    while True:
+        transacciones = pd.Series(list(itertools.islice(todas, tamaño)), dtype=object)
+        if transacciones.empty:
+            return
+        comentario = _limpiar(_etiqueta(transacciones, "NAME")) + " " + _limpiar(_etiqueta(transacciones, "MEMO"))
+        yield pd.DataFrame({
+            "linea": np.arange(inicio, inicio + len(transacciones)),
+            "fecha": pd.to_datetime(_etiqueta(transacciones, "DTPOSTED").str[:8], format="%Y%m%d", errors="coerce"),
+            "importe": pd.to_numeric(_etiqueta(transacciones, "TRNAMT").str.replace(",", "."), errors="coerce"),
+            "comentario": comentario.str.strip(),
+        })
+        inicio += len(transacciones)
+
+
+LECTORES = {"CSV": leer_csv, "OFX": leer_ofx, "Norma 43": leer_norma43}
+
+
+def detectar_formato(nombre, cabecera):
+    extension = os.path.splitext(nombre)[1].lower()
+    if extension in (".ofx", ".qfx") or b"OFXHEADER" in cabecera or b"<OFX>" in cabecera.upper():
+        return "OFX"
+    if extension in (".n43", ".q43", ".aeb") or (cabecera[:2] == b"11" and cabecera.find(b"\n") in (80, 81)):
+        return "Norma 43"
+    return "CSV"
+
+
+def codificacion(cabecera):
+    # UTF-8 si la muestra lo es (el decodificador incremental tolera un carácter cortado al final)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(cabecera)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def huella(fichero, bloque=1 << 20):
+    # sha1 del contenido, leído a bloques
+    sha = hashlib.sha1()
+    fichero.seek(0)
+    for datos in iter(lambda: fichero.read(bloque), b""):
+        sha.update(datos)
+    fichero.seek(0)
+    return sha.hexdigest()
+
+
+# ---------- Validación y escritura ----------
+
+def validar(trozo):
+    # Separa las filas válidas de las rechazadas (con el motivo) sin recorrerlas una a una
+    motivos = np.select(
+        [trozo["fecha"].isna(), trozo["importe"].isna(), trozo["importe"].eq(0)],
+        ["fecha no válida", "importe no válido", "importe cero"],
+        default=""
+    )
+    malas = motivos != ""
+    return trozo[~malas], trozo[malas].assign(motivo=motivos[malas])
+
+
+def a_movimientos(validos, cuenta, clave, ahora):
+    # Filas de movimientos: el signo decide si es gasto o ingreso y el importe se guarda en positivo
+    return pd.DataFrame({
+        "id": ids_importacion(clave, validos["linea"]),
+        "fecha": validos["fecha"].dt.strftime("%Y-%m-%d").to_numpy(),
+        "cuenta": cuenta,
+        "categoria": None,
+        "subcategoria": None,
+        "importe": validos["importe"].abs().round(2).to_numpy(),
+        "comentario": validos["comentario"].to_numpy(),
+        "tipo": np.where(validos["importe"] < 0, "gasto", "ingreso"),
+        "created_at": ahora,
+    })
+
+
+def _registros(df):
+    # Como to_dict(orient="records") pero columna a columna, bastante más rápido con muchas filas
+    columnas = list(df.columns)
+    return [dict(zip(columnas, fila)) for fila in zip(*(df[col].tolist() for col in columnas))]
+
+
+def _muestra(acumuladas, filas):
+    # Guarda como mucho MAX_RECHAZADOS filas entre todos los trozos
+    hueco = MAX_RECHAZADOS - sum(len(f) for f in acumuladas)
+    if hueco > 0 and not filas.empty:
+        acumuladas.append(filas.head(hueco))
+
+
+def ids_importacion(clave, lineas):
+    return [str(uuid.uuid5(_ESPACIO_IDS, f"{clave}:{linea}")) for linea in lineas]
+
+
+def importar(trozos, cuenta, clave, tamaño_lote=TAMAÑO_LOTE, desde=0, progreso=None, rechazar_posibles=False):
+    # Recorre los trozos y escribe los válidos en lotes. Los movimientos hasta `desde` ya se
+    # escribieron en un intento anterior y no se vuelven a escribir. Tras cada lote llama a
+    # progreso(resumen); resumen["ultima"] es el último movimiento confirmado, el punto desde el
+    # que reanudar.
+    # Los movimientos que ya están en el histórico se rechazan; los posibles duplicados (también
+    # las líneas repetidas dentro del fichero) se importan y se listan, salvo con rechazar_posibles.
+    # Los movimientos se categorizan con las reglas de categorizacion.py antes de escribirse.
+    # Al reanudar, las líneas hasta `desde` se vuelven a comprobar sin escribirse y el histórico
+    # se mira sin lo que escribió el intento anterior: cada línea se decide igual que en una
+    # importación de una sola vez.
+    resumen = {
+        "importadas": 0, "categorizadas": 0, "rechazadas": 0, "ultima": desde,
+        "rechazos": [], "n_posibles": 0, "posibles": []
+    }
+    ahora = pd.Timestamp.now(tz="UTC").isoformat()
+    indice = duplicados.indice_sin(ids_importacion(clave, range(1, desde + 1))) if desde else duplicados.obtener_indice()
+    previas = duplicados.vacio()
+    modelo = obtener_modelo()
+    try:
+        for trozo in trozos:
+            validos, rechazados = validar(trozo)
+            movimientos = a_movimientos(validos, cuenta, clave, ahora)
+
+            marca = duplicados.comprobar(movimientos, indice, previas=previas).to_numpy()
+            posible = marca == "posible"
+            descartar = (marca == "exacto") | (posible & rechazar_posibles)
+            motivos = np.where(posible[descartar], "posible duplicado", "duplicado")
+            rechazados = pd.concat([rechazados, validos[descartar].assign(motivo=motivos)])
+            previas = duplicados.añadir(previas, movimientos[~descartar])
+
+            # Lo anterior a `desde` solo servía para decidir las líneas siguientes
+            nuevas = (validos["linea"] > desde).to_numpy()
+            rechazados = rechazados[rechazados["linea"] > desde]
+            if not rechazar_posibles:
+                resumen["n_posibles"] += int((posible & nuevas).sum())
+                _muestra(resumen["posibles"], validos[posible & nuevas])
+            escribir = ~descartar & nuevas
+            validos, movimientos = validos[escribir], categorizar(movimientos[escribir], modelo)
+            resumen["categorizadas"] += int(movimientos["subcategoria"].notna().sum())
+
+            resumen["rechazadas"] += len(rechazados)
+            _muestra(resumen["rechazos"], rechazados)
+
+            filas = _registros(movimientos)
+            lineas = validos["linea"].to_numpy()
+            for i in range(0, len(filas), tamaño_lote):
+                lote = filas[i:i + tamaño_lote]
+                insertar_importados(lote)
+                resumen["importadas"] += len(lote)
+                resumen["ultima"] = int(lineas[i + len(lote) - 1])
+                if progreso:
+                    progreso(resumen)
+            if not trozo.empty and trozo["linea"].max() > desde:
+                resumen["ultima"] = int(trozo["linea"].max())
+                if progreso:
+                    progreso(resumen)
+    finally:
+        if resumen["importadas"]:
+            invalidar("movimientos")
+    return resumen
+
+
+# ---------- Interfaz ----------
+
+def _opciones_csv(fichero, cod):
+    col1, col2, col3 = st.columns(3)
+    sep = col1.selectbox("Separador", [";", ",", "\t", "|"], format_func=lambda s: "Tabulador" if s == "\t" else s)
+    decimal = col2.selectbox("Separador decimal", [",", "."])
+    formato_fecha = col3.text_input("Formato de fecha", placeholder="automático (día primero)", help="Por ejemplo %d/%m/%Y")
+
+    muestra = pd.read_csv(fichero, sep=sep, dtype=str, nrows=5, encoding=cod, keep_default_na=False)
+    fichero.seek(0)
+    st.dataframe(muestra, use_container_width=True, hide_index=True)
+
+    nombres = list(muestra.columns)
+
+    def sugerida(*pistas):
+        # Primera columna cuyo nombre contiene alguna de las pistas
+        return next((i for i, col in enumerate(nombres) for p in pistas if p in col.lower()), 0)
+
+    col1, col2, col3 = st.columns(3)
+    columnas = {
+        "fecha": col1.selectbox("Columna de fecha", nombres, index=sugerida("fecha", "date")),
+        "comentario": col2.selectbox("Columna de concepto", nombres, index=sugerida("concepto", "descrip", "detalle", "movimiento")),
+    }
+    separados = col3.toggle("Cargo y abono en columnas separadas")
+    if separados:
+        columnas["cargo"] = col3.selectbox("Columna de cargo", nombres, index=sugerida("cargo", "debe"))
+        columnas["abono"] = col3.selectbox("Columna de abono", nombres, index=sugerida("abono", "haber"))
+    else:
+        columnas["importe"] = col3.selectbox("Columna de importe", nombres, index=sugerida("importe", "amount", "cantidad"))
+    return {"columnas": columnas, "sep": sep, "decimal": decimal, "formato_fecha": formato_fecha or None}
+
+
+@medir
+def mostrar_importacion(cuentas):
+    st.subheader("📥 Importar extracto bancario")
+    st.caption("Los cargos se importan como gastos y los abonos como ingresos, categorizados con las reglas de más abajo cuando alguna coincide.")
+
+    fichero = st.file_uploader("Extracto (CSV, OFX o Norma 43)", type=["csv", "txt", "ofx", "qfx", "n43", "q43", "aeb"])
+    if fichero is None:
+        return
+
+    cabecera = fichero.read(1 << 16)
+    fichero.seek(0)
+    cod = codificacion(cabecera)
+
+    col1, col2, col3 = st.columns(3)
+    formatos = list(LECTORES)
+    formato = col1.selectbox("Formato", formatos, index=formatos.index(detectar_formato(fichero.name, cabecera)))
+    cuenta = col2.selectbox("Cuenta", cuentas)
+    tamaño_lote = col3.number_input("Movimientos por lote", min_value=50, max_value=5000, value=TAMAÑO_LOTE, step=50)
+    rechazar_posibles = st.toggle(
+        "Rechazar también los posibles duplicados",
+        help=f"Mismo importe, tipo y cuenta a ±{duplicados.DIAS_CERCANOS} días de otro movimiento. Los movimientos que ya están registrados se rechazan siempre; las líneas repetidas dentro del fichero se importan como posibles duplicados."
+    )
+
+    opciones = _opciones_csv(fichero, cod) if formato == "CSV" else {}
+
+    # La huella se calcula una vez por fichero subido, no en cada rerun
+    huellas = st.session_state.setdefault("huellas_importacion", {})
+    if fichero.file_id not in huellas:
+        huellas[fichero.file_id] = huella(fichero)
+    clave = huellas[fichero.file_id]
+    pendientes = st.session_state.setdefault("importaciones", {})
+    if pendientes.get(clave):
+        st.info(f"⏯️ La importación anterior de este fichero se cortó en el movimiento {pendientes[clave]:,}: se reanudará desde ahí.")
+
+    if not st.button("📥 Importar"):
+        return
+
+    barra = st.progress(0.0, text="Importando…")
+
+    def progreso(resumen):
+        pendientes[clave] = resumen["ultima"]
+        barra.progress(min(fichero.tell() / max(fichero.size, 1), 1.0), text=f"{resumen['importadas']:,} movimientos importados")
+
+    try:
+        trozos = LECTORES[formato](fichero, cod, **opciones)
+        resumen = importar(
+            trozos, cuenta, clave, int(tamaño_lote), desde=pendientes.get(clave, 0),
+            progreso=progreso, rechazar_posibles=rechazar_posibles
+        )
+    except Exception as e:
+        st.error(f"❌ La importación se ha cortado en el movimiento {pendientes.get(clave, 0):,}: {e}. Vuelve a pulsar Importar para reanudarla.")
+        return
+    finally:
+        fichero.seek(0)
+
+    pendientes.pop(clave, None)
+    barra.progress(1.0, text="Importación terminada")
+    st.success(f"✅ {resumen['importadas']:,} movimientos importados, {resumen['categorizadas']:,} ya categorizados")
+    if resumen["rechazadas"]:
+        st.warning(f"⚠️ {resumen['rechazadas']:,} líneas rechazadas")
+        st.dataframe(pd.concat(resumen["rechazos"]), use_container_width=True, hide_index=True)
+    if resumen["n_posibles"]:
+        st.info(f"🔁 {resumen['n_posibles']:,} movimientos importados se parecen a otros ya registrados o del propio fichero: revísalos en el histórico")
+        st.dataframe(pd.concat(resumen["posibles"]), use_container_width=True, hide_index=True)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from esquema import normalizar
+from movimientos import cargar_todos
+from repositorio import derivado
+
+# Índice de texto del histórico: una columna normalizada (minúsculas, sin tildes) con el
+# concepto, la categoría, la subcategoría y las cuentas de cada movimiento. Se guarda como
+# categórica para buscar sobre los textos distintos y no sobre cada fila.
+COLUMNAS_TEXTO = ["comentario", "categoria", "subcategoria", "cuenta", "desde", "hacia"]
+
+
+def _normalizar_columna(serie):
+    # Cada valor distinto se normaliza una sola vez
+    valores = serie.dropna().astype(str).unique()
+    mapa = {v: normalizar(v) for v in valores}
+    return serie.map(mapa).astype(object).fillna("")
+
+
+def construir_indice(df):
+    texto = pd.Series("", index=df.index)
+    for col in COLUMNAS_TEXTO:
+        if col in df.columns:
+            texto = texto + " " + _normalizar_columna(df[col])
+    return texto.astype("category")
+
+
+def obtener_indice():
+    return derivado("indice_busqueda", "movimientos", lambda: construir_indice(cargar_todos()))
+
+
+def coincidencias(indice, consulta):
+    # Todos los términos de la consulta tienen que aparecer (en cualquier orden)
+    terminos = normalizar(consulta).split()
+    if not terminos:
+        return pd.Series(True, index=indice.index)
+    categorias = indice.cat.categories.to_series()
+    validas = np.ones(len(categorias), dtype=bool)
+    for termino in terminos:
+        validas &= categorias.str.contains(termino, regex=False).to_numpy()
+    return pd.Series(validas[indice.cat.codes.to_numpy()], index=indice.index)
+
+
+def filtrar(df, indice, consulta="", importe_min=None, importe_max=None, fecha_desde=None, fecha_hasta=None):
+    mascara = pd.Series(True, index=df.index)
+    if consulta:
+        mascara &= coincidencias(indice, consulta).reindex(df.index, fill_value=False)
+    if importe_min is not None:
+        mascara &= df["importe"] >= importe_min
+    if importe_max is not None:
+        mascara &= df["importe"] <= importe_max
+    if fecha_desde is not None:
+        mascara &= df["fecha"] >= pd.Timestamp(fecha_desde)
+    if fecha_hasta is not None:
+        mascara &= df["fecha"] < pd.Timestamp(fecha_hasta) + pd.Timedelta(days=1)
+    return df[mascara]
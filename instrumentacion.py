@@ -0,0 +1,195 @@
+import functools
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+# Instrumentación opcional (FINANZAS_INSTRUMENTACION=1): por cada rerun se anota el tiempo total,
+# el de cada vista mostrar_*, las consultas al backend (número, filas y bytes recibidos) y la
+# memoria de los DataFrames en caché. Se ve en un panel de la barra lateral y se descarga como
+# JSON lines; con FINANZAS_INSTRUMENTACION_LOG cada rerun se añade además a ese fichero.
+# Desactivada no envuelve nada: medir() devuelve la función tal cual y el cliente no cambia.
+ACTIVA = os.getenv("FINANZAS_INSTRUMENTACION", "").lower() in ("1", "true", "si", "sí")
+FICHERO = os.getenv("FINANZAS_INSTRUMENTACION_LOG")
+
+# Reruns que se guardan por sesión para el panel y la descarga
+MAX_HISTORIAL = 100
+
+# Cada sesión de Streamlit ejecuta su script en un hilo: el rerun en curso se guarda por hilo
+_hilo = threading.local()
+
+
+def _rerun():
+    return getattr(_hilo, "rerun", None)
+
+
+def rerun_actual():
+    # Para que los hilos que lanza la app (repositorio.en_paralelo) anoten en el mismo rerun
+    return _rerun()
+
+
+def adoptar(rerun):
+    if rerun is not None:
+        _hilo.rerun = rerun
+
+
+def iniciar(seccion):
+    if not ACTIVA:
+        return
+    _hilo.rerun = {
+        "inicio": time.time(),
+        "seccion": seccion,
+        "vistas": {},
+        "consultas": [],
+        "_t0": time.perf_counter(),
+        "_pila": [],
+    }
+
+
+def medir(funcion):
+    # Decorador para las vistas mostrar_*: su tiempo y sus consultas se anotan aparte
+    if not ACTIVA:
+        return funcion
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        rerun = _rerun()
+        if rerun is None:
+            return funcion(*args, **kwargs)
+        rerun["_pila"].append(funcion.__name__)
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            rerun["_pila"].pop()
+            vista = rerun["vistas"].setdefault(funcion.__name__, {"segundos": 0.0})
+            vista["segundos"] += time.perf_counter() - inicio
+
+    return envoltura
+
+
+def _anotar(objetivo, operacion, segundos, data):
+    rerun = _rerun()
+    if rerun is None:
+        return
+    filas = len(data) if isinstance(data, list) else 0
+    rerun["consultas"].append({
+        "objetivo": objetivo,
+        "operacion": operacion,
+        "vista": rerun["_pila"][-1] if rerun["_pila"] else None,
+        "segundos": segundos,
+        "filas": filas,
+        "bytes": len(json.dumps(data, default=str)) if filas else 0,
+    })
+
+
+class _Consulta:
+    # Envuelve el builder de supabase-py: cada método devuelve otro _Consulta y execute() se mide
+    def __init__(self, builder, objetivo, operacion="select"):
+        self._builder = builder
+        self._objetivo = objetivo
+        self._operacion = operacion
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._builder, nombre)
+        if not callable(atributo):
+            return atributo
+        if nombre == "execute":
+            return self._execute
+        operacion = nombre if nombre in ("insert", "upsert", "update", "delete") else self._operacion
+
+        def encadenar(*args, **kwargs):
+            return _Consulta(atributo(*args, **kwargs), self._objetivo, operacion)
+
+        return encadenar
+
+    def _execute(self):
+        inicio = time.perf_counter()
+        respuesta = self._builder.execute()
+        _anotar(self._objetivo, self._operacion, time.perf_counter() - inicio, getattr(respuesta, "data", None))
+        return respuesta
+
+
+class _Cliente:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def table(self, tabla):
+        return _Consulta(self._cliente.table(tabla), tabla)
+
+    def rpc(self, nombre, parametros=None):
+        return _Consulta(self._cliente.rpc(nombre, parametros or {}), f"rpc:{nombre}", "rpc")
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
+
+
+def envolver_cliente(cliente):
+    return _Cliente(cliente) if ACTIVA else cliente
+
+
+def _memoria_cache():
+    # Bytes de los DataFrames que guarda el repositorio (tablas y derivados)
+    from repositorio import _almacen
+
+    almacen = _almacen()
+    valores = [df for proyecciones in almacen["datos"].values() for _, df in proyecciones.values()]
+    valores += [valor for _, valor in almacen["derivados"].values()]
+    return int(sum(v.memory_usage(deep=True).sum() for v in valores if isinstance(v, pd.DataFrame)))
+
+
+def _cerrar():
+    rerun = _hilo.__dict__.pop("rerun", None)
+    if rerun is None:
+        return None
+    consultas = rerun.pop("consultas")
+    rerun["segundos"] = time.perf_counter() - rerun.pop("_t0")
+    rerun.pop("_pila")
+    rerun["consultas"] = len(consultas)
+    rerun["filas"] = sum(c["filas"] for c in consultas)
+    rerun["bytes"] = sum(c["bytes"] for c in consultas)
+    rerun["segundos_consultas"] = sum(c["segundos"] for c in consultas)
+    rerun["memoria_cache"] = _memoria_cache()
+    for nombre, vista in rerun["vistas"].items():
+        propias = [c for c in consultas if c["vista"] == nombre]
+        vista.update(consultas=len(propias), filas=sum(c["filas"] for c in propias), bytes=sum(c["bytes"] for c in propias))
+    rerun["detalle_consultas"] = consultas
+    return rerun
+
+
+def panel():
+    # Se llama al final del script: cierra el rerun y pinta el panel de depuración
+    if not ACTIVA:
+        return
+    rerun = _cerrar()
+    if rerun is None:
+        return
+    historial = st.session_state.setdefault("_instrumentacion", [])
+    historial.append(rerun)
+    del historial[:-MAX_HISTORIAL]
+    lineas = "\n".join(json.dumps(r, default=str, ensure_ascii=False) for r in historial)
+    if FICHERO:
+        with open(FICHERO, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rerun, default=str, ensure_ascii=False) + "\n")
+
+    with st.sidebar.expander("🛠️ Rendimiento", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("⏱️ Rerun", f"{rerun['segundos'] * 1000:,.0f} ms")
+        col2.metric("🗄️ Consultas", f"{rerun['consultas']}", f"{rerun['segundos_consultas'] * 1000:,.0f} ms", delta_color="off")
+        col1.metric("📦 Recibido", f"{rerun['bytes'] / 1024:,.1f} KB", f"{rerun['filas']:,} filas", delta_color="off")
+        col2.metric("🧠 Caché", f"{rerun['memoria_cache'] / 2**20:,.1f} MB")
+        if rerun["vistas"]:
+            st.caption("Vistas")
+            st.dataframe(pd.DataFrame(rerun["vistas"]).T, use_container_width=True)
+        if rerun["detalle_consultas"]:
+            st.caption("Consultas")
+            st.dataframe(pd.DataFrame(rerun["detalle_consultas"]), use_container_width=True, hide_index=True)
+        st.caption(f"Últimos {len(historial)} reruns")
+        st.dataframe(
+            pd.DataFrame(historial)[["seccion", "segundos", "consultas", "filas", "bytes", "memoria_cache"]],
+            use_container_width=True, hide_index=True
+        )
+        st.download_button("⬇️ Descargar (JSON lines)", lineas, file_name="instrumentacion.jsonl", mime="application/jsonl")
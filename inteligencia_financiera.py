@@ -1,25 +1,28 @@
+from datetime import date
+
 import streamlit as st
 import pandas as pd
-
-def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gastos, df_transf, cuentas, obtener_saldos_iniciales):
+from cubo import totales, total
+from libro_mayor import obtener_libro, balance_por_cuenta, evolucion_saldos
+from escenarios import base_simulador, evaluar, rejilla
+from proyeccion import proyeccion_determinista, proyectar, ahorro_mensual_real
+from recurrentes import obtener_recurrentes, activas, calendario
+from alertas import mostrar_alertas
+from anomalias import UMBRAL, obtener_puntuaciones, obtener_meses, movimientos_atipicos, meses_atipicos
+from instrumentacion import medir
+
+@medir
+def mostrar_inteligencia_financiera(df_presupuesto, cuentas, obtener_saldos_iniciales, cubo):
     st.title("🧠 Inteligencia Financiera")
 
-    df_ingresos["fecha"] = pd.to_datetime(df_ingresos["fecha"], errors="coerce")
-    df_gastos["fecha"] = pd.to_datetime(df_gastos["fecha"], errors="coerce")
-    df_transf["fecha"] = pd.to_datetime(df_transf["fecha"], errors="coerce")
-    df_mov["fecha"] = pd.to_datetime(df_mov["fecha"], errors="coerce")
-
-    # — Preparar fechas y datos base —
-    df_mov["fecha"] = pd.to_datetime(df_mov["fecha"], errors="coerce")
-    df_mov["mes"]   = df_mov["fecha"].dt.month
-    df_mov["año"]   = df_mov["fecha"].dt.year
+    libro = obtener_libro()
 
     # 1) Porcentaje de ahorro mensual
     with st.expander("📊 Porcentaje de ahorro mensual"):
         if st.toggle("ℹ️", key="help_ahorro_mensual"):
             st.caption("Compara el porcentaje que logras ahorrar cada mes respecto a tus ingresos.")
-        ingresos_mes  = df_ingresos.groupby(df_ingresos["fecha"].dt.month)["importe"].sum()
-        gastos_mes    = df_gastos.groupby(df_gastos["fecha"].dt.month)["importe"].sum()
+        ingresos_mes  = totales(cubo, "mes", tipo="ingreso")
+        gastos_mes    = totales(cubo, "mes", tipo="gasto")
         porcentaje_ahorro = ((ingresos_mes - gastos_mes) / ingresos_mes).fillna(0) * 100
         st.line_chart(porcentaje_ahorro.rename("% Ahorro mensual"))
 
@@ -27,8 +30,8 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
     with st.expander("📈 Evolución interanual de ingresos y gastos"):
         if st.toggle("ℹ️", key="help_evol_interanual"):
             st.caption("Visualiza cómo han variado tus ingresos y gastos a lo largo de los años.")
-        ingresos_anuales = df_ingresos.groupby(df_ingresos["fecha"].dt.year)["importe"].sum()
-        gastos_anuales   = df_gastos.groupby(df_gastos["fecha"].dt.year)["importe"].sum()
+        ingresos_anuales = totales(cubo, "año", tipo="ingreso")
+        gastos_anuales   = totales(cubo, "año", tipo="gasto")
         df_evol = pd.DataFrame({"Ingresos": ingresos_anuales, "Gastos": gastos_anuales})
         st.bar_chart(df_evol)
 
@@ -44,9 +47,7 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
         if st.toggle("ℹ️", key="help_top_gastos"):
             st.caption("Ranking de tus subcategorías de gasto con mayor impacto mensual.")
         top_gastos = (
-            df_gastos
-            .groupby("subcategoria")["importe"]
-            .sum()
+            totales(cubo, "subcategoria", tipo="gasto")
             .sort_values(ascending=False)
             .head(10)
         )
@@ -57,7 +58,7 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
         if st.toggle("ℹ️", key="help_ejecucion"):
             st.caption("Muestra cuánto has ejecutado del presupuesto por categoría.")
         presupuesto_total = df_presupuesto.groupby("categoria")["importe"].sum()
-        gastos_total      = df_gastos.groupby("categoria")["importe"].sum()
+        gastos_total      = totales(cubo, "categoria", tipo="gasto")
         comparativa = (gastos_total / presupuesto_total).fillna(0) * 100
         st.dataframe(comparativa.rename("% ejecutado"))
 
@@ -65,26 +66,51 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
     with st.expander("💸 Promedio mensual por categoría"):
         if st.toggle("ℹ️", key="help_media_cat"):
             st.caption("Promedio mensual gastado por categoría durante el año actual.")
-        df_gastos["mes"] = pd.to_datetime(df_gastos["fecha"], errors="coerce").dt.month
-        media_cat = df_gastos.groupby("categoria")["importe"].mean()
+        media_cat = totales(cubo, "categoria", tipo="gasto") / totales(cubo, "categoria", "n", tipo="gasto")
         st.bar_chart(media_cat.rename("Media mensual por categoría"))
 
     # 8) Gasto inesperado (desviaciones)
     with st.expander("📊 Gasto inesperado (desviaciones)"):
         if st.toggle("ℹ️", key="help_desviacion"):
-            st.caption("Muestra las categorías donde has gastado más de lo presupuestado.")
+            st.caption(
+                "Muestra las categorías donde has gastado más de lo presupuestado, y los gastos y meses que se "
+                "salen de lo habitual en su subcategoría comparados con los anteriores (puntuación = cuántas "
+                "desviaciones por encima de la mediana)."
+            )
         df_presupuesto_total = df_presupuesto.groupby("categoria")["importe"].sum()
-        df_gastos_total      = df_gastos.groupby("categoria")["importe"].sum()
+        df_gastos_total      = totales(cubo, "categoria", tipo="gasto")
         desviaciones = (df_gastos_total - df_presupuesto_total).fillna(0)
         desviaciones = desviaciones[desviaciones > 0].sort_values(ascending=False)
         st.bar_chart(desviaciones.rename("Desviación sobre presupuesto"))
 
+        col1, col2 = st.columns(2)
+        sensibilidad = col1.slider("Puntuación mínima", min_value=2.0, max_value=8.0, value=UMBRAL, step=0.5, key="anomalias_umbral")
+        desde = col2.date_input("Gastos desde", date.today() - pd.DateOffset(years=1), key="anomalias_desde")
+        formato = {
+            "importe": st.column_config.NumberColumn("Importe", format="%.2f €"),
+            "mediana": st.column_config.NumberColumn("Habitual", format="%.2f €"),
+            "puntuacion": st.column_config.NumberColumn("Puntuación", format="%.1f"),
+        }
+
+        st.markdown("#### 📅 Meses atípicos por subcategoría")
+        meses_raros = meses_atipicos(obtener_meses(cubo), sensibilidad)
+        st.dataframe(meses_raros.assign(periodo=meses_raros["periodo"].astype(str)), hide_index=True, column_config=formato)
+
+        st.markdown("#### 🧾 Gastos atípicos")
+        gastos_raros = movimientos_atipicos(obtener_puntuaciones(), sensibilidad, desde)
+        st.caption(f"{len(gastos_raros):,} gastos por encima de lo habitual en su subcategoría")
+        st.dataframe(
+            gastos_raros.head(500),
+            hide_index=True,
+            column_config={"fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"), **formato}
+        )
+
     # 9) Porcentaje ahorro sobre ingreso por categoría
     with st.expander("📌 Porcentaje ahorro sobre ingreso por categoría"):
         if st.toggle("ℹ️", key="help_ahorro_categoria"):
             st.caption("Cuánto te queda de cada euro ingresado en función del gasto por categoría.")
-        ingreso_total       = df_ingresos["importe"].sum()
-        ahorro_por_categoria = ingreso_total - df_gastos.groupby("categoria")["importe"].sum()
+        ingreso_total       = total(cubo, tipo="ingreso")
+        ahorro_por_categoria = ingreso_total - totales(cubo, "categoria", tipo="gasto")
         porcentaje = (ahorro_por_categoria / ingreso_total).fillna(0) * 100
         st.dataframe(porcentaje.rename("% ahorro por categoría"))
 
@@ -92,74 +118,129 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
     with st.expander("📈 Proyección de ahorro futuro con interés compuesto"):
         if st.toggle("ℹ️", key="help_proyeccion"):
             st.caption("Simula el crecimiento de tus ahorros en el tiempo con intereses.")
-        capital_inicial = st.number_input("💰 Ahorro actual (€)", min_value=0.0, value=0.0)
-        ahorro_mensual  = st.number_input("📥 Ahorro mensual (€)", min_value=0.0, value=0.0)
-        interes_anual   = st.number_input("📊 Interés anual (%)", min_value=0.0, value=2.0)
+        # Los valores por defecto salen de los datos: saldo actual y ahorro mensual medio real
+        media_ahorro, desviacion_ahorro = ahorro_mensual_real(cubo)
+        saldos_iniciales = obtener_saldos_iniciales()
+        saldo_hoy = balance_por_cuenta(libro, saldos_iniciales)["saldo_actual"].sum() if saldos_iniciales else 0.0
+
+        col1, col2 = st.columns(2)
+        capital_inicial = col1.number_input("💰 Ahorro actual (€)", min_value=0.0, value=max(round(float(saldo_hoy), 2), 0.0))
+        ahorro_mensual  = col2.number_input("📥 Ahorro mensual (€)", min_value=0.0, value=max(round(media_ahorro, 2), 0.0))
+        interes_anual   = col1.number_input("📊 Interés anual (%)", min_value=0.0, value=2.0)
+        volatilidad     = col2.number_input("🎢 Volatilidad anual (%)", min_value=0.0, value=5.0)
+        variacion_ahorro = col1.number_input("〰️ Variación del ahorro mensual (€)", min_value=0.0, value=round(desviacion_ahorro, 2))
+        objetivo        = col2.number_input("🎯 Objetivo (€)", min_value=0.0, value=0.0)
         años            = st.slider("📆 Años de proyección", min_value=1, max_value=50, value=10)
 
         meses = años * 12
-        interes_mensual = interes_anual / 100 / 12
-        saldo = []
-        total = capital_inicial
-        for _ in range(meses):
-            total = total * (1 + interes_mensual) + ahorro_mensual
-            saldo.append(total)
+        determinista = proyeccion_determinista(capital_inicial, ahorro_mensual, interes_anual, meses)
+        df_bandas, probabilidad = proyectar(capital_inicial, ahorro_mensual, interes_anual, volatilidad, meses, variacion_ahorro, objetivo)
 
-        df_proy = pd.Series(saldo, name="Saldo proyectado")
-        st.line_chart(df_proy)
-        st.write(f"📌 Saldo final estimado: {total:,.2f} €")
+        st.line_chart(pd.concat([df_bandas, determinista.rename("Sin volatilidad")], axis=1))
+        st.caption("Bandas P10/P50/P90 de 10.000 escenarios simulados")
+        st.write(f"📌 Saldo final estimado: {determinista.iloc[-1]:,.2f} € (mediana {df_bandas['P50'].iloc[-1]:,.2f} €)")
+        if probabilidad is not None:
+            st.metric("🎯 Probabilidad de alcanzar el objetivo", f"{probabilidad * 100:.1f} %")
 
     # 11) Simulador de presupuestos
     with st.expander("🧮 Simulador de presupuestos"):
         if st.toggle("ℹ️", key="help_simulador"):
             st.caption("Ajusta presupuestos por categoría y compara con gastos reales.")
-        categorias = df_presupuesto["categoria"].unique().tolist()
+        base = base_simulador(cubo)
+        categorias = base["categorias"]
         cambios = {}
         for cat in categorias:
             cambios[cat] = st.slider(f"Ajuste presupuesto {cat} (%)", -50, 100, 0)
         st.write("% Ajustes propuestos:", cambios)
 
-        df_pres_ajustado = df_presupuesto.copy()
-        df_pres_ajustado["ajuste_pct"] = df_pres_ajustado["categoria"].map(cambios)
-        df_pres_ajustado["importe_ajustado"] = df_pres_ajustado["importe"] * (1 + df_pres_ajustado["ajuste_pct"] / 100)
-
+        # Presupuesto y gasto real son vectores ya calculados: mover un slider solo evalúa un escenario
+        ajustes = [cambios[cat] for cat in categorias]
+        escenario = evaluar(base, [ajustes]).iloc[0]
         comparacion_final = pd.DataFrame({
-            "Categoria": df_pres_ajustado["categoria"],
-            "Presupuesto Original": df_pres_ajustado["importe"],
-            "Presupuesto Ajustado": df_pres_ajustado["importe_ajustado"],
-            "Gasto Real": df_gastos.groupby("categoria")["importe"].sum().reindex(df_pres_ajustado["categoria"]).values
+            "Categoria": categorias,
+            "Presupuesto Original": base["presupuesto"],
+            "Presupuesto Ajustado": base["presupuesto"] * (1 + pd.Series(ajustes, dtype=float).to_numpy() / 100),
+            "Gasto Real (ritmo anual)": base["real"],
         })
         comparacion_final["Diferencia Ajustado-Real"] = (
-            comparacion_final["Presupuesto Ajustado"] - comparacion_final["Gasto Real"]
+            comparacion_final["Presupuesto Ajustado"] - comparacion_final["Gasto Real (ritmo anual)"]
         )
-        st.dataframe(comparacion_final)
+        st.dataframe(comparacion_final, hide_index=True)
+        col1, col2 = st.columns(2)
+        col1.metric("💰 Ahorro anual proyectado", f"{escenario['ahorro']:,.2f} €")
+        col2.metric("✂️ Recorte necesario", f"{escenario['recorte']:,.2f} €")
+
+        st.markdown("#### 🔀 Barrido de escenarios")
+        st.caption("Prueba todas las combinaciones de ajustes en las categorías elegidas y ordénalas por ahorro anual.")
+        por_gasto = [categorias[i] for i in base["real"].argsort()[::-1]]
+        variables = st.multiselect("Categorías a variar", categorias, default=por_gasto[:3], key="barrido_categorias")
+        rango = st.slider("Rango de ajuste (%)", -50, 100, (-30, 10), key="barrido_rango")
+        paso = st.selectbox("Paso (%)", [5, 10, 20], index=1, key="barrido_paso")
+        recorte_max = st.number_input("✂️ Recorte máximo asumible (€/año)", min_value=0.0, value=1000.0, step=100.0, key="barrido_recorte")
+
+        valores = list(range(rango[0], rango[1] + 1, paso))
+        try:
+            matriz = rejilla(base, cambios, variables, valores)
+        except ValueError as e:
+            st.warning(f"⚠️ {e}. Elige menos categorías o un paso mayor.")
+        else:
+            ranking = evaluar(base, matriz)
+            viables = ranking[ranking["recorte"] <= recorte_max]
+            st.write(f"{len(matriz):,} escenarios evaluados, {len(viables):,} dentro del recorte asumible")
+            st.dataframe(
+                viables.head(10)[variables + ["presupuesto", "recorte", "ahorro"]],
+                hide_index=True,
+                column_config={col: st.column_config.NumberColumn(format="%.0f") for col in ["presupuesto", "recorte", "ahorro"]}
+            )
 
     # 12) Objetivos financieros (en desarrollo)
     with st.expander("🎯 Objetivos financieros"):
         st.info("Define y sigue tus metas de ahorro o inversión")
         st.write("(En desarrollo)")
 
-    # 13) Calendario de pagos (en desarrollo)
+    # 13) Calendario de pagos
     with st.expander("📅 Calendario de pagos"):
-        st.info("Recordatorio de pagos recurrentes")
-        st.write("(En desarrollo)")
+        if st.toggle("ℹ️", key="help_calendario"):
+            st.caption("Pagos recurrentes (mensuales, trimestrales y anuales) detectados en tus gastos y sus próximos vencimientos estimados.")
+        hoy = date.today()
+        recurrentes = obtener_recurrentes()
+        horizonte = st.slider("📆 Meses a mostrar", min_value=1, max_value=12, value=3, key="calendario_meses")
+        proximos = calendario(recurrentes, hoy, horizonte)
+        if proximos.empty:
+            st.info("No se han detectado pagos recurrentes activos")
+        else:
+            en_30_dias = proximos[proximos["fecha"] <= pd.Timestamp(hoy) + pd.Timedelta(days=30)]["importe"].sum()
+            col1, col2 = st.columns(2)
+            col1.metric("💸 Pagos en los próximos 30 días", f"{en_30_dias:,.2f} €")
+            col2.metric("🔁 Pagos recurrentes activos", len(activas(recurrentes, hoy)))
+            st.bar_chart(proximos.groupby(proximos["fecha"].dt.strftime("%Y-%m"))["importe"].sum().rename("Pagos previstos"))
+            st.dataframe(
+                proximos,
+                hide_index=True,
+                column_config={
+                    "fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
+                    "importe": st.column_config.NumberColumn("Importe", format="%.2f €"),
+                }
+            )
 
     # 14) Checklist financiero mensual (en desarrollo)
     with st.expander("🧾 Checklist financiero mensual"):
         st.info("Tareas recomendadas para fin de mes")
         st.write("(En desarrollo)")
 
-    # 15) Alertas inteligentes (en desarrollo)
+    # 15) Alertas inteligentes
     with st.expander("📲 Alertas inteligentes"):
-        st.info("Notificaciones automáticas basadas en reglas")
-        st.write("(En desarrollo)")
+        if st.toggle("ℹ️", key="help_alertas"):
+            st.caption("Avisos según tus reglas: gasto de una categoría sobre su presupuesto, saldo bajo en una cuenta o gastos muy por encima de lo habitual. Se comprueban también al guardar movimientos.")
+        objetivos = set(cuentas) | set(cubo["categoria"].dropna().astype(str)) | set(cubo["subcategoria"].dropna().astype(str))
+        mostrar_alertas(objetivos)
 
     # 16) Ratios financieros personales
     with st.expander("📉 Ratios financieros personales"):
         with st.popover("ℹ️"):
             st.markdown("Tasa de ahorro total acumulada sobre tus ingresos del año")
-        total_ingresos = df_ingresos["importe"].sum()
-        total_gastos   = df_gastos["importe"].sum()
+        total_ingresos = total(cubo, tipo="ingreso")
+        total_gastos   = total(cubo, tipo="gasto")
         tasa_ahorro    = (total_ingresos - total_gastos) / total_ingresos * 100 if total_ingresos else 0
         st.metric("Tasa de ahorro global (%)", f"{tasa_ahorro:.2f}%")
 
@@ -169,24 +250,10 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
             st.markdown("Calcula cuántos meses podrías vivir sin ingresos laborales")
 
         ingresos_pasivos = st.number_input("Ingresos pasivos mensuales (€)", min_value=0.0, value=0.0)
-        gastos_medio     = df_gastos.groupby(df_gastos["fecha"].dt.month)["importe"].sum().mean()
+        gastos_medio     = totales(cubo, "mes", tipo="gasto").mean()
 
-        df_saldos_raw = pd.DataFrame(obtener_saldos_iniciales()).rename(columns={"saldo_inicial": "saldo"})
-
-        if "cuenta" in df_saldos_raw.columns:
-            df_saldos = df_saldos_raw.set_index("cuenta")
-            df_saldos["saldo"] = df_saldos["saldo"].astype(float)
-
-            df_saldos["saldo_final"] = (
-                df_saldos["saldo"]
-                + df_mov[df_mov["tipo"] == "ingreso"].groupby("cuenta")["importe"].sum().fillna(0)
-                - df_mov[df_mov["tipo"] == "gasto"].groupby("cuenta")["importe"].sum().fillna(0)
-                + df_mov[df_mov["tipo"] == "transferencia"].groupby("hacia")["importe"].sum().fillna(0)
-                - df_mov[df_mov["tipo"] == "transferencia"].groupby("desde")["importe"].sum().fillna(0)
-            )
-            saldo_actual = df_saldos["saldo_final"].sum()
-        else:
-            saldo_actual = 0
+        saldos_iniciales = obtener_saldos_iniciales()
+        saldo_actual = balance_por_cuenta(libro, saldos_iniciales)["saldo_actual"].sum() if saldos_iniciales else 0
 
         if gastos_medio > 0:
             meses_restantes = (saldo_actual + ingresos_pasivos * 12) / (gastos_medio * 12)
@@ -199,42 +266,10 @@ def mostrar_inteligencia_financiera(df_mov, df_presupuesto, df_ingresos, df_gast
     with st.expander("💳 Evolución del saldo por cuenta"):
         with st.popover("ℹ️"):
             st.markdown("Muestra cómo evolucionan los saldos por cada cuenta bancaria")
-        df_saldos_raw = pd.DataFrame(obtener_saldos_iniciales()).rename(columns={"saldo_inicial": "saldo"})
-        if "cuenta" not in df_saldos_raw.columns:
+        saldos_iniciales = obtener_saldos_iniciales()
+        if not saldos_iniciales:
             st.error("No se encontraron saldos iniciales")
             return
 
-        df_saldos = df_saldos_raw.set_index("cuenta")
-        df_saldos["saldo"]  = df_saldos["saldo"].astype(float)
-        df_saldos["ingresos"] = (
-            df_mov[df_mov["tipo"] == "ingreso"]
-            .groupby("cuenta")["importe"]
-            .sum()
-        )
-        df_saldos["gastos"] = (
-            df_mov[df_mov["tipo"] == "gasto"]
-            .groupby("cuenta")["importe"]
-            .sum()
-        )
-        df_saldos["transferencias_recibidas"] = (
-            df_mov[df_mov["tipo"] == "transferencia"]
-            .groupby("hacia")["importe"]
-            .sum()
-        )
-        df_saldos["transferencias_enviadas"] = (
-            df_mov[df_mov["tipo"] == "transferencia"]
-            .groupby("desde")["importe"]
-            .sum()
-        )
-
-        df_saldos = df_saldos.fillna(0)
-        df_saldos["saldo_final"] = (
-            df_saldos["saldo"]
-            + df_saldos["ingresos"]
-            - df_saldos["gastos"]
-            + df_saldos["transferencias_recibidas"]
-            - df_saldos["transferencias_enviadas"]
-        )
-        st.bar_chart(df_saldos["saldo_final"].sort_values(ascending=False))
-
-
+        st.line_chart(evolucion_saldos(libro, saldos_iniciales))
+        st.bar_chart(balance_por_cuenta(libro, saldos_iniciales)["saldo_actual"].sort_values(ascending=False))
@@ -0,0 +1,113 @@
+import pandas as pd
+
+from esquema import con_importe
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_tabla, derivado
+
+# Libro mayor: un apunte por cuenta y día con lo que entra y sale, y el acumulado desde el inicio.
+# Sustituye a los cálculos "saldo inicial + ingresos − gastos + recibidas − enviadas" repartidos por la app.
+# Los importes del libro van en céntimos enteros; las consultas devuelven euros.
+COLUMNAS_IMPORTES = ["ingresos", "gastos", "transferencias_recibidas", "transferencias_enviadas"]
+
+
+def _apuntes(df_mov):
+    # Cada movimiento genera uno (ingreso/gasto) o dos apuntes (transferencia: desde y hacia)
+    df = con_importe(df_mov[df_mov["fecha"].notna()])
+    importe = df["importe_cent"]
+    tipo = df["tipo"]
+    fecha = df["fecha"].dt.normalize()
+    transf = tipo == "transferencia"
+
+    partes = []
+    for columna, mascara, cuenta in [
+        ("ingresos", tipo == "ingreso", df["cuenta"]),
+        ("gastos", tipo == "gasto", df["cuenta"]),
+        ("transferencias_recibidas", transf, df["hacia"]),
+        ("transferencias_enviadas", transf, df["desde"]),
+    ]:
+        partes.append(pd.DataFrame({
+            "cuenta": cuenta[mascara].astype(object),
+            "fecha": fecha[mascara],
+            "columna": columna,
+            "importe": importe[mascara],
+        }))
+    apuntes = pd.concat(partes, ignore_index=True)
+    apuntes = apuntes[apuntes["cuenta"].notna()]
+    if apuntes.empty:
+        indice = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=["cuenta", "fecha"])
+        return pd.DataFrame(0, index=indice, columns=COLUMNAS_IMPORTES, dtype="int64")
+
+    diario = apuntes.pivot_table(
+        index=["cuenta", "fecha"], columns="columna", values="importe", aggfunc="sum", fill_value=0
+    )
+    return diario.reindex(columns=COLUMNAS_IMPORTES, fill_value=0).astype("int64")
+
+
+def _acumular(diario):
+    diario = diario.sort_index()
+    diario["neto"] = (
+        diario["ingresos"] - diario["gastos"]
+        + diario["transferencias_recibidas"] - diario["transferencias_enviadas"]
+    )
+    diario["acumulado"] = diario.groupby(level="cuenta")["neto"].cumsum()
+    return diario
+
+
+def construir_libro(df_mov):
+    return _acumular(_apuntes(df_mov))
+
+
+def añadir_movimientos(libro, nuevos):
+    # Solo se recalcula el acumulado de las cuentas afectadas por los movimientos nuevos
+    delta = _apuntes(nuevos)
+    if delta.empty:
+        return libro
+    afectadas = delta.index.get_level_values("cuenta").unique()
+    en_afectadas = libro.index.get_level_values("cuenta").isin(afectadas)
+    combinado = pd.concat([libro.loc[en_afectadas, COLUMNAS_IMPORTES], delta])
+    combinado = combinado.groupby(level=["cuenta", "fecha"]).sum()
+    return pd.concat([libro[~en_afectadas], _acumular(combinado)]).sort_index()
+
+
+def obtener_libro():
+    return derivado(
+        "libro_mayor",
+        "movimientos",
+        lambda: construir_libro(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        añadir_movimientos,
+    )
+
+
+def saldos_iniciales_por_cuenta(saldos_iniciales):
+    df = pd.DataFrame(saldos_iniciales)
+    if df.empty or "cuenta" not in df.columns:
+        return pd.Series(dtype=float, name="saldo")
+    columna = "saldo_inicial" if "saldo_inicial" in df.columns else "saldo"
+    return df.set_index("cuenta")[columna].astype(float).rename("saldo")
+
+
+def balance_por_cuenta(libro, saldos_iniciales, fecha=None):
+    # Saldo inicial, totales por concepto y saldo final de cada cuenta (a una fecha si se indica)
+    if fecha is not None:
+        libro = libro[libro.index.get_level_values("fecha") <= pd.Timestamp(fecha)]
+    totales = libro.groupby(level="cuenta")[COLUMNAS_IMPORTES].sum() / 100
+    iniciales = saldos_iniciales_por_cuenta(saldos_iniciales)
+    balance = pd.concat([iniciales, totales], axis=1).fillna(0)
+    balance["saldo_actual"] = (
+        balance["saldo"]
+        + balance["ingresos"] - balance["gastos"]
+        + balance["transferencias_recibidas"] - balance["transferencias_enviadas"]
+    )
+    return balance
+
+
+def saldo_a_fecha(libro, saldos_iniciales, fecha):
+    return balance_por_cuenta(libro, saldos_iniciales, fecha)["saldo_actual"]
+
+
+def evolucion_saldos(libro, saldos_iniciales):
+    # Saldo al cierre de cada día por cuenta (columnas), arrastrando el último valor conocido
+    if libro.empty:
+        return pd.DataFrame()
+    iniciales = saldos_iniciales_por_cuenta(saldos_iniciales)
+    saldos = libro["acumulado"].unstack("cuenta").sort_index().ffill().fillna(0) / 100
+    return saldos + iniciales.reindex(saldos.columns, fill_value=0)
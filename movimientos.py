@@ -1,24 +1,34 @@
-from supabase_client import supabase
+from repositorio import cargar_tabla, derivado, COLUMNAS_MOVIMIENTOS
+from utils_movimientos import combinar_movimientos
+from esquema import COLUMNAS_INTERNAS, tipar_movimientos
 import pandas as pd
 
+def cargar_movimientos(columnas=COLUMNAS_MOVIMIENTOS):
+    # La fecha ya llega parseada desde el repositorio
+    return cargar_tabla("movimientos", columnas).copy()
+
 def cargar_datos(tipo):
-    response = supabase.table("movimientos").select("*").eq("tipo", tipo).execute()
+    # Memoizado por versión de movimientos: cada sección lo pide solo cuando se muestra
+    return derivado(f"datos:{tipo}", "movimientos", lambda: _separar(tipo))
+
+def cargar_todos():
+    return derivado(
+        "datos:todos",
+        "movimientos",
+        lambda: combinar_movimientos(cargar_datos("ingreso"), cargar_datos("gasto"), cargar_datos("transferencia"))
+    )
+
+def _separar(tipo):
+    df_todos = cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)
     columnas_base = [
         "fecha", "cuenta", "categoria", "subcategoria",
         "importe", "comentario", "tipo", "movimiento_id"
-    ]
+    ] + COLUMNAS_INTERNAS
     if tipo == "transferencia":
         columnas_base += ["desde", "hacia"]
 
-    if response.data:
-        df = pd.DataFrame(response.data)
-        if "fecha" in df.columns:
-            df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-
-        for col in columnas_base:
-            if col not in df.columns:
-                df[col] = None
-
-        return df[columnas_base if tipo != "transferencia" else columnas_base]
+    if not df_todos.empty:
+        df = df_todos[df_todos["tipo"] == tipo].rename(columns={"id": "movimiento_id"})
+        return df[columnas_base].reset_index(drop=True)
     else:
-        return pd.DataFrame(columns=columnas_base)
+        return tipar_movimientos(pd.DataFrame(columns=columnas_base))
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from cubo import totales
+
+# Proyección del ahorro con interés compuesto.
+#   - determinista: fórmula cerrada del valor futuro, sin bucle por meses
+#   - Monte Carlo: miles de caminos con rentabilidad y aportación aleatorias en una sola operación
+#     matricial (caminos × meses) con cumprod/cumsum
+PERCENTILES = [10, 50, 90]
+
+
+def proyeccion_determinista(capital, aportacion, interes_anual, meses):
+    # S_n = C·(1+r)^n + A·((1+r)^n − 1)/r, con r el interés mensual
+    r = interes_anual / 100 / 12
+    n = np.arange(1, meses + 1)
+    if r == 0:
+        return pd.Series(capital + aportacion * n, index=n, name="Determinista")
+    factor = (1 + r) ** n
+    return pd.Series(capital * factor + aportacion * (factor - 1) / r, index=n, name="Determinista")
+
+
+def simular_caminos(capital, aportacion, interes_anual, volatilidad_anual, meses,
+                    volatilidad_aportacion=0.0, n_caminos=10_000, semilla=0):
+    # Matriz (n_caminos × meses) con el saldo de cada camino al cierre de cada mes.
+    # Con G_t = Π(1+r_k) el saldo es S_t = G_t · (C + Σ a_k / G_k): dos acumulados y un producto.
+    rng = np.random.default_rng(semilla)
+    sigma = volatilidad_anual / 100 / np.sqrt(12)
+    mu = np.log1p(interes_anual / 100 / 12) - sigma ** 2 / 2
+
+    # float32: la mitad de memoria y de tiempo, de sobra para pintar percentiles
+    forma = (n_caminos, meses)
+    crecimiento = rng.standard_normal(forma, dtype=np.float32)
+    crecimiento *= sigma
+    crecimiento += mu
+    np.cumsum(crecimiento, axis=1, out=crecimiento)
+    np.exp(crecimiento, out=crecimiento)
+
+    if volatilidad_aportacion:
+        saldo = rng.standard_normal(forma, dtype=np.float32)
+        saldo *= volatilidad_aportacion
+        saldo += aportacion
+    else:
+        saldo = np.full(forma, aportacion, dtype=np.float32)
+    saldo /= crecimiento
+    np.cumsum(saldo, axis=1, out=saldo)
+    saldo += capital
+    saldo *= crecimiento
+    return saldo
+
+
+def bandas(caminos, objetivo=None):
+    # Percentiles por mes y probabilidad de terminar por encima del objetivo
+    meses = np.arange(1, caminos.shape[1] + 1)
+    valores = np.percentile(caminos, PERCENTILES, axis=0)
+    df = pd.DataFrame(valores.T, index=meses, columns=[f"P{p}" for p in PERCENTILES])
+    probabilidad = float((caminos[:, -1] >= objetivo).mean()) if objetivo else None
+    return df, probabilidad
+
+
+@st.cache_data(max_entries=20, show_spinner=False)
+def proyectar(capital, aportacion, interes_anual, volatilidad_anual, meses, volatilidad_aportacion, objetivo, n_caminos=10_000):
+    # Solo se guardan las bandas (pocas filas), no la matriz de caminos
+    caminos = simular_caminos(capital, aportacion, interes_anual, volatilidad_anual, meses, volatilidad_aportacion, n_caminos)
+    return bandas(caminos, objetivo)
+
+
+def ahorro_mensual_real(cubo):
+    # Media y desviación del ahorro mensual (ingresos − gastos) de los meses con movimientos
+    ingresos = totales(cubo, ["año", "mes"], tipo="ingreso")
+    gastos = totales(cubo, ["año", "mes"], tipo="gasto")
+    ahorro = ingresos.subtract(gastos, fill_value=0)
+    if ahorro.empty:
+        return 0.0, 0.0
+    return float(ahorro.mean()), float(ahorro.std(ddof=0))
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+from duplicados import normalizar_concepto
+from esquema import con_importe
+from repositorio import COLUMNAS_MOVIMIENTOS, cargar_tabla, derivado
+
+# Detección de pagos recurrentes (recibos, suscripciones, seguros...) para el calendario de pagos.
+#   - serie:         gastos con el mismo concepto normalizado (sin números: fechas, referencias),
+#                    la misma cuenta y un importe parecido. Ordenados por importe, se corta la
+#                    serie cuando el salto con el anterior supera TOLERANCIA_IMPORTE.
+#   - periodicidad:  la mediana de los intervalos entre pagos cae en el rango de un periodo y al
+#                    menos MIN_REGULARIDAD de los intervalos también
+# Todo son operaciones por columnas sobre la tabla de gastos ordenada por (serie, día), sin bucle
+# por serie. El estado se guarda por versión de movimientos y con altas solo se recalculan las
+# series de los conceptos que han recibido pagos nuevos.
+
+# periodo: (meses entre pagos, intervalo mínimo y máximo en días, pagos mínimos para fiarse)
+PERIODOS = {
+    "mensual": (1, 26, 35, 4),
+    "trimestral": (3, 85, 97, 3),
+    "anual": (12, 350, 380, 3),
+}
+MIN_REGULARIDAD = 0.75
+TOLERANCIA_IMPORTE = 0.25
+
+# Una serie sin pagos en más de MARGEN_ACTIVA periodos se da por cancelada
+MARGEN_ACTIVA = 1.5
+
+
+def _conceptos(df):
+    # Concepto sin tokens con cifras ("recibo luz 03 2024 ref8812" -> "recibo luz"); sin
+    # comentario se usa la subcategoría
+    normalizados = normalizar_concepto(df["comentario"])
+    mapa = {
+        v: " ".join(p for p in v.split() if not any(c.isdigit() for c in p))
+        for v in normalizados.unique()
+    }
+    conceptos = normalizados.map(mapa)
+    subcategoria = df["subcategoria"].astype(object)
+    return conceptos.where(conceptos != "", "[" + subcategoria.fillna("sin concepto").astype(str) + "]")
+
+
+def _gastos(df):
+    # Gastos en formato compacto: clave de serie, día (entero) e importe en céntimos
+    df = con_importe(df[(df["tipo"] == "gasto") & df["fecha"].notna()])
+    if df.empty:
+        return pd.DataFrame(columns=["clave", "concepto", "cuenta", "subcategoria", "categoria", "dia", "importe_cent"])
+    concepto = _conceptos(df)
+    cuenta = df["cuenta"].astype(object).fillna("")
+    return pd.DataFrame({
+        "clave": (concepto + " · " + cuenta).to_numpy(),
+        "concepto": concepto.to_numpy(),
+        "cuenta": cuenta.to_numpy(),
+        "subcategoria": df["subcategoria"].astype(object).to_numpy(),
+        "categoria": df["categoria"].astype(object).to_numpy(),
+        "dia": df["fecha"].to_numpy(dtype="datetime64[D]").astype("int64"),
+        "importe_cent": np.abs(df["importe_cent"].to_numpy(dtype="int64")),
+    })
+
+
+def _series(gastos):
+    # Una fila por serie recurrente detectada en `gastos`
+    columnas = ["clave", "concepto", "cuenta", "subcategoria", "categoria", "periodicidad",
+                "pagos", "intervalo", "ultimo", "importe"]
+    if gastos.empty:
+        return pd.DataFrame(columns=columnas)
+
+    # Bandas de importe: cortes donde el importe salta más de la tolerancia dentro de una clave
+    g = gastos.sort_values(["clave", "importe_cent"], kind="stable")
+    clave, importe = g["clave"].to_numpy(), g["importe_cent"].to_numpy()
+    nueva = np.r_[True, (clave[1:] != clave[:-1]) | (importe[1:] > importe[:-1] * (1 + TOLERANCIA_IMPORTE))]
+    g = g.assign(serie=np.cumsum(nueva))
+
+    # Intervalos entre pagos consecutivos de cada serie (dos pagos el mismo día cuentan como uno)
+    g = g.drop_duplicates(["serie", "dia"]).sort_values(["serie", "dia"], kind="stable")
+    serie, dia = g["serie"].to_numpy(), g["dia"].to_numpy()
+    misma = np.r_[False, serie[1:] == serie[:-1]]
+    intervalo = np.where(misma, np.r_[0, np.diff(dia)], np.nan)
+    g = g.assign(intervalo=intervalo)
+
+    por_serie = g.groupby("serie", sort=False)
+    resumen = por_serie.agg(
+        clave=("clave", "last"), concepto=("concepto", "last"), cuenta=("cuenta", "last"),
+        subcategoria=("subcategoria", "last"), categoria=("categoria", "last"),
+        pagos=("dia", "size"), intervalo=("intervalo", "median"), ultimo=("dia", "last"),
+    )
+    # Importe esperado: mediana de los tres últimos pagos (sigue las subidas de precio)
+    resumen["importe"] = g.groupby("serie").tail(3).groupby("serie")["importe_cent"].median() / 100
+
+    resumen["periodicidad"] = None
+    regularidad = pd.Series(0.0, index=resumen.index)
+    minimos = pd.Series(np.inf, index=resumen.index)
+    intervalos = g[misma]
+    for nombre, (_, minimo, maximo, pagos) in PERIODOS.items():
+        en_rango = intervalos["intervalo"].between(minimo, maximo).groupby(intervalos["serie"]).mean()
+        candidata = resumen["intervalo"].between(minimo, maximo)
+        resumen.loc[candidata, "periodicidad"] = nombre
+        regularidad[candidata] = en_rango.reindex(resumen.index[candidata]).to_numpy()
+        minimos[candidata] = pagos
+
+    resumen = resumen[
+        resumen["periodicidad"].notna() & (regularidad >= MIN_REGULARIDAD) & (resumen["pagos"] >= minimos)
+    ].copy()
+    resumen["ultimo"] = pd.to_datetime(resumen["ultimo"].to_numpy().astype("datetime64[D]"))
+    return resumen[columnas].reset_index(drop=True)
+
+
+def construir(df):
+    gastos = _gastos(df)
+    return {"gastos": gastos, "series": _series(gastos)}
+
+
+def añadir(estado, df):
+    # Con altas solo se rehacen las series de las claves que tienen pagos nuevos
+    nuevos = _gastos(df)
+    if nuevos.empty:
+        return estado
+    gastos = pd.concat([estado["gastos"], nuevos], ignore_index=True)
+    claves = nuevos["clave"].unique()
+    afectadas = _series(gastos[gastos["clave"].isin(claves)])
+    series = estado["series"]
+    series = pd.concat([series[~series["clave"].isin(claves)], afectadas], ignore_index=True)
+    return {"gastos": gastos, "series": series}
+
+
+def obtener_recurrentes():
+    return derivado(
+        "recurrentes",
+        "movimientos",
+        lambda: construir(cargar_tabla("movimientos", COLUMNAS_MOVIMIENTOS)),
+        actualizar=añadir,
+    )["series"]
+
+
+def _sumar_meses(fechas, meses):
+    # fecha + n meses conservando el día (o el último día si el mes es más corto)
+    mes = fechas.astype("datetime64[M]")
+    dia = (fechas - mes.astype("datetime64[D]")).astype("int64")
+    destino = mes + meses.astype("timedelta64[M]")
+    dias_mes = ((destino + 1).astype("datetime64[D]") - destino.astype("datetime64[D]")).astype("int64")
+    return destino.astype("datetime64[D]") + np.minimum(dia, dias_mes - 1)
+
+
+def activas(series, hoy):
+    # Series con algún pago reciente (las canceladas dejan de aparecer en el calendario)
+    hoy = np.datetime64(pd.Timestamp(hoy).date(), "D")
+    maximos = series["periodicidad"].map({k: v[2] for k, v in PERIODOS.items()}).astype(float)
+    dias = (hoy - series["ultimo"].to_numpy(dtype="datetime64[D]")).astype("int64")
+    return series[dias <= maximos.to_numpy() * MARGEN_ACTIVA]
+
+
+def calendario(series, hoy, meses=3):
+    # Próximos vencimientos estimados de las series activas hasta dentro de `meses` meses; los
+    # que ya deberían haber llegado y no constan se marcan como atrasados
+    columnas = ["fecha", "concepto", "cuenta", "subcategoria", "categoria", "periodicidad", "importe", "estado"]
+    series = activas(series, hoy)
+    if series.empty:
+        return pd.DataFrame(columns=columnas)
+    hoy = np.datetime64(pd.Timestamp(hoy).date(), "D")
+    hasta = _sumar_meses(np.array([hoy]), np.array([meses]))[0]
+
+    # Cada serie repetida tantas veces como pagos mensuales caben en el horizonte (de sobra)
+    repeticiones = meses + 2
+    filas = np.repeat(np.arange(len(series)), repeticiones)
+    k = np.tile(np.arange(1, repeticiones + 1), len(series))
+    paso = series["periodicidad"].map({p: v[0] for p, v in PERIODOS.items()}).to_numpy(dtype="int64")[filas]
+    fechas = _sumar_meses(series["ultimo"].to_numpy(dtype="datetime64[D]")[filas], k * paso)
+
+    proximos = series.iloc[filas].reset_index(drop=True).assign(fecha=pd.to_datetime(fechas))
+    proximos = proximos[fechas <= hasta]
+    proximos["estado"] = np.where(proximos["fecha"].to_numpy() < hoy, "⏰ Atrasado", "📅 Previsto")
+    return proximos.sort_values(["fecha", "importe"], ascending=[True, False], kind="stable")[columnas].reset_index(drop=True)
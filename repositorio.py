@@ -0,0 +1,464 @@
+import os
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from supabase_client import supabase
+import cache_local
+import esquema
+import instrumentacion
+from esquema import normalizar
+
+# Tablas de Supabase que usa la app
+TABLAS = ["movimientos", "presupuestos", "saldos_iniciales", "objetivos", "objetivos_financieros", "reglas_categoria", "reglas_alerta"]
+
+# Columnas reales de movimientos en Supabase (la clave primaria es "id")
+COLUMNAS_MOVIMIENTOS = (
+    "id", "fecha", "cuenta", "categoria", "subcategoria", "importe",
+    "comentario", "tipo", "desde", "hacia", "created_at"
+)
+
+# Orden estable para paginar con range(); sin él PostgREST puede repetir o saltar filas
+ORDEN_PAGINAS = {
+    "movimientos": ["id"],
+    "presupuestos": ["categoria", "mes"],
+    "saldos_iniciales": ["cuenta"],
+    "objetivos": ["id"],
+    "objetivos_financieros": ["id"],
+    "reglas_categoria": ["id"],
+    "reglas_alerta": ["id"],
+}
+
+# PostgREST corta cada respuesta en max-rows (1000 por defecto en Supabase)
+TAMAÑO_PAGINA = 1000
+
+# Peticiones simultáneas como máximo al descargar páginas o precargar tablas
+MAX_HILOS = 8
+
+# Versiones hacia atrás para las que se guardan las filas añadidas (deltas)
+MAX_DELTAS = 50
+
+# FINANZAS_SYNC=local: leer desde la caché SQLite local y traer de Supabase solo lo nuevo
+SINCRONIZACION_LOCAL = os.getenv("FINANZAS_SYNC", "").lower() == "local"
+
+
+@st.cache_resource
+def _almacen():
+    # Un único almacén por proceso: lo comparten todos los reruns y todas las sesiones.
+    # Cada tabla tiene un número de versión; cualquier escritura lo incrementa y
+    # la siguiente lectura vuelve a descargar solo esa tabla.
+    return {
+        "versiones": defaultdict(int),
+        "datos": defaultdict(dict),
+        "deltas": defaultdict(dict),
+        "derivados": {},
+        "locks": defaultdict(threading.Lock),
+    }
+
+
+def version(tabla):
+    return _almacen()["versiones"][tabla]
+
+
+def invalidar(*tablas):
+    almacen = _almacen()
+    for tabla in tablas or TABLAS:
+        almacen["versiones"][tabla] += 1
+        almacen["datos"].pop(tabla, None)
+        almacen["deltas"].pop(tabla, None)
+
+
+def registrar_altas(tabla, filas):
+    # Para escrituras que solo añaden filas: sube la versión pero guarda las filas nuevas, así
+    # la caché y los agregados derivados se ponen al día sin volver a descargar la tabla
+    almacen = _almacen()
+    columnas = COLUMNAS_MOVIMIENTOS if tabla == "movimientos" else None
+    delta = _tipar_trozo(tabla, pd.DataFrame.from_records(filas, columns=columnas))
+    with almacen["locks"][tabla]:
+        almacen["versiones"][tabla] += 1
+        v = almacen["versiones"][tabla]
+        deltas = almacen["deltas"][tabla]
+        deltas[v] = delta
+        for antigua in [x for x in deltas if x <= v - MAX_DELTAS]:
+            del deltas[antigua]
+
+
+def registrar_cambios(tabla, antiguas, nuevas):
+    # Para ediciones y bajas: sube la versión y guarda las filas completas de antes (las editadas
+    # y las borradas) y de después (las editadas y las altas). Solo los derivados que saben restar
+    # filas (derivado(..., quitar=...)) se ponen al día con ellas; la caché de la tabla y el resto
+    # de derivados se recalculan como tras invalidar()
+    almacen = _almacen()
+    columnas = COLUMNAS_MOVIMIENTOS if tabla == "movimientos" else None
+    antiguas, nuevas = (_tipar_trozo(tabla, pd.DataFrame.from_records(f, columns=columnas)) for f in (antiguas, nuevas))
+    with almacen["locks"][tabla]:
+        almacen["versiones"][tabla] += 1
+        v = almacen["versiones"][tabla]
+        almacen["datos"].pop(tabla, None)
+        deltas = almacen["deltas"][tabla]
+        deltas[v] = (antiguas, nuevas)
+        for antigua in [x for x in deltas if x <= v - MAX_DELTAS]:
+            del deltas[antigua]
+
+
+def _deltas_pendientes(tabla, desde, hasta, cambios=False):
+    # Filas añadidas entre dos versiones, o None si hubo algo más que altas. Con cambios=True
+    # también valen las ediciones de registrar_cambios, que llegan como (antiguas, nuevas)
+    deltas = _almacen()["deltas"][tabla]
+    pendientes = [deltas.get(v) for v in range(desde + 1, hasta + 1)]
+    if any(delta is None or (isinstance(delta, tuple) and not cambios) for delta in pendientes):
+        return None
+    return pendientes
+
+
+def _tipar_trozo(tabla, df):
+    # Los movimientos pasan por el esquema compacto; el resto de tablas solo se parsean
+    if tabla == "movimientos":
+        return esquema.tipar_movimientos(df)
+    if "fecha" in df.columns:
+        df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+    if "importe" in df.columns:
+        df["importe"] = pd.to_numeric(df["importe"], errors="coerce")
+    return df
+
+
+def en_paralelo(funcion, argumentos, hilos=None):
+    # funcion(*args) para cada juego de argumentos en un pool de hilos; resultados en orden.
+    # Los hilos heredan el contexto de Streamlit y la instrumentación del rerun que los lanza.
+    argumentos = list(argumentos)
+    if len(argumentos) <= 1:
+        return [funcion(*args) for args in argumentos]
+    ctx = get_script_run_ctx()
+    rerun = instrumentacion.rerun_actual()
+
+    def tarea(args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        instrumentacion.adoptar(rerun)
+        return funcion(*args)
+
+    with ThreadPoolExecutor(max_workers=min(hilos or MAX_HILOS, len(argumentos))) as pool:
+        return list(pool.map(tarea, argumentos))
+
+
+def paginas(tabla, columnas=None, filtrar=None):
+    # Recorre la tabla con range(): cada página es una lista de dicts de, como mucho,
+    # TAMAÑO_PAGINA filas. `filtrar` recibe la consulta y le añade condiciones.
+    # La primera petición trae también el total de filas; con él las siguientes páginas se
+    # piden en paralelo, de MAX_HILOS en MAX_HILOS para no tener toda la tabla en memoria.
+    seleccion = ",".join(columnas) if columnas else "*"
+
+    def pagina(inicio, contar=False):
+        consulta = supabase.table(tabla).select(seleccion, count="exact" if contar else None)
+        if filtrar:
+            consulta = filtrar(consulta)
+        for col in ORDEN_PAGINAS.get(tabla, []):
+            consulta = consulta.order(col)
+        return consulta.range(inicio, inicio + TAMAÑO_PAGINA - 1).execute()
+
+    primera = pagina(0, contar=True)
+    filas = primera.data
+    if filas:
+        yield filas
+    inicio = TAMAÑO_PAGINA
+    if primera.count is not None:
+        inicios = list(range(inicio, primera.count, TAMAÑO_PAGINA))
+        for i in range(0, len(inicios), MAX_HILOS):
+            for filas in en_paralelo(lambda x: pagina(x).data, [(x,) for x in inicios[i:i + MAX_HILOS]]):
+                if filas:
+                    yield filas
+        if inicios:
+            inicio = inicios[-1] + TAMAÑO_PAGINA
+
+    # Sin total, o si entraron filas después de contarlas, se sigue página a página
+    while len(filas) == TAMAÑO_PAGINA:
+        filas = pagina(inicio).data
+        if filas:
+            yield filas
+        inicio += TAMAÑO_PAGINA
+
+
+def _descargar(tabla, columnas=None):
+    if SINCRONIZACION_LOCAL and tabla in cache_local.TABLAS_SINCRONIZADAS:
+        df = cache_local.sincronizar(tabla)
+        return _tipar_trozo(tabla, df.reindex(columns=list(columnas)) if columnas else df)
+
+    # Cada página se convierte en un DataFrame tipado y se descarta la lista de
+    # dicts antes de pedir la siguiente.
+    trozos = [
+        _tipar_trozo(tabla, pd.DataFrame.from_records(filas, columns=columnas))
+        for filas in paginas(tabla, columnas)
+    ]
+    if not trozos:
+        return _tipar_trozo(tabla, pd.DataFrame(columns=columnas or []))
+    return esquema.concatenar(trozos) if tabla == "movimientos" else pd.concat(trozos, ignore_index=True)
+
+
+def cargar_tabla(tabla, columnas=None):
+    # Devuelve el DataFrame compartido de la caché: no modificarlo, hacer .copy() antes.
+    # Si ya hay en caché una proyección que incluye las columnas pedidas, se reutiliza.
+    almacen = _almacen()
+    clave = tuple(columnas) if columnas else None
+    with almacen["locks"][tabla]:
+        v = almacen["versiones"][tabla]
+        proyecciones = almacen["datos"][tabla]
+        for cols, (v_cache, df) in list(proyecciones.items()):
+            pendientes = _deltas_pendientes(tabla, v_cache, v)
+            if pendientes is None:
+                continue
+            if pendientes:
+                df = esquema.concatenar([df] + [d.reindex(columns=df.columns) for d in pendientes])
+                proyecciones[cols] = (v, df)
+            if cols == clave:
+                return df
+            if clave and (cols is None or set(clave) <= set(cols)):
+                # Las columnas derivadas del esquema (céntimos, año, mes) acompañan siempre a la proyección
+                internas = [col for col in esquema.COLUMNAS_INTERNAS if col in df.columns and col not in clave]
+                return df.reindex(columns=list(clave) + internas)
+        df = _descargar(tabla, columnas)
+        if almacen["versiones"][tabla] == v:
+            proyecciones[clave] = (v, df)
+        return df
+
+
+def precargar(*peticiones):
+    # Descarga a la vez lo que va a necesitar un rerun, así el arranque en frío tarda lo que la
+    # petición más lenta y no la suma de todas. Cada petición es una tabla, (tabla, columnas) o
+    # una función sin argumentos (agregados, derivados...). Las peticiones de una misma tabla se
+    # funden en una sola descarga con la unión de columnas; lo que ya está en caché vuelve al
+    # momento. Después, cargar_tabla y las funciones devuelven lo precargado.
+    tablas, funciones = {}, []
+    for peticion in peticiones:
+        if callable(peticion):
+            funciones.append(peticion)
+            continue
+        tabla, columnas = (peticion, None) if isinstance(peticion, str) else peticion
+        if tabla not in tablas:
+            tablas[tabla] = tuple(columnas) if columnas else None
+        elif tablas[tabla] is not None:
+            tablas[tabla] = tuple(dict.fromkeys(tablas[tabla] + tuple(columnas))) if columnas else None
+    tareas = [(cargar_tabla, (tabla, columnas)) for tabla, columnas in tablas.items()]
+    tareas += [(funcion, ()) for funcion in funciones]
+    en_paralelo(lambda funcion, args: funcion(*args), tareas)
+
+
+def derivado(nombre, tabla, construir, actualizar=None, quitar=None):
+    # Estructura calculada a partir de una tabla (cubo de agregados, saldos...) y cacheada por
+    # versión. Si desde la última versión solo ha habido altas, actualizar(valor, delta) la pone
+    # al día con las filas nuevas en lugar de recalcularla entera. Con quitar(valor, filas), que
+    # descuenta filas, también las ediciones y bajas se aplican como delta: se quitan las filas
+    # de antes y se añaden las de después.
+    # `tabla` también puede ser una tupla de tablas (sin actualizar): cambia si cambia cualquiera.
+    almacen = _almacen()
+    versiones = lambda: tuple(version(t) for t in tabla) if isinstance(tabla, tuple) else version(tabla)
+    with almacen["locks"][f"derivado:{nombre}"]:
+        v = versiones()
+        cacheado = almacen["derivados"].get(nombre)
+        if cacheado is not None:
+            v_cache, valor = cacheado
+            if v_cache == v:
+                return valor
+            pendientes = _deltas_pendientes(tabla, v_cache, v, cambios=quitar is not None) if actualizar else None
+            if pendientes is not None:
+                for delta in pendientes:
+                    if isinstance(delta, tuple):
+                        antiguas, delta = delta
+                        valor = quitar(valor, antiguas)
+                    valor = actualizar(valor, delta)
+                almacen["derivados"][nombre] = (v, valor)
+                return valor
+        valor = construir()
+        if versiones() == v:
+            almacen["derivados"][nombre] = (v, valor)
+        return valor
+
+
+# ---------- Lecturas ----------
+
+def cargar_presupuestos():
+    df = cargar_tabla("presupuestos")
+    if df.empty:
+        return pd.DataFrame(columns=["categoria", "mes", "importe"])
+    df = df.copy()
+    df["mes"] = df["mes"].astype(int)
+    return df
+
+
+def obtener_saldos_iniciales():
+    return cargar_tabla("saldos_iniciales").to_dict(orient="records")
+
+
+# ---------- Editor paginado ----------
+
+def _filtrar_movimientos(consulta, filtros):
+    # filtros: tuplas (columna, operador, valor) con los operadores del builder (eq, gte, lt...).
+    # "contiene" busca el valor en la columna busqueda (sql/movimientos_busqueda.sql): concepto,
+    # categoría, subcategoría y cuentas en minúsculas y sin tildes, igual que el índice en memoria
+    # del histórico (indice_busqueda.py)
+    for columna, operador, valor in filtros:
+        if operador == "contiene":
+            # Los comodines de ilike se quitan: se busca el texto tal cual
+            texto = "".join(c for c in normalizar(valor) if c not in "*%").strip()
+            if texto:
+                consulta = consulta.ilike("busqueda", f"*{texto}*")
+        else:
+            consulta = getattr(consulta, operador)(columna, valor)
+    return consulta
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _pagina(v, filtros, orden, descendente, inicio, tamaño):
+    # La versión `v` forma parte de la clave: cualquier escritura deja obsoletas todas las páginas
+    consulta = supabase.table("movimientos").select(",".join(COLUMNAS_MOVIMIENTOS), count="exact")
+    consulta = _filtrar_movimientos(consulta, filtros)
+    resp = consulta.order(orden, desc=descendente).order("id").range(inicio, inicio + tamaño - 1).execute()
+    df = esquema.tipar_movimientos(pd.DataFrame.from_records(resp.data, columns=COLUMNAS_MOVIMIENTOS))
+    return df, resp.count or 0
+
+
+def pagina_movimientos(filtros=(), orden="fecha", descendente=True, pagina=0, tamaño=50):
+    # Una ventana de movimientos con el filtro, el orden y la paginación resueltos en la base de
+    # datos, y el número de filas que cumplen el filtro. No pasa por la caché de tablas.
+    return _pagina(version("movimientos"), tuple(filtros), orden, descendente, pagina * tamaño, tamaño)
+
+
+def cargar_reglas():
+    df = cargar_tabla("reglas_categoria")
+    columnas = ["id", "tipo", "patron", "es_regex", "subcategoria", "categoria", "prioridad"]
+    df = df.reindex(columns=columnas).copy()
+    df["es_regex"] = df["es_regex"].fillna(False).astype(bool)
+    df["prioridad"] = pd.to_numeric(df["prioridad"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def cargar_reglas_alerta():
+    df = cargar_tabla("reglas_alerta").reindex(columns=["id", "regla", "objetivo", "umbral"]).copy()
+    df["objetivo"] = df["objetivo"].astype(object).where(df["objetivo"].notna() & (df["objetivo"] != ""), None)
+    df["umbral"] = pd.to_numeric(df["umbral"], errors="coerce").astype(float)
+    return df
+
+
+# ---------- Escrituras ----------
+
+def insertar_movimiento(data):
+    # created_at es la marca de agua de la sincronización incremental
+    # El id se genera aquí para poder añadir la fila a la caché sin volver a leer la tabla
+    ahora = pd.Timestamp.now(tz="UTC").isoformat()
+    data = [{"id": str(uuid.uuid4()), "created_at": ahora, **fila} for fila in data]
+    resp = supabase.table("movimientos").insert(data).execute()
+    registrar_altas("movimientos", data)
+    return resp
+
+
+def guardar_presupuestos(filas):
+    # Upsert por (categoria, mes) en una sola petición: solo se tocan las celdas enviadas,
+    # así dos personas editando meses distintos no se pisan
+    if not filas:
+        return
+    supabase.table("presupuestos").upsert(filas, on_conflict="categoria,mes", returning="minimal").execute()
+    invalidar("presupuestos")
+
+
+def guardar_reglas(filas, bajas):
+    # Reglas de categorización: upsert de las editadas y borrado de las quitadas
+    if filas:
+        supabase.table("reglas_categoria").upsert(filas, on_conflict="id", returning="minimal").execute()
+    if bajas:
+        supabase.table("reglas_categoria").delete().in_("id", list(bajas)).execute()
+    invalidar("reglas_categoria")
+
+
+def guardar_reglas_alerta(filas, bajas):
+    if filas:
+        supabase.table("reglas_alerta").upsert(filas, on_conflict="id", returning="minimal").execute()
+    if bajas:
+        supabase.table("reglas_alerta").delete().in_("id", list(bajas)).execute()
+    invalidar("reglas_alerta")
+
+
+# Filas por petición en las escrituras en bloque
+TAMAÑO_LOTE = 500
+
+
+def _lotes(filas, tamaño=TAMAÑO_LOTE):
+    for i in range(0, len(filas), tamaño):
+        yield filas[i:i + tamaño]
+
+
+def insertar_importados(filas):
+    # Lote de una importación: los ids son deterministas (fichero + línea), así que repetir un
+    # lote tras un fallo no duplica nada; las filas que ya existen se ignoran. La caché se
+    # invalida una vez al terminar la importación, no por lote.
+    if not filas:
+        return
+    supabase.table("movimientos").upsert(filas, on_conflict="id", ignore_duplicates=True, returning="minimal").execute()
+    if SINCRONIZACION_LOCAL:
+        cache_local.guardar_movimientos(filas)
+
+
+def _por_columnas(filas):
+    # Filas agrupadas por su juego de columnas, para escribirlas por lotes en los que cada fila
+    # solo escribe lo que trae
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(tuple(sorted(fila)), []).append(fila)
+    return list(grupos.values())
+
+
+def _por_cambio(cambios):
+    # ids agrupados por cambio idéntico (mismas columnas y valores): editar la subcategoría de
+    # muchas filas a la vez es un solo UPDATE ... WHERE id IN (...)
+    grupos = {}
+    for cambio in cambios:
+        valores = {col: v for col, v in cambio.items() if col != "id"}
+        if valores:
+            grupos.setdefault(tuple(sorted(valores.items())), (valores, []))[1].append(cambio["id"])
+    return list(grupos.values())
+
+
+def guardar_cambios_movimientos(altas, cambios, bajas):
+    # Cambios fila a fila de los editores: cada edición solo lleva el id y las columnas editadas y
+    # va como UPDATE por id, agrupando las ediciones idénticas. Un upsert parcial no sirve: en
+    # PostgreSQL la fila propuesta para el INSERT ya choca con los NOT NULL antes del ON CONFLICT,
+    # y si otro dispositivo había borrado el id la volvería a crear a medias.
+    # Las altas van como insert y las bajas por lotes de ids.
+    # Devuelve las filas editadas ya completas, para comprobar sus alertas igual que las altas.
+    tabla = lambda: supabase.table("movimientos")
+    # Filas de antes de editar o borrar: la caché y los agregados se ponen al día con la diferencia
+    ids = list(dict.fromkeys([cambio["id"] for cambio in cambios] + list(bajas)))
+    antiguas = {
+        fila["id"]: fila
+        for filas in en_paralelo(
+            lambda lote: tabla().select(",".join(COLUMNAS_MOVIMIENTOS)).in_("id", lote).execute().data,
+            [(lote,) for lote in _lotes(ids)],
+        )
+        for fila in filas
+    }
+    editadas, borradas = {}, set(bajas)
+    for cambio in cambios:
+        # Un id que ya no existe (lo borró otro dispositivo) no se recrea
+        if cambio["id"] in antiguas and cambio["id"] not in borradas:
+            editadas[cambio["id"]] = {**editadas.get(cambio["id"], antiguas[cambio["id"]]), **cambio}
+
+    actualizaciones = [(valores, lote) for valores, ids in _por_cambio(cambios) for lote in _lotes(ids)]
+    en_paralelo(lambda valores, ids: tabla().update(valores).in_("id", ids).execute(), actualizaciones)
+    for lote in _lotes(altas):
+        tabla().insert(lote, returning="minimal").execute()
+    for lote in _lotes(bajas):
+        tabla().delete().in_("id", lote).execute()
+
+    if SINCRONIZACION_LOCAL:
+        cache_local.guardar_movimientos(altas)
+        cache_local.actualizar_movimientos(cambios)
+        cache_local.borrar_movimientos(bajas)
+    if antiguas:
+        registrar_cambios("movimientos", list(antiguas.values()), list(altas) + list(editadas.values()))
+    elif cambios or bajas:
+        invalidar("movimientos")
+    elif altas:
+        registrar_altas("movimientos", altas)
+    return list(editadas.values())
@@ -0,0 +1,71 @@
+-- Agregados del dashboard calculados en la base de datos (Supabase / PostgreSQL).
+-- Se llaman por RPC desde agregados.py: el cliente recibe solo las filas resumidas.
+-- Ejecutar una vez en el editor SQL de Supabase. almacenamiento.py tiene los equivalentes en SQLite.
+
+-- Totales por año, mes, tipo, categoría y cuenta (p_anio null = todos los años)
+create or replace function totales_mensuales(p_anio int default null)
+returns table ("año" int, mes int, tipo text, categoria text, cuenta text, total numeric, n bigint)
+language sql stable as $$
+    select
+        extract(year from fecha::date)::int,
+        extract(month from fecha::date)::int,
+        tipo, categoria, cuenta,
+        sum(importe)::numeric, count(*)
+    from movimientos
+    where fecha is not null
+      and (p_anio is null or extract(year from fecha::date) = p_anio)
+    group by 1, 2, 3, 4, 5
+$$;
+
+-- Saldo inicial y movimientos acumulados por cuenta (p_fecha null = hasta hoy)
+create or replace function saldos_por_cuenta(p_fecha date default null)
+returns table (
+    cuenta text, saldo numeric, ingresos numeric, gastos numeric,
+    transferencias_recibidas numeric, transferencias_enviadas numeric
+)
+language sql stable as $$
+    with apuntes as (
+        select cuenta,
+               case when tipo = 'ingreso' then importe else 0 end as ingresos,
+               case when tipo = 'gasto' then importe else 0 end as gastos,
+               0 as transferencias_recibidas, 0 as transferencias_enviadas
+        from movimientos
+        where tipo in ('ingreso', 'gasto') and cuenta is not null
+          and (p_fecha is null or fecha::date <= p_fecha)
+        union all
+        select hacia, 0, 0, importe, 0 from movimientos
+        where tipo = 'transferencia' and hacia is not null and (p_fecha is null or fecha::date <= p_fecha)
+        union all
+        select desde, 0, 0, 0, importe from movimientos
+        where tipo = 'transferencia' and desde is not null and (p_fecha is null or fecha::date <= p_fecha)
+    ),
+    totales as (
+        select cuenta, sum(ingresos) as ingresos, sum(gastos) as gastos,
+               sum(transferencias_recibidas) as transferencias_recibidas,
+               sum(transferencias_enviadas) as transferencias_enviadas
+        from apuntes group by cuenta
+    )
+    select coalesce(s.cuenta, t.cuenta), coalesce(s.saldo_inicial, 0)::numeric,
+           coalesce(t.ingresos, 0)::numeric, coalesce(t.gastos, 0)::numeric,
+           coalesce(t.transferencias_recibidas, 0)::numeric, coalesce(t.transferencias_enviadas, 0)::numeric
+    from saldos_iniciales s full outer join totales t on t.cuenta = s.cuenta
+$$;
+
+-- Presupuesto del mes frente al gasto real, por categoría
+create or replace function presupuesto_vs_real(p_anio int, p_mes int)
+returns table (categoria text, presupuesto numeric, "real" numeric)
+language sql stable as $$
+    with reales as (
+        select categoria, sum(importe) as importe
+        from movimientos
+        where tipo = 'gasto'
+          and extract(year from fecha::date) = p_anio
+          and extract(month from fecha::date) = p_mes
+        group by categoria
+    ),
+    previstos as (
+        select categoria, sum(importe) as importe from presupuestos where mes = p_mes group by categoria
+    )
+    select coalesce(p.categoria, r.categoria), coalesce(p.importe, 0)::numeric, coalesce(r.importe, 0)::numeric
+    from previstos p full outer join reales r on r.categoria = p.categoria
+$$;
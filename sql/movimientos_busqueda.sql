@@ -0,0 +1,30 @@
+-- Texto de búsqueda de los movimientos para el editor paginado (repositorio._filtrar_movimientos).
+-- Ejecutar una vez en el editor SQL de Supabase; almacenamiento.py crea lo mismo en SQLite.
+-- Es la misma normalización que la búsqueda en memoria del histórico (indice_busqueda.normalizar):
+-- concepto, categoría, subcategoría y cuentas en minúsculas y sin tildes, así "cafe" encuentra
+-- "Café" tanto en el editor paginado como en el histórico.
+create extension if not exists unaccent;
+create extension if not exists pg_trgm;
+
+alter table movimientos add column if not exists busqueda text;
+
+create or replace function marcar_busqueda()
+returns trigger
+language plpgsql as $$
+begin
+    new.busqueda := lower(unaccent(concat_ws(' ', new.comentario, new.categoria, new.subcategoria,
+                                             new.cuenta, new.desde, new.hacia)));
+    return new;
+end
+$$;
+
+drop trigger if exists movimientos_busqueda on movimientos;
+create trigger movimientos_busqueda
+    before insert or update of comentario, categoria, subcategoria, cuenta, desde, hacia on movimientos
+    for each row execute function marcar_busqueda();
+
+-- Rellena las filas que ya existían (el trigger salta con el update de comentario)
+update movimientos set comentario = comentario where busqueda is null;
+
+-- ilike '%texto%' sobre la columna usa este índice de trigramas
+create index if not exists movimientos_busqueda on movimientos using gin (busqueda gin_trgm_ops);
@@ -0,0 +1,21 @@
+-- Marca de última modificación de los movimientos (cache_local.py, FINANZAS_SYNC=local).
+-- Ejecutar una vez en el editor SQL de Supabase; almacenamiento.py crea lo mismo en SQLite.
+-- La sincronización incremental trae las filas con updated_at posterior a la última que tiene en
+-- local: así llegan también las ediciones hechas desde otros dispositivos, no solo las altas.
+alter table movimientos add column if not exists updated_at timestamptz not null default now();
+
+create or replace function marcar_updated_at()
+returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end
+$$;
+
+drop trigger if exists movimientos_updated_at on movimientos;
+create trigger movimientos_updated_at
+    before update on movimientos
+    for each row execute function marcar_updated_at();
+
+create index if not exists movimientos_updated_at on movimientos (updated_at);
@@ -0,0 +1,11 @@
+-- Reglas de las alertas inteligentes (alertas.py). Ejecutar una vez en el editor SQL de
+-- Supabase; almacenamiento.py crea la misma tabla en SQLite.
+--   regla:    presupuesto (umbral en % del presupuesto del mes), saldo_minimo (umbral en €) o
+--             gasto_atipico (umbral en veces la mediana de la subcategoría)
+--   objetivo: categoría, cuenta o subcategoría a la que se limita; null = todas
+create table if not exists reglas_alerta (
+    id text primary key,
+    regla text not null check (regla in ('presupuesto', 'saldo_minimo', 'gasto_atipico')),
+    objetivo text,
+    umbral numeric not null
+);
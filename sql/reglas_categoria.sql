@@ -0,0 +1,14 @@
+-- Reglas de categorización automática (categorizacion.py). Ejecutar una vez en el editor SQL de
+-- Supabase; almacenamiento.py crea la misma tabla en SQLite.
+--   patron: palabras clave (se buscan como palabras completas en el concepto normalizado) o,
+--           con es_regex, una expresión regular sobre ese mismo texto
+--   prioridad: entre reglas que coinciden gana la de mayor prioridad
+create table if not exists reglas_categoria (
+    id text primary key,
+    tipo text not null check (tipo in ('gasto', 'ingreso')),
+    patron text not null,
+    es_regex boolean not null default false,
+    subcategoria text not null,
+    categoria text not null,
+    prioridad int not null default 0
+);
@@ -1,22 +1,28 @@
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import os
-
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# FINANZAS_BACKEND=sqlite: base de datos local en FINANZAS_DB, sin red ni cuenta de Supabase.
+# Por defecto se usa Supabase con SUPABASE_URL y SUPABASE_KEY.
+FINANZAS_BACKEND = os.getenv("FINANZAS_BACKEND", "supabase").lower()
+
+if FINANZAS_BACKEND == "sqlite":
+    from almacenamiento import ClienteSQLite
+
+    supabase = ClienteSQLite(os.getenv("FINANZAS_DB", "finanzas.sqlite"))
+else:
+    from supabase import create_client, Client
+
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise Exception("❌ Variables de entorno no cargadas correctamente")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise Exception("❌ Variables de entorno no cargadas correctamente")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def insertar_movimiento(data):
-    return supabase.table("movimientos").insert(data).execute()
+# Con FINANZAS_INSTRUMENTACION=1 cada consulta se cronometra para el panel de rendimiento
+from instrumentacion import envolver_cliente
 
-def obtener_saldos_iniciales():
-    return supabase.table("saldos_iniciales").select("*").execute().data
+supabase = envolver_cliente(supabase)
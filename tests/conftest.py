@@ -0,0 +1,26 @@
+import os
+import sys
+import types
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from almacenamiento import ClienteSQLite  # noqa: E402
+
+# Los módulos de la app importan supabase_client: se sustituye por el backend SQLite en memoria
+# antes de importar cualquiera de ellos (igual que benchmarks/ejecutar.py)
+_cliente = ClienteSQLite(":memory:")
+_modulo = types.ModuleType("supabase_client")
+_modulo.supabase = _cliente
+sys.modules.setdefault("supabase_client", _modulo)
+
+
+@pytest.fixture
+def cliente():
+    con = _cliente.con
+    with _cliente.lock, con:
+        for (tabla,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall():
+            con.execute(f'DELETE FROM "{tabla}"')
+    return _cliente
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+import anomalias
+from cubo import construir_cubo
+from esquema import tipar_movimientos
+from repositorio import COLUMNAS_MOVIMIENTOS
+
+
+def _movimientos(*filas):
+    # (fecha, importe, subcategoría) de gastos
+    return tipar_movimientos(pd.DataFrame(
+        [{"id": f"m{i}", "fecha": f, "cuenta": "Banco", "importe": imp, "comentario": s, "subcategoria": s,
+          "categoria": "Varios", "tipo": "gasto"} for i, (f, imp, s) in enumerate(filas)]
+    ).reindex(columns=COLUMNAS_MOVIMIENTOS))
+
+
+def _dias(n, importes, subcategoria, desde="2025-01-01"):
+    fechas = pd.date_range(desde, periods=n, freq="D").strftime("%Y-%m-%d")
+    return [(f, i, subcategoria) for f, i in zip(fechas, importes)]
+
+
+def _puntuacion(puntuados, fecha, subcategoria):
+    fila = puntuados[(puntuados["fecha"] == pd.Timestamp(fecha)) & (puntuados["subcategoria"] == subcategoria)]
+    return fila["puntuacion"].item()
+
+
+def test_sin_historial_suficiente_no_se_puntua():
+    # Con menos de MIN_MOVIMIENTOS gastos anteriores ni un importe enorme es atípico
+    n = anomalias.MIN_MOVIMIENTOS
+    filas = _dias(n - 1, [10] * (n - 1), "Café") + [("2025-02-01", 500, "Café")]
+    puntuados = anomalias.construir(_movimientos(*filas))
+    assert puntuados["puntuacion"].isna().all()
+    assert anomalias.movimientos_atipicos(puntuados).empty
+
+    filas = _dias(n, [10] * n, "Café") + [("2025-02-01", 500, "Café")]
+    puntuados = anomalias.construir(_movimientos(*filas))
+    assert puntuados["puntuacion"].notna().sum() == 1
+    assert anomalias.movimientos_atipicos(puntuados)["importe"].tolist() == [500]
+
+
+def test_gastos_fijos_con_iqr_cero_usan_la_escala_minima():
+    # 40 € siempre: IQR 0, la escala es el 5 % de la mediana (2 €)
+    filas = _dias(20, [40] * 20, "Gimnasio") + [("2025-02-01", 41, "Gimnasio"), ("2025-02-02", 60, "Gimnasio")]
+    puntuados = anomalias.construir(_movimientos(*filas))
+    assert np.isfinite(puntuados["puntuacion"].dropna()).all()
+    assert _puntuacion(puntuados, "2025-02-01", "Gimnasio") == 0.5
+    assert _puntuacion(puntuados, "2025-02-02", "Gimnasio") == 10
+    # 1 € siempre: la escala no baja de ESCALA_MINIMA (1 €)
+    filas = _dias(20, [1] * 20, "Parking") + [("2025-02-01", 2, "Parking")]
+    assert _puntuacion(anomalias.construir(_movimientos(*filas)), "2025-02-01", "Parking") == 1
+
+
+def test_cada_subcategoria_se_compara_con_la_suya():
+    # 80 € es lo normal en el súper y muchísimo en café
+    filas = (
+        _dias(20, [3, 3.5, 2.8, 3.2] * 5, "Café") + _dias(20, [75, 90, 80, 70] * 5, "Súper")
+        + [("2025-02-01", 80, "Café"), ("2025-02-01", 80, "Súper")]
+    )
+    puntuados = anomalias.construir(_movimientos(*filas))
+    atipicos = anomalias.movimientos_atipicos(puntuados, desde="2025-02-01")
+    assert atipicos["subcategoria"].tolist() == ["Café"]
+    # Un umbral más alto deja fuera lo que no llega a él
+    puntuacion = _puntuacion(puntuados, "2025-02-01", "Café")
+    assert anomalias.movimientos_atipicos(puntuados, umbral=puntuacion + 1, desde="2025-02-01").empty
+
+
+def test_altas_igual_que_calcular_de_cero():
+    filas = _dias(30, [10, 12, 9, 11, 10, 13] * 5, "Café") + _dias(15, [50] * 15, "Luz")
+    nuevas = [("2025-01-15", 40, "Café"), ("2025-03-01", 100, "Luz"), ("2025-03-01", 5, "Bus")]
+    # Los ids de las altas no chocan con los del histórico
+    nuevas = _movimientos(*nuevas).assign(id=["n0", "n1", "n2"])
+    estado = anomalias.añadir(anomalias.construir(_movimientos(*filas)), nuevas)
+    completo = anomalias.construir(pd.concat([_movimientos(*filas), nuevas], ignore_index=True))
+    pd.testing.assert_frame_equal(estado, completo, check_dtype=False)
+
+
+def test_meses_sin_gasto_cuentan_como_cero():
+    # Seis meses de 100 € en ropa, dos sin nada y un mes de 1.000 €
+    meses = [f"2024-{m:02d}-10" for m in range(1, 7)]
+    filas = [(f, 100, "Ropa") for f in meses] + [("2024-09-10", 1000, "Ropa")]
+    puntuados = anomalias.puntuar_meses(construir_cubo(_movimientos(*filas)))
+    ropa = puntuados.set_index("periodo")["importe"]
+    assert ropa[pd.Period("2024-07", "M")] == 0 and ropa[pd.Period("2024-08", "M")] == 0
+    assert puntuados["puntuacion"].notna().sum() == 3
+    assert anomalias.meses_atipicos(puntuados)["periodo"].astype(str).tolist() == ["2024-09"]
@@ -0,0 +1,38 @@
+import cache_local
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch, cliente):
+    monkeypatch.setattr(cache_local, "RUTA_CACHE", str(tmp_path / "finanzas.sqlite"))
+    cache_local._conexion.clear()
+    yield cliente
+    cache_local._conexion.clear()
+
+
+def _locales():
+    df = cache_local.sincronizar("movimientos")
+    return dict(zip(df["id"], df["comentario"]))
+
+
+def test_trae_ediciones_y_borrados_de_otro_dispositivo(cache):
+    movimientos = cache.table("movimientos")
+    movimientos.insert([{"id": i, "importe": 10.0, "comentario": i} for i in "abc"]).execute()
+    assert _locales() == {"a": "a", "b": "b", "c": "c"}
+
+    # Otro dispositivo edita "a", borra "b" y da de alta "d": el total de filas no cambia
+    cache.table("movimientos").update({"comentario": "editado"}).eq("id", "a").execute()
+    cache.table("movimientos").delete().eq("id", "b").execute()
+    cache.table("movimientos").insert({"id": "d", "importe": 5.0, "comentario": "d"}).execute()
+    assert _locales() == {"a": "editado", "c": "c", "d": "d"}
+
+
+def test_resincronizar_descarga_todo(cache):
+    cache.table("movimientos").insert([{"id": "a", "importe": 10.0, "comentario": "a"}]).execute()
+    _locales()
+    # Edición que la marca de agua no ve (updated_at antiguo)
+    with cache.con:
+        cache.con.execute("UPDATE movimientos SET comentario = 'x', updated_at = '2000-01-01T00:00:00+00:00'")
+    assert _locales() == {"a": "a"}
+    cache_local.resincronizar()
+    assert _locales() == {"a": "x"}
@@ -0,0 +1,58 @@
+import pandas as pd
+
+import categorizacion
+
+
+def _reglas(*filas):
+    # (patron, destino "Sub:Cat", prioridad[, es_regex]) de gasto
+    return pd.DataFrame(
+        [
+            {"id": str(i), "tipo": "gasto", "patron": p, "es_regex": bool(r[0]) if r else False,
+             "subcategoria": d.split(":")[0], "categoria": d.split(":")[1], "prioridad": pr}
+            for i, (p, d, pr, *r) in enumerate(filas)
+        ],
+        columns=["id", "tipo", "patron", "es_regex", "subcategoria", "categoria", "prioridad"],
+    )
+
+
+def _historial(*filas):
+    return pd.DataFrame(
+        [{"tipo": "gasto", "comentario": c, "subcategoria": s, "categoria": "Casa"} for c, s in filas],
+        columns=["tipo", "comentario", "subcategoria", "categoria"],
+    )
+
+
+def _sugerir(conceptos, reglas, historial=None):
+    modelo = categorizacion.construir_modelo(_historial() if historial is None else historial, reglas)
+    df = pd.DataFrame({"tipo": "gasto", "comentario": conceptos})
+    sugeridas = categorizacion.sugerencias(df, modelo)["subcategoria"]
+    return [s if isinstance(s, str) else None for s in sugeridas]
+
+
+def test_claves_solapadas_se_encuentran_todas():
+    # "a b d" obliga a seguir el enlace de fallo de "a b" hasta "b d"; "seguro" está dentro de
+    # "seguro hogar" y de "cargo seguro"
+    reglas = _reglas(("a b c", "Abc:X", 0), ("b d", "Bd:X", 0), ("cargo seguro", "Cargo:X", 0), ("seguro hogar", "Hogar:X", 1))
+    assert _sugerir(["x a b d", "a b c", "cargo seguro hogar", "cargo seguro"], reglas) == ["Bd", "Abc", "Hogar", "Cargo"]
+
+
+def test_solo_palabras_completas():
+    reglas = _reglas(("bar", "Bar:Ocio", 0), ("luz", "Luz:Casa", 0))
+    assert _sugerir(["Bar Pepe", "BARCELONA", "Luzmila", "Recibo luz."], reglas) == ["Bar", None, None, "Luz"]
+
+
+def test_prioridad_y_luego_la_clave_mas_larga():
+    reglas = _reglas(("mercadona", "Super:Comida", 0), ("mercadona gasolinera", "Gasolina:Coche", 0), ("amazon", "Compras:Varios", 5))
+    conceptos = ["Mercadona", "MERCADONA GASOLINERA", "amazon mercadona gasolinera"]
+    assert _sugerir(conceptos, reglas) == ["Super", "Gasolina", "Compras"]
+
+
+def test_las_reglas_del_usuario_ganan_a_las_aprendidas():
+    historial = _historial(*[("Recibo Iberdrola", "Gas")] * 3)
+    assert _sugerir(["RECIBO IBERDROLA"], _reglas(), historial) == ["Gas"]
+    assert _sugerir(["RECIBO IBERDROLA"], _reglas(("iberdrola", "Luz:Casa", -1)), historial) == ["Luz"]
+
+
+def test_tildes_y_mayusculas_no_cuentan():
+    reglas = _reglas(("Cafetería", "Café:Ocio", 0), ("peaje", "Peaje:Coche", 0), (r"^farmacia\b", "Farmacia:Salud", 0, True))
+    assert _sugerir(["CAFETERIA CENTRAL", "Peáje AP-7", "Farmácia Sol"], reglas) == ["Café", "Peaje", "Farmacia"]
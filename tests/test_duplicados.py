@@ -0,0 +1,30 @@
+import pandas as pd
+
+import duplicados
+
+
+def _movimientos(*filas):
+    return pd.DataFrame(
+        [{"fecha": f, "cuenta": "Banco", "importe": i, "comentario": c, "tipo": "gasto"} for f, i, c in filas]
+    )
+
+
+CAFE = ("2026-03-02", 1.8, "Cafetería")
+
+
+def test_lineas_repetidas_en_el_fichero_son_posibles_no_exactas():
+    marca = duplicados.comprobar(_movimientos(CAFE, CAFE), duplicados.vacio())
+    assert marca.tolist() == ["", "posible"]
+
+
+def test_exacto_solo_cuando_el_historico_ya_las_tiene_todas():
+    indice = duplicados.construir(_movimientos(CAFE))
+    assert duplicados.comprobar(_movimientos(CAFE, CAFE), indice).tolist() == ["exacto", "posible"]
+    indice = duplicados.construir(_movimientos(CAFE, CAFE))
+    assert duplicados.comprobar(_movimientos(CAFE, CAFE), indice).tolist() == ["exacto", "exacto"]
+
+
+def test_repetidas_entre_trozos_de_la_misma_importacion():
+    previas = duplicados.añadir(duplicados.vacio(), _movimientos(CAFE))
+    marca = duplicados.comprobar(_movimientos(CAFE), duplicados.vacio(), previas=previas)
+    assert marca.tolist() == ["posible"]
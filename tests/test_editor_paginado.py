@@ -0,0 +1,49 @@
+import pandas as pd
+
+import repositorio
+from utils_tabla import _aplicar_pendientes, _combinar, calcular_cambios
+
+ALTA = {"id": "nueva", "fecha": "2025-02-01", "importe": 9.0, "comentario": "Pan", "tipo": "gasto"}
+
+
+def _pagina():
+    return pd.DataFrame({
+        "fecha": pd.to_datetime(["2025-01-10"]), "importe": [40.0], "comentario": ["Recibo luz"], "movimiento_id": ["a"],
+    })
+
+
+def test_las_altas_pendientes_se_ven_al_volver_a_la_pagina():
+    df = _aplicar_pendientes(_pagina(), ([ALTA], [], []))
+    assert df["movimiento_id"].tolist() == ["a", "nueva"]
+    assert df["comentario"].tolist() == ["Recibo luz", "Pan"]
+    assert df["fecha"].iloc[1] == pd.Timestamp("2025-02-01")
+
+
+def test_editar_o_quitar_un_alta_pendiente_cambia_el_alta():
+    editada = _combinar(([ALTA], [], []), ([], [{"id": "nueva", "importe": 12.0}, {"id": "a", "importe": 41.0}], []))
+    assert editada == ([{**ALTA, "importe": 12.0}], [{"id": "a", "importe": 41.0}], [])
+    quitada = _combinar(editada, ([], [], ["nueva"]))
+    assert quitada == ([], [{"id": "a", "importe": 41.0}], [])
+
+
+def test_las_filas_nuevas_mantienen_su_id_entre_reruns():
+    df = _pagina()
+    editado = pd.concat([df, pd.DataFrame({"importe": [5.0], "comentario": ["Café"]})], ignore_index=True)
+    estado = {"added_rows": [{"importe": 5.0, "comentario": "Café"}]}
+    columnas = ["fecha", "importe", "comentario"]
+    ids = [calcular_cambios(df, editado, estado, "gastos", columnas, "sesion:1")[0][0]["id"] for _ in range(2)]
+    assert ids[0] == ids[1]
+    assert calcular_cambios(df, editado, estado, "gastos", columnas, "sesion:2")[0][0]["id"] != ids[0]
+
+
+def test_la_busqueda_paginada_no_distingue_tildes(cliente):
+    cliente.table("movimientos").insert([
+        {"id": "a", "fecha": "2025-01-10", "comentario": "Café con leche", "tipo": "gasto", "importe": 2.0},
+        {"id": "b", "fecha": "2025-01-11", "comentario": "Cafetería", "categoria": "Ocio", "tipo": "gasto", "importe": 3.0},
+        {"id": "c", "fecha": "2025-01-12", "comentario": "Pan", "tipo": "gasto", "importe": 1.0},
+    ]).execute()
+    repositorio.invalidar("movimientos")
+    for texto, esperado in [("cafe", {"a", "b"}), ("CAFÉ", {"a", "b"}), ("cafeteria ocio", {"b"})]:
+        filtros = [(None, "contiene", palabra) for palabra in texto.split()]
+        df, total = repositorio.pagina_movimientos(filtros)
+        assert set(df["id"]) == esperado and total == len(esperado)
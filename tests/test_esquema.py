@@ -0,0 +1,11 @@
+import pandas as pd
+
+import esquema
+
+
+def test_importe_que_falta_no_es_cero():
+    df = esquema.tipar_movimientos(pd.DataFrame({"importe": [12.5, None, "abc"]}))
+    assert df["importe_cent"].dtype == "Int64"
+    assert df["importe_cent"].tolist()[0] == 1250 and df["importe_cent"].isna().tolist() == [False, True, True]
+    assert df["importe"].isna().tolist() == [False, True, True]
+    assert esquema.con_importe(df)["importe_cent"].tolist() == [1250]
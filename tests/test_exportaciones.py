@@ -0,0 +1,17 @@
+import pandas as pd
+from pypdf import PdfReader
+
+import exportaciones
+
+
+def test_pdf_por_trozos_une_todas_las_filas(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportaciones, "FILAS_POR_TROZO_PDF", 10)
+    avance = []
+    ruta = tmp_path / "movimientos.pdf"
+    exportaciones.generar_pdf(pd.DataFrame({"concepto": [f"fila {i}" for i in range(25)]}), str(ruta), "Movimientos", avance.append)
+
+    texto = "".join(pagina.extract_text() for pagina in PdfReader(ruta).pages)
+    assert all(f"fila {i}" in texto for i in range(25))
+    assert avance[-1] == 1.0
+    # Los PDF de cada trozo se borran al unirlos
+    assert [p.name for p in tmp_path.iterdir()] == ["movimientos.pdf"]
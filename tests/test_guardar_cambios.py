@@ -0,0 +1,96 @@
+import repositorio
+
+FILAS = [
+    {"id": "a", "fecha": "2025-01-10", "cuenta": "Vivir", "categoria": "Casa", "subcategoria": "Luz",
+     "importe": 40.0, "comentario": "Recibo luz", "tipo": "gasto"},
+    {"id": "b", "fecha": "2025-01-12", "cuenta": "Lujo", "categoria": "Ocio", "subcategoria": "Cine",
+     "importe": 12.5, "comentario": "Cine", "tipo": "gasto"},
+]
+
+
+def _filas(cliente):
+    # updated_at y busqueda las pone la base de datos: se comparan el resto de columnas
+    filas = cliente.table("movimientos").select("*").execute().data
+    return {fila["id"]: {k: v for k, v in fila.items() if k not in ("updated_at", "busqueda")} for fila in filas}
+
+
+def test_ediciones_con_columnas_distintas_no_borran_el_resto(cliente):
+    cliente.table("movimientos").insert(FILAS).execute()
+    antes = _filas(cliente)
+
+    repositorio.guardar_cambios_movimientos([], [{"id": "a", "importe": 45.0}, {"id": "b", "comentario": "Cine y palomitas"}], [])
+
+    despues = _filas(cliente)
+    assert despues["a"] == {**antes["a"], "importe": 45.0}
+    assert despues["b"] == {**antes["b"], "comentario": "Cine y palomitas"}
+
+
+def test_cambios_de_varias_paginas_solo_tocan_lo_editado(cliente):
+    import pandas as pd
+    from utils_tabla import _aplicar_pendientes, _combinar
+
+    cliente.table("movimientos").insert(FILAS).execute()
+    antes = _filas(cliente)
+
+    # Página 1: importe de "a"; página 2: comentario de "b" y, en otra visita, subcategoría de "a"
+    pagina_1 = ([], [{"id": "a", "importe": 45.0}], [])
+    pagina_2 = _combinar(([], [{"id": "b", "comentario": "Cine y palomitas"}], []), ([], [{"id": "a", "subcategoria": "Gas"}], []))
+    altas, cambios, bajas = _combinar(_combinar(([], [], []), pagina_1), pagina_2)
+    assert sorted(cambios, key=lambda c: c["id"]) == [
+        {"id": "a", "importe": 45.0, "subcategoria": "Gas"}, {"id": "b", "comentario": "Cine y palomitas"}
+    ]
+
+    # Al volver a la página solo se repintan las columnas editadas
+    pagina = pd.DataFrame({"movimiento_id": ["a", "b"], "importe": [40.0, 12.5], "comentario": ["Recibo luz", "Cine"]})
+    repintada = _aplicar_pendientes(pagina, pagina_1)
+    assert repintada["importe"].tolist() == [45.0, 12.5]
+    assert repintada["comentario"].tolist() == ["Recibo luz", "Cine"]
+
+    repositorio.guardar_cambios_movimientos(altas, cambios, bajas)
+    despues = _filas(cliente)
+    assert despues["a"] == {**antes["a"], "importe": 45.0, "subcategoria": "Gas"}
+    assert despues["b"] == {**antes["b"], "comentario": "Cine y palomitas"}
+
+
+def test_editar_un_movimiento_borrado_no_lo_recrea(cliente):
+    cliente.table("movimientos").insert(FILAS).execute()
+    # Otro dispositivo borra "a" antes de que se guarde la edición
+    cliente.table("movimientos").delete().eq("id", "a").execute()
+
+    repositorio.guardar_cambios_movimientos([], [{"id": "a", "importe": 45.0}, {"id": "b", "importe": 45.0}], [])
+
+    despues = _filas(cliente)
+    assert set(despues) == {"b"}
+    assert despues["b"]["importe"] == 45.0 and despues["b"]["comentario"] == "Cine"
+
+
+def test_editar_y_borrar_actualiza_las_alertas_sin_recalcularlas(cliente, monkeypatch):
+    import numpy as np
+    import alertas
+
+    luz = [{**FILAS[0], "id": f"luz{i}", "fecha": f"2025-0{i}-10", "importe": 40.0} for i in range(1, 7)]
+    cliente.table("movimientos").insert(luz + FILAS[1:]).execute()
+    cliente.table("reglas_alerta").insert([{"id": "r", "regla": "gasto_atipico", "objetivo": None, "umbral": 3}]).execute()
+    repositorio.invalidar()
+    alertas.obtener_estado()
+
+    # A partir de aquí el estado solo puede ponerse al día con las filas editadas y borradas
+    monkeypatch.setattr(alertas, "cargar_tabla", lambda *a, **k: (_ for _ in ()).throw(AssertionError("recalculado")))
+    editadas = repositorio.guardar_cambios_movimientos(
+        [], [{"id": "luz1", "importe": 400.0}, {"id": "b", "categoria": "Casa", "subcategoria": "Luz"}], ["luz6"]
+    )
+    assert {fila["id"] for fila in editadas} == {"luz1", "b"}
+    assert next(f for f in editadas if f["id"] == "luz1")["comentario"] == "Recibo luz"
+
+    estado = alertas.obtener_estado()
+    monkeypatch.undo()
+    repositorio.invalidar()
+    completo = alertas.obtener_estado()
+    assert estado["gasto_mes"] == completo["gasto_mes"]
+    assert estado["saldo"] == completo["saldo"]
+    assert estado["importes"].keys() == completo["importes"].keys()
+    for subcategoria, importes in completo["importes"].items():
+        np.testing.assert_array_equal(estado["importes"][subcategoria], importes)
+
+    # La fila editada dispara su alerta igual que una nueva
+    assert alertas.comprobar(editadas)["objetivo"].tolist() == ["Luz"]
@@ -0,0 +1,130 @@
+import io
+
+import pandas as pd
+import pytest
+
+import importacion
+import repositorio
+
+COLUMNAS = {"fecha": "fecha", "comentario": "concepto", "importe": "importe"}
+
+CSV = """fecha;concepto;importe
+01/03/2026;Cafetería;-1,80
+02/03/2026;Supermercado;-30,00
+01/03/2026;Cafetería;-1,80
+03/03/2026;Nómina;1.500,00
+"""
+
+
+def _trozos(lector, texto, **opciones):
+    return pd.concat(list(lector(io.BytesIO(texto.encode("utf-8")), "utf-8", **opciones)), ignore_index=True)
+
+
+def test_csv_por_trozos_numera_las_lineas():
+    df = _trozos(importacion.leer_csv, CSV, columnas=COLUMNAS, tamaño=3)
+    assert df["linea"].tolist() == [1, 2, 3, 4]
+    assert df["importe"].tolist() == [-1.8, -30.0, -1.8, 1500.0]
+    assert df["fecha"].tolist()[0] == pd.Timestamp("2026-03-01")
+
+
+def test_csv_con_cargo_y_abono():
+    texto = "fecha,concepto,cargo,abono\n2026-03-01,Luz,45.20,\n2026-03-02,Bizum,,10.00\n"
+    columnas = {"fecha": "fecha", "comentario": "concepto", "cargo": "cargo", "abono": "abono"}
+    df = _trozos(importacion.leer_csv, texto, columnas=columnas, sep=",", decimal=".", formato_fecha="%Y-%m-%d")
+    assert df["importe"].tolist() == [-45.2, 10.0]
+
+
+def _n43(*campos):
+    # Registro de 80 posiciones a partir de (posición, texto)
+    linea = [" "] * 80
+    for posicion, texto in campos:
+        linea[posicion:posicion + len(texto)] = texto
+    return "".join(linea)
+
+
+def test_norma43_une_los_conceptos_y_aplica_el_signo():
+    texto = "\n".join([
+        _n43((0, "11")),
+        _n43((0, "22"), (10, "260301"), (27, "1"), (28, "00000000004520"), (64, "REF LUZ")),
+        _n43((0, "2301"), (4, "RECIBO IBERDROLA"), (42, "MARZO")),
+        _n43((0, "22"), (10, "260302"), (27, "2"), (28, "00000000150000"), (64, "NOMINA")),
+        _n43((0, "33")),
+    ]) + "\n"
+    df = _trozos(importacion.leer_norma43, texto, tamaño=1)
+    assert df["linea"].tolist() == [1, 2]
+    assert df["importe"].tolist() == [-45.2, 1500.0]
+    assert df["comentario"].tolist() == ["RECIBO IBERDROLA MARZO", "NOMINA"]
+    assert df["fecha"].tolist() == [pd.Timestamp("2026-03-01"), pd.Timestamp("2026-03-02")]
+
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20260301
+<TRNAMT>-1.80
+<NAME>Cafeteria
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260303120000
+<TRNAMT>1500,00
+<NAME>Nomina
+<MEMO>Marzo
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.mark.parametrize("texto", [OFX, OFX.replace("\n", "")], ids=["varias lineas", "una linea"])
+def test_ofx(texto):
+    df = _trozos(importacion.leer_ofx, texto, tamaño=1)
+    assert df["linea"].tolist() == [1, 2]
+    assert df["importe"].tolist() == [-1.8, 1500.0]
+    assert df["comentario"].tolist() == ["Cafeteria", "Nomina Marzo"]
+
+
+def test_ofx_en_una_linea_se_lee_a_bloques():
+    fichero = io.BytesIO(OFX.replace("\n", "").encode("utf-8"))
+    transacciones = list(importacion._transacciones(fichero, "utf-8", bloque=7))
+    assert len(transacciones) == 2 and "<NAME>Nomina" in transacciones[1]
+
+
+def _importado(cliente):
+    filas = cliente.table("movimientos").select("id,fecha,importe,comentario,tipo,cuenta").execute().data
+    return sorted(filas, key=lambda fila: fila["id"])
+
+
+def _importar(**opciones):
+    trozos = importacion.leer_csv(io.BytesIO(CSV.encode("utf-8")), "utf-8", COLUMNAS, tamaño=2)
+    return importacion.importar(trozos, "Banco", "extracto", tamaño_lote=1, **opciones)
+
+
+def test_reanudar_da_lo_mismo_que_una_sola_pasada(cliente):
+    repositorio.invalidar()
+    resumen = _importar()
+    una_pasada = _importado(cliente)
+    # La segunda cafetería es una línea repetida del fichero: se importa como posible duplicado
+    assert resumen["importadas"] == 4 and resumen["n_posibles"] == 1 and resumen["rechazadas"] == 0
+
+    cliente.table("movimientos").delete().neq("id", "").execute()
+    repositorio.invalidar()
+
+    def cortar(resumen):
+        if resumen["importadas"] == 2:
+            raise ConnectionError("sin conexión")
+
+    with pytest.raises(ConnectionError):
+        _importar(progreso=cortar)
+    assert len(_importado(cliente)) == 2
+
+    resumen = _importar(desde=2)
+    assert _importado(cliente) == una_pasada
+    assert resumen["importadas"] == 2 and resumen["n_posibles"] == 1 and resumen["rechazadas"] == 0
+
+
+def test_volver_a_importar_el_mismo_fichero_lo_rechaza_entero(cliente):
+    repositorio.invalidar()
+    _importar()
+    resumen = _importar()
+    assert resumen["importadas"] == 0 and resumen["rechazadas"] == 4
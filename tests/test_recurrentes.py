@@ -0,0 +1,92 @@
+import pandas as pd
+
+import recurrentes
+from esquema import tipar_movimientos
+from repositorio import COLUMNAS_MOVIMIENTOS
+
+
+def _movimientos(*filas):
+    # (fecha, importe, concepto) de gastos de la misma cuenta
+    return tipar_movimientos(pd.DataFrame(
+        [{"fecha": f, "cuenta": "Banco", "importe": i, "comentario": c, "subcategoria": "Recibos",
+          "categoria": "Casa", "tipo": "gasto"} for f, i, c in filas]
+    ).reindex(columns=COLUMNAS_MOVIMIENTOS))
+
+
+def _serie(fechas, importe, concepto):
+    return [(f, importe, concepto) for f in fechas]
+
+
+def _detectadas(*filas):
+    series = recurrentes.construir(_movimientos(*filas))["series"]
+    return dict(zip(series["concepto"], series["periodicidad"]))
+
+
+MESES = [f"2025-{m:02d}-05" for m in range(1, 7)]
+
+
+def test_periodos_segun_el_intervalo_entre_pagos():
+    filas = (
+        _serie(MESES, 9.99, "Spotify")
+        + _serie(["2024-01-20", "2024-04-20", "2024-07-20", "2024-10-20"], 120, "Seguro coche")
+        + _serie(["2022-03-01", "2023-03-01", "2024-03-01"], 60, "Dominio web")
+        + _serie(["2025-01-10", "2025-01-17", "2025-01-24", "2025-01-31"], 5, "Lavado semanal")
+    )
+    assert _detectadas(*filas) == {"spotify": "mensual", "seguro coche": "trimestral", "dominio web": "anual"}
+
+
+def test_hacen_falta_pagos_suficientes():
+    assert _detectadas(*_serie(MESES[:3], 9.99, "Spotify")) == {}
+    assert _detectadas(*_serie(MESES[:4], 9.99, "Spotify")) == {"spotify": "mensual"}
+
+
+def test_las_cifras_del_concepto_no_separan_la_serie():
+    filas = [(f, 40, f"Recibo luz {f[5:7]}/2025 ref{i}88") for i, f in enumerate(MESES)]
+    assert _detectadas(*filas) == {"recibo luz": "mensual"}
+
+
+def test_subidas_dentro_de_la_tolerancia_siguen_la_serie():
+    filas = _serie(MESES[:3], 12.99, "Netflix") + _serie(MESES[3:], 15.99, "Netflix")
+    series = recurrentes.construir(_movimientos(*filas))["series"]
+    assert series["pagos"].tolist() == [6]
+    # El importe esperado es la mediana de los tres últimos pagos
+    assert series["importe"].tolist() == [15.99]
+
+
+def test_importes_muy_distintos_son_series_distintas():
+    # Dos cuotas del mismo gimnasio con el mismo concepto y un pago suelto mucho mayor
+    filas = _serie(MESES, 30, "Gimnasio") + _serie(MESES, 55, "Gimnasio") + [("2025-03-20", 300, "Gimnasio")]
+    series = recurrentes.construir(_movimientos(*filas))["series"]
+    assert sorted(series["importe"].tolist()) == [30, 55]
+
+
+def test_un_pago_que_falta_no_rompe_la_serie():
+    fechas = [f"2025-{m:02d}-05" for m in (1, 2, 3, 5, 6, 7, 8)]
+    assert _detectadas(*_serie(fechas, 9.99, "Spotify")) == {"spotify": "mensual"}
+
+
+def test_pagos_irregulares_no_son_recurrentes():
+    fechas = ["2025-01-05", "2025-01-20", "2025-03-01", "2025-03-12", "2025-04-30", "2025-05-09", "2025-06-28"]
+    assert _detectadas(*_serie(fechas, 9.99, "Spotify")) == {}
+    # Mediana mensual pero demasiados intervalos fuera de rango
+    fechas = ["2025-01-05", "2025-02-05", "2025-03-05", "2025-03-15", "2025-04-15", "2025-04-25", "2025-05-25"]
+    assert _detectadas(*_serie(fechas, 9.99, "Spotify")) == {}
+
+
+def test_calendario_marca_atrasados_y_descarta_canceladas():
+    series = recurrentes.construir(_movimientos(*_serie(MESES, 9.99, "Spotify")))["series"]
+    # Último pago el 5 de junio: el de julio aún no ha llegado el 10 de julio
+    proximos = recurrentes.calendario(series, "2025-07-10", meses=1)
+    assert proximos["fecha"].dt.strftime("%Y-%m-%d").tolist() == ["2025-07-05", "2025-08-05"]
+    assert proximos["estado"].tolist() == ["⏰ Atrasado", "📅 Previsto"]
+    # Más de MARGEN_ACTIVA periodos sin pagos: cancelada
+    assert recurrentes.calendario(series, "2025-09-01").empty
+
+
+def test_altas_igual_que_calcular_de_cero():
+    filas = _serie(MESES, 9.99, "Spotify") + _serie(MESES[:3], 40, "Recibo luz")
+    nuevas = _serie(["2025-04-05", "2025-05-05"], 40, "Recibo luz") + _serie(["2025-07-05"], 9.99, "Spotify")
+    estado = recurrentes.añadir(recurrentes.construir(_movimientos(*filas)), _movimientos(*nuevas))
+    completo = recurrentes.construir(_movimientos(*filas, *nuevas))
+    ordenar = lambda s: s.sort_values("clave").reset_index(drop=True)
+    pd.testing.assert_frame_equal(ordenar(estado["series"]), ordenar(completo["series"]), check_dtype=False)
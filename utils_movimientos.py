@@ -1,7 +1,6 @@
 
-import pandas as pd
+from esquema import concatenar
 
 def combinar_movimientos(df_ingresos, df_gastos, df_transf):
-    df_todos = pd.concat([df_ingresos, df_gastos, df_transf], ignore_index=True)
-    df_todos["fecha"] = pd.to_datetime(df_todos["fecha"], errors="coerce")
-    return df_todos
+    # Las fechas ya vienen parseadas por el esquema; concatenar conserva las categóricas
+    return concatenar([df_ingresos, df_gastos, df_transf])
@@ -1,5 +1,11 @@
 import uuid
-from supabase_client import supabase
+import streamlit as st
+import pandas as pd
+from repositorio import guardar_cambios_movimientos, pagina_movimientos, version
+from esquema import para_editar
+from duplicados import comprobar
+from categorizacion import categorizar
+from alertas import avisar
 
 # 👇 Mapeo de tipo a texto para mostrar en la cabecera
 tipo_texto = {
@@ -9,75 +15,255 @@ tipo_texto = {
     "histórico": "histórico"
 }
 
-def editar_tabla_movimientos(df, tipo, lista_subcat=None, lista_cat=None, cuentas=None, key=None):
-    st.markdown(f"### ✏️ Editar {tipo_texto.get(tipo, tipo)}")
+# Tipo de movimiento que se guarda en Supabase para cada editor
+tipo_movimiento = {
+    "gastos": "gasto",
+    "ingresos": "ingreso",
+    "transferencias": "transferencia"
+}
 
-    editable_cols = []
-    if tipo != "transferencias":
-        editable_cols = ["subcategoria", "categoria", "cuenta", "importe", "fecha", "comentario"]
-    else:
-        editable_cols = ["desde", "hacia", "importe", "fecha", "comentario"]
+# Por encima de estas filas el editor abre por defecto en modo paginado
+UMBRAL_PAGINADO = 1000
+TAMAÑOS_PAGINA = [25, 50, 100, 200]
+
+# Nombres de las columnas por las que se puede ordenar en el modo paginado
+ETIQUETAS = {
+    "subcategoria": "Subcategoría", "categoria": "Categoría", "cuenta": "Cuenta", "desde": "Desde",
+    "hacia": "Hacia", "importe": "Importe", "fecha": "Fecha", "comentario": "Concepto"
+}
+
+def _valor(v):
+    # Valores del editor a JSON: NaN/NaT -> None, fechas -> "YYYY-MM-DD"
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if hasattr(v, "isoformat"):
+        return pd.Timestamp(v).date().isoformat()
+    if hasattr(v, "item"):
+        return v.item()
+    return v
+
+def calcular_cambios(df, edited_df, estado, tipo, editable_cols, semilla=None):
+    # Usa el estado de cambios del data_editor (filas editadas, añadidas y borradas) para que
+    # el guardado dependa del tamaño de la edición y no del tamaño del libro.
+    # df es el DataFrame que se pasó al editor (con movimiento_id) y edited_df lo que devuelve.
+    # Con semilla, el id de cada fila nueva sale de la semilla y su posición: es el mismo en
+    # todos los reruns mientras el editor no cambie.
+    ids = df["movimiento_id"]
+    filas_editadas = edited_df.dropna(subset=["movimiento_id"]).set_index("movimiento_id")
+
+    cambios = []
+    for pos, columnas in estado.get("edited_rows", {}).items():
+        movimiento_id = ids.iloc[int(pos)]
+        if movimiento_id not in filas_editadas.index:
+            continue
+        fila = filas_editadas.loc[movimiento_id]
+        cambio = {"id": movimiento_id}
+        cambio.update({col: _valor(fila[col]) for col in editable_cols if col in columnas})
+        cambios.append(cambio)
+
+    altas = []
+    if tipo in tipo_movimiento:
+        ahora = pd.Timestamp.now(tz="UTC").isoformat()
+        for n, (_, fila) in enumerate(edited_df[edited_df["movimiento_id"].isna()].iterrows()):
+            alta = {col: _valor(fila[col]) for col in editable_cols}
+            alta.update({
+                "id": str(uuid.uuid5(uuid.NAMESPACE_OID, f"{semilla}:{n}") if semilla else uuid.uuid4()),
+                "tipo": tipo_movimiento[tipo],
+                "created_at": ahora
+            })
+            altas.append(alta)
+
+    bajas = [ids.iloc[int(pos)] for pos in estado.get("deleted_rows", [])]
+    return altas, cambios, bajas
 
+def _columnas_editables(tipo):
     if tipo != "transferencias":
-        df = df[["subcategoria", "categoria", "cuenta", "importe", "fecha", "comentario"]]
-    else:
-        df = df[["desde", "hacia", "importe", "fecha", "comentario"]]
+        return ["subcategoria", "categoria", "cuenta", "importe", "fecha", "comentario"]
+    return ["desde", "hacia", "importe", "fecha", "comentario"]
+
+def _config_columnas(lista_subcat, lista_cat, cuentas):
+    return {
+        "subcategoria": st.column_config.SelectboxColumn("Subcategoría", options=[s.split(":")[0] for s in lista_subcat] if lista_subcat else []),
+        "categoria": st.column_config.SelectboxColumn("Categoría", options=lista_cat if lista_cat else []),
+        "cuenta": st.column_config.SelectboxColumn("Cuenta", options=cuentas if cuentas else []),
+        "desde": st.column_config.SelectboxColumn("Desde", options=cuentas if cuentas else []),
+        "hacia": st.column_config.SelectboxColumn("Hacia", options=cuentas if cuentas else []),
+        "importe": st.column_config.NumberColumn("Importe", min_value=0, format="%.2f"),
+        "comentario": st.column_config.TextColumn("Concepto"),
+        "fecha": st.column_config.DateColumn("Fecha"),
+        "movimiento_id": None
+    }
+
+def _guardar(altas, cambios, bajas, tipo, estado_editor):
+    if estado_editor.get("added_rows") and tipo not in tipo_movimiento:
+        st.toast("⚠️ Las filas nuevas se añaden desde Gastos, Ingresos o Transferencias")
+    if altas:
+        # Las filas nuevas idénticas a un movimiento ya registrado no se guardan
+        marca = comprobar(pd.DataFrame(altas)).to_numpy()
+        if (marca == "exacto").any():
+            st.toast(f"⚠️ {(marca == 'exacto').sum()} filas nuevas no se han guardado: ya existían")
+            altas = [alta for alta, m in zip(altas, marca) if m != "exacto"]
+        if (marca == "posible").any():
+            st.toast(f"🔁 {(marca == 'posible').sum()} filas nuevas se parecen a movimientos ya registrados")
+        # Las que llegan sin subcategoría se categorizan con las reglas automáticas
+        if altas and tipo in ("gastos", "ingresos"):
+            df_altas = categorizar(pd.DataFrame(altas)).astype(object)
+            altas = df_altas.where(df_altas.notna(), None).to_dict(orient="records")
+    editadas = guardar_cambios_movimientos(altas, cambios, bajas)
+    st.toast(f"✅ Cambios guardados: {len(altas)} nuevos, {len(cambios)} editados, {len(bajas)} eliminados")
+    avisar(altas + editadas)
+
+def editar_tabla_movimientos(df, tipo, lista_subcat=None, lista_cat=None, cuentas=None, key=None, filtros=None):
+    # filtros: los del modo paginado en formato de repositorio.pagina_movimientos; por defecto,
+    # el tipo de movimiento del editor
+    st.markdown(f"### ✏️ Editar {tipo_texto.get(tipo, tipo)}")
+
+    editable_cols = _columnas_editables(tipo)
+    column_config = _config_columnas(lista_subcat, lista_cat, cuentas)
+
+    paginado = st.toggle(
+        "📄 Editar por páginas", value=len(df) > UMBRAL_PAGINADO, key=f"{key}_paginado",
+        help="Solo se descarga y se envía al navegador la página visible; el orden y los filtros los resuelve la base de datos"
+    )
+    if paginado:
+        if filtros is None:
+            filtros = [("tipo", "eq", tipo_movimiento[tipo])] if tipo in tipo_movimiento else []
+        editar_tabla_paginada(tipo, editable_cols, column_config, filtros, key)
+        return
+
+    # movimiento_id va oculto en el editor: es la clave de los cambios fila a fila
+    df = para_editar(df.reindex(columns=editable_cols + ["movimiento_id"]).reset_index(drop=True))
+
+    # La clave del widget incluye la versión de los datos para que tras guardar el editor empiece limpio
+    key_editor = f"{key}_{version('movimientos')}"
 
     edited_df = st.data_editor(
         df,
         use_container_width=True,
         num_rows="dynamic",
-        column_config={
-            "subcategoria": st.column_config.SelectboxColumn("Subcategoría", options=[s.split(":")[0] for s in lista_subcat] if lista_subcat else []),
-            "categoria": st.column_config.SelectboxColumn("Categoría", options=lista_cat if lista_cat else []),
-            "cuenta": st.column_config.SelectboxColumn("Cuenta", options=cuentas if cuentas else []),
-            "desde": st.column_config.SelectboxColumn("Desde", options=cuentas if cuentas else []),
-            "hacia": st.column_config.SelectboxColumn("Hacia", options=cuentas if cuentas else []),
-            "importe": st.column_config.NumberColumn("Importe", min_value=0, format="%.2f"),
-            "comentario": st.column_config.TextColumn("Concepto"),
-            "fecha": st.column_config.DateColumn("Fecha")
-        },
-        key=key,
-        on_change=st.experimental_rerun
+        hide_index=True,
+        column_config=column_config,
+        key=key_editor
     )
 
     if st.button("💾 Guardar cambios", key=f"guardar_{tipo}"):
-        movimientos = []
-        for _, row in edited_df.iterrows():
-            base = {
-                "fecha": str(row["fecha"]),
-                "importe": float(row["importe"]),
-                "comentario": row.get("comentario", ""),
-                "id": str(uuid.uuid4()),
-                "created_at": pd.Timestamp.now().isoformat()
-            }
-            if tipo == "gastos":
-                base.update({
-                    "tipo": "gasto",
-                    "subcategoria": row["subcategoria"],
-                    "categoria": row["categoria"],
-                    "cuenta": row["cuenta"]
-                })
-            elif tipo == "ingresos":
-                base.update({
-                    "tipo": "ingreso",
-                    "subcategoria": row["subcategoria"],
-                    "categoria": row["categoria"],
-                    "cuenta": row["cuenta"]
-                })
-            elif tipo == "transferencias":
-                base.update({
-                    "tipo": "transferencia",
-                    "desde": row["desde"],
-                    "hacia": row["hacia"]
-                })
-            else:
-                continue
-
-            movimientos.append(base)
-
-        supabase.table("movimientos").delete().eq("tipo", base["tipo"]).execute()
-        if movimientos:
-            supabase.table("movimientos").insert(movimientos).execute()
-        st.success("✅ Cambios guardados correctamente")
-        st.experimental_rerun()
+        estado = st.session_state.get(key_editor, {})
+        _guardar(*calcular_cambios(df, edited_df, estado, tipo, editable_cols), tipo, estado)
+        st.rerun()
+
+# ---------- Modo paginado ----------
+
+def _aplicar_pendientes(df, pendientes):
+    # Vuelve a pintar sobre la página los cambios sin guardar de una visita anterior. Cada cambio
+    # solo lleva el id y las columnas editadas: el resto de la fila queda como viene de la base.
+    # Las filas nuevas se añaden al final con su id, así se ven (y se pueden editar o quitar)
+    # antes de guardarlas.
+    altas, cambios, bajas = pendientes
+    df = df[~df["movimiento_id"].isin(bajas)].reset_index(drop=True)
+    for cambio in cambios:
+        filas = df["movimiento_id"] == cambio["id"]
+        if not filas.any():
+            continue
+        for col, valor in cambio.items():
+            if col != "id" and col in df.columns:
+                df.loc[filas, col] = pd.Timestamp(valor) if col == "fecha" and valor else valor
+    if altas:
+        nuevas = pd.DataFrame(altas).rename(columns={"id": "movimiento_id"}).reindex(columns=df.columns)
+        if "fecha" in nuevas.columns:
+            nuevas["fecha"] = pd.to_datetime(nuevas["fecha"], errors="coerce")
+        df = pd.concat([df, nuevas.astype(df.dtypes.to_dict())], ignore_index=True)
+    return df
+
+def _combinar(base, nuevos):
+    # Suma dos juegos de (altas, cambios, bajas); los cambios de un mismo id se funden. Los
+    # cambios y bajas de una fila nueva aún sin guardar se aplican sobre la propia alta.
+    altas = {alta["id"]: dict(alta) for alta in base[0] + nuevos[0]}
+    por_id = {}
+    for cambio in base[1] + nuevos[1]:
+        destino = altas[cambio["id"]] if cambio["id"] in altas else por_id.setdefault(cambio["id"], {})
+        destino.update(cambio)
+    bajas = []
+    for movimiento_id in dict.fromkeys(base[2] + nuevos[2]):
+        if altas.pop(movimiento_id, None) is None:
+            bajas.append(movimiento_id)
+    return list(altas.values()), list(por_id.values()), bajas
+
+def _reiniciar(estado):
+    # Tras guardar o descartar: sin pendientes y el editor empieza de cero en la siguiente
+    # generación (la clave del widget nunca se repite, así no recoge estado viejo)
+    estado.update(pendientes={}, base=([], [], []), visita=None)
+
+def editar_tabla_paginada(tipo, editable_cols, column_config, filtros, key):
+    # Cada página se pide ya filtrada y ordenada a la base de datos y al navegador solo llega esa
+    # ventana. Los cambios se apuntan por página en session_state y se guardan todos juntos,
+    # así se puede editar en varias páginas antes de pulsar Guardar.
+    estado = st.session_state.setdefault(f"{key}_estado", {
+        "consulta": None, "pagina": 0, "pendientes": {}, "visita": None, "base": ([], [], []), "generacion": 0,
+        "sesion": uuid.uuid4().hex,
+    })
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    orden = col1.selectbox("Ordenar por", editable_cols, format_func=lambda c: ETIQUETAS[c], key=f"{key}_orden")
+    tamaño = col2.selectbox("Filas por página", TAMAÑOS_PAGINA, index=1, key=f"{key}_tamaño")
+    descendente = col3.toggle("Descendente", value=True, key=f"{key}_desc")
+
+    consulta = (tuple(filtros), orden, descendente, tamaño)
+    if estado["consulta"] != consulta:
+        estado["consulta"], estado["pagina"] = consulta, 0
+
+    df, total = pagina_movimientos(filtros, orden, descendente, estado["pagina"], tamaño)
+    n_paginas = max(1, -(-total // tamaño))
+    if estado["pagina"] >= n_paginas:
+        estado["pagina"] = n_paginas - 1
+        df, total = pagina_movimientos(filtros, orden, descendente, estado["pagina"], tamaño)
+
+    def mover(paso):
+        estado["pagina"] += paso
+
+    nav1, nav2, nav3 = st.columns([1, 4, 1])
+    nav1.button("◀", key=f"{key}_anterior", disabled=estado["pagina"] == 0, on_click=mover, args=(-1,))
+    nav2.caption(f"Página {estado['pagina'] + 1} de {n_paginas} · {total:,} movimientos")
+    nav3.button("▶", key=f"{key}_siguiente", disabled=estado["pagina"] >= n_paginas - 1, on_click=mover, args=(1,))
+
+    # Al entrar en una página (o si cambian los datos) el editor empieza de cero con los cambios
+    # pendientes de esa página ya aplicados; lo que se edite ahora se suma a ellos
+    clave = consulta + (estado["pagina"],)
+    visita = (clave, version("movimientos"))
+    if estado["visita"] != visita:
+        estado["visita"] = visita
+        estado["base"] = estado["pendientes"].get(clave, ([], [], []))
+        estado["generacion"] += 1
+
+    df = df.rename(columns={"id": "movimiento_id"}).reindex(columns=editable_cols + ["movimiento_id"])
+    df = _aplicar_pendientes(para_editar(df), estado["base"])
+    key_editor = f"{key}_pagina_{estado['generacion']}"
+
+    edited_df = st.data_editor(
+        df,
+        use_container_width=True,
+        num_rows="dynamic",
+        hide_index=True,
+        column_config=column_config,
+        key=key_editor
+    )
+
+    estado_editor = st.session_state.get(key_editor, {})
+    semilla = f"{estado['sesion']}:{estado['generacion']}"
+    estado["pendientes"][clave] = _combinar(
+        estado["base"], calcular_cambios(df, edited_df, estado_editor, tipo, editable_cols, semilla)
+    )
+    altas, cambios, bajas = ([], [], [])
+    for pendientes in estado["pendientes"].values():
+        altas, cambios, bajas = _combinar((altas, cambios, bajas), pendientes)
+    paginas_con_cambios = sum(1 for p in estado["pendientes"].values() if any(p))
+
+    col_guardar, col_descartar = st.columns(2)
+    if paginas_con_cambios:
+        st.caption(f"✏️ Sin guardar: {len(altas)} nuevos, {len(cambios)} editados y {len(bajas)} eliminados en {paginas_con_cambios} página(s)")
+    if col_guardar.button("💾 Guardar cambios", key=f"guardar_{tipo}"):
+        _guardar(altas, cambios, bajas, tipo, estado_editor)
+        _reiniciar(estado)
+        st.rerun()
+    if paginas_con_cambios and col_descartar.button("↩️ Descartar cambios", key=f"{key}_descartar"):
+        _reiniciar(estado)
+        st.rerun()
@@ -1,24 +1,21 @@
 import streamlit as st
 import pandas as pd
 import uuid
+from repositorio import cargar_tabla, invalidar
+from cubo import totales
+from libro_mayor import obtener_libro, balance_por_cuenta, saldo_a_fecha
+from instrumentacion import medir
 
-def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales, cuentas, meses, supabase):
+@medir
+def mostrar_vision_financiera(df_presupuesto, obtener_saldos_iniciales, cuentas, meses, supabase, cubo):
     st.markdown("### 🔍 Visión Financiera")
 
-    df_mov["fecha"] = pd.to_datetime(df_mov["fecha"], errors="coerce")
-    df_mov["mes"] = df_mov["fecha"].dt.month
-    df_mov["año"] = df_mov["fecha"].dt.year
-
     año_actual = pd.Timestamp.today().year
-    df_mov_año = df_mov[df_mov["año"] == año_actual]
 
     with st.expander("📊 Comparativa anual gasto vs presupuesto"):
         with st.popover("ℹ️"):
             st.markdown("Compara el gasto real frente al presupuesto asignado por categoría para el año en curso. Te ayuda a detectar si estás gastando por encima o por debajo de tus previsiones.")
-        gastos_por_categoria = (
-            df_mov_año[df_mov_año["tipo"] == "gasto"]
-            .groupby("categoria")["importe"].sum().reset_index()
-        )
+        gastos_por_categoria = totales(cubo, "categoria", tipo="gasto", año=año_actual).reset_index()
         presupuesto_anual = (
             df_presupuesto.groupby("categoria")["importe"].sum().reset_index()
         )
@@ -35,8 +32,7 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
         with st.popover("ℹ️"):
             st.markdown("Muestra las 10 subcategorías donde más has gastado este año. Ideal para identificar patrones de gasto o excesos específicos.")
         ranking_gastos = (
-            df_mov_año[df_mov_año["tipo"] == "gasto"]
-            .groupby("subcategoria")["importe"].sum()
+            totales(cubo, "subcategoria", tipo="gasto", año=año_actual)
             .sort_values(ascending=False).head(10)
         )
         st.bar_chart(ranking_gastos)
@@ -45,8 +41,7 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
         with st.popover("ℹ️"):
             st.markdown("Lista las principales fuentes de ingreso por subcategoría en el año actual. Útil para entender qué actividades generan más dinero")
         ranking_ingresos = (
-            df_mov_año[df_mov_año["tipo"] == "ingreso"]
-            .groupby("subcategoria")["importe"].sum()
+            totales(cubo, "subcategoria", tipo="ingreso", año=año_actual)
             .sort_values(ascending=False).head(10)
         )
         st.bar_chart(ranking_ingresos)
@@ -54,8 +49,8 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
     with st.expander("📈 Evolución ahorro neto acumulado"):
         with st.popover("ℹ️"):
             st.markdown("Representa la evolución del ahorro mensual neto a lo largo del año, sumando mes a mes.")
-        ingresos = df_mov_año[df_mov_año["tipo"] == "ingreso"].groupby("mes")["importe"].sum()
-        gastos = df_mov_año[df_mov_año["tipo"] == "gasto"].groupby("mes")["importe"].sum()
+        ingresos = totales(cubo, "mes", tipo="ingreso", año=año_actual)
+        gastos = totales(cubo, "mes", tipo="gasto", año=año_actual)
         ahorro_mensual = ingresos.subtract(gastos, fill_value=0).reindex(range(1, 13), fill_value=0)
         ahorro_acumulado = ahorro_mensual.cumsum()
         ahorro_acumulado.index = [meses[m - 1] for m in ahorro_acumulado.index]
@@ -64,8 +59,8 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
     with st.expander("📊 Comparativa ahorro neto entre años"):
         with st.popover("ℹ️"):
             st.markdown("Compara el ahorro neto (ingresos - gastos) entre distintos años")
-        ahorro_ingresos = df_mov[df_mov["tipo"] == "ingreso"].groupby("año")["importe"].sum()
-        ahorro_gastos = df_mov[df_mov["tipo"] == "gasto"].groupby("año")["importe"].sum()
+        ahorro_ingresos = totales(cubo, "año", tipo="ingreso")
+        ahorro_gastos = totales(cubo, "año", tipo="gasto")
         ahorro_anual = ahorro_ingresos.subtract(ahorro_gastos, fill_value=0).fillna(0).sort_index()
         st.bar_chart(ahorro_anual.rename("Ahorro neto por año"))
 
@@ -73,52 +68,34 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
         with st.popover("ℹ️"):
             st.markdown("Calcula el saldo final por cuenta, considerando ingresos, gastos y transferencias")
 
-        df_saldos_raw = pd.DataFrame(obtener_saldos_iniciales())
+        saldos_iniciales = obtener_saldos_iniciales()
+        libro = obtener_libro()
 
-        if df_saldos_raw.empty or "cuenta" not in df_saldos_raw.columns:
+        if not saldos_iniciales:
             st.warning("⚠️ No se han encontrado saldos iniciales válidos.")
         else:
-            df_saldos = (
-                df_saldos_raw[["cuenta", "saldo_inicial"]]
-                .set_index("cuenta")
-                .rename(columns={"saldo_inicial": "saldo"})
-                .astype(float)
-            )
-
-            df_saldos["ingresos"] = df_mov[df_mov["tipo"] == "ingreso"].groupby("cuenta")["importe"].sum()
-            df_saldos["gastos"] = df_mov[df_mov["tipo"] == "gasto"].groupby("cuenta")["importe"].sum()
-            df_saldos["transferencias_recibidas"] = df_mov[df_mov["tipo"] == "transferencia"].groupby("hacia")["importe"].sum()
-            df_saldos["transferencias_enviadas"] = df_mov[df_mov["tipo"] == "transferencia"].groupby("desde")["importe"].sum()
-
-            df_saldos = df_saldos.fillna(0)
-
-            df_saldos["saldo_final"] = (
-                df_saldos["saldo"]
-                + df_saldos["ingresos"]
-                - df_saldos["gastos"]
-                + df_saldos["transferencias_recibidas"]
-                - df_saldos["transferencias_enviadas"]
-            )
-
+            fecha_saldo = st.date_input("Saldo a fecha", pd.Timestamp.today().date(), key="fecha_saldo_cuentas")
+            df_saldos = saldo_a_fecha(libro, saldos_iniciales, fecha_saldo).rename("saldo_final").to_frame()
             st.dataframe(df_saldos[["saldo_final"]].sort_values("saldo_final", ascending=False))
     with st.expander("💪 Objetivos financieros (por cuenta)"):
         with st.popover("ℹ️"):
             st.markdown("Tasa de ahorro total acumulada sobre tus ingresos del año")
-        df_obj = pd.DataFrame(supabase.table("objetivos").select("*").execute().data)
+        df_obj = cargar_tabla("objetivos").copy()
         if not df_obj.empty:
-            df_saldos_df = pd.DataFrame(df_saldos_iniciales).set_index("cuenta")
+            saldos_actuales = balance_por_cuenta(obtener_libro(), obtener_saldos_iniciales())["saldo_actual"]
             df_obj["monto"] = df_obj["monto"].astype(float)
 
             for _, row in df_obj.iterrows():
                 cuenta = row["cuenta"]
-                saldo_actual = df_saldos_df.loc[cuenta]["saldo"] if cuenta in df_saldos_df.index else 0
-                progreso = min(saldo_actual / row["monto"], 1.0)
+                saldo_actual = saldos_actuales.get(cuenta, 0)
+                progreso = min(max(saldo_actual / row["monto"], 0.0), 1.0)
                 st.write(f"**{row['descripcion']}** ({row['tipo']} - {cuenta}) — hasta el {row['fecha_limite']}")
                 st.progress(progreso)
                 st.caption(f"Progreso: {progreso*100:.1f}% — {saldo_actual:,.2f}€ / {row['monto']:,.2f}€")
                 if st.button(f"❌ Eliminar {row['descripcion']}", key=f"del_{row['id']}"):
                     supabase.table("objetivos").delete().eq("id", row["id"]).execute()
-                    st.experimental_rerun()
+                    invalidar("objetivos")
+                    st.rerun()
 
         with st.form("nuevo_objetivo"):
             col1, col2, col3 = st.columns(3)
@@ -135,11 +112,12 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
                     "monto": monto,
                     "fecha_limite": fecha_limite.isoformat()
                 }).execute()
+                invalidar("objetivos")
                 st.success("🌟 Objetivo añadido correctamente")
-                st.experimental_rerun()
+                st.rerun()
 
     with st.expander("💪 Seguimiento manual de objetivos personales"):
-        objetivos_financieros = supabase.table("objetivos_financieros").select("*").execute().data
+        objetivos_financieros = cargar_tabla("objetivos_financieros").to_dict(orient="records")
         for obj in objetivos_financieros:
             progreso = obj["ahorrado"] / obj["meta"] if obj["meta"] else 0
             nuevo_ahorro = st.number_input(
@@ -156,6 +134,7 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
                     supabase.table("objetivos_financieros").update({
                         "ahorrado": nuevo_ahorro
                     }).eq("id", obj["id"]).execute()
+                    invalidar("objetivos_financieros")
                     st.success(f"Ahorro actualizado para '{obj['nombre']}'")
                     st.rerun()
             with col2:
@@ -174,5 +153,6 @@ def mostrar_vision_financiera(df_mov, df_presupuesto, obtener_saldos_iniciales,
                     "meta": meta,
                     "ahorrado": ahorrado
                 }).execute()
+                invalidar("objetivos_financieros")
                 st.success("Objetivo personal añadido correctamente")
                 st.rerun()